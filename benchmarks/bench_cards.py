@@ -0,0 +1,155 @@
+"""Per-hand cost of the card engine (cards.py) against the string cards bj and hl used before it.
+
+  deal          set up a game's deck and deal 4 cards, as every new game and every turn of a
+                resumed session does. The old deck shuffled all 52 strings; a Shoe only runs the
+                shuffle as far as the cards it deals
+  bj_hand       hit to 17 and total the hand after every card, re-parsing every card each time
+                the old way, against a Hand's running total
+  hl_compare    compare two cards, rebuilding the face card dict per call the old way, against
+                a table lookup
+  six_deck_shoe deal two-card hands one after another, like a simulator. The old deck had to be
+                rebuilt and shuffled for every hand; a 6-deck Shoe deals on and reshuffles at its cut card
+
+Each case runs on the same card sequences, --hands times, and reports ns per hand and the speedup.
+
+Usage: python benchmarks/bench_cards.py [--hands 200000] [--seed 0] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cards import NAMES, Hand, Shoe, card_value  # noqa: E402
+
+LEGACY_CARDS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
+
+
+# How games.py did it before cards.py
+def legacy_deck(seed):
+    cards = LEGACY_CARDS * 4
+    random.Random(seed).shuffle(cards)
+    return cards
+
+
+def legacy_points(hand):
+    points = 0
+    ace_count = 0
+    for card in hand:
+        if card in ["J", "Q", "K"]:
+            points += 10
+        elif card == "A":
+            points += 11
+            ace_count += 1
+        else:
+            points += int(card)
+    while points > 21 and ace_count:
+        points -= 10
+        ace_count -= 1
+    return points
+
+
+def legacy_value(card):
+    values = {"J": 11, "Q": 12, "K": 13, "A": 14}
+    if card in values:
+        return values[card]
+    return int(card)
+
+
+def timed(func, hands):
+    start = time.perf_counter()
+    func(hands)
+    return (time.perf_counter() - start) / hands * 1e9
+
+
+def run(hands, seed):
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(32) for _ in range(1_000)]  # Games in flight, each loaded once per turn
+    ints = [[rng.randrange(52) for _ in range(12)] for _ in range(1_000)]
+    strings = [[NAMES[card] for card in cards] for cards in ints]
+    results = {}
+
+    def deal_legacy(n):
+        for i in range(n):
+            cards = legacy_deck(seeds[i % 1_000])
+            cards[-1], cards[-2], cards[-3], cards[-4]
+
+    def deal_new(n):
+        for i in range(n):
+            shoe = Shoe(seeds[i % 1_000])
+            shoe.draw(), shoe.draw(), shoe.draw(), shoe.draw()
+    results["deal"] = (timed(deal_legacy, hands), timed(deal_new, hands))
+
+    def bj_legacy(n):
+        for i in range(n):
+            cards = strings[i % 1_000]
+            hand = [cards[0], cards[1]]
+            j = 2
+            while legacy_points(hand) < 17:
+                hand.append(cards[j])
+                j += 1
+            legacy_points(hand), legacy_points(hand)  # Shown, then settled
+
+    def bj_new(n):
+        for i in range(n):
+            cards = ints[i % 1_000]
+            hand = Hand()
+            hand.add(cards[0])
+            hand.add(cards[1])
+            j = 2
+            while hand.total < 17:
+                hand.add(cards[j])
+                j += 1
+            hand.total, hand.total
+    results["bj_hand"] = (timed(bj_legacy, hands), timed(bj_new, hands))
+
+    def hl_legacy(n):
+        for i in range(n):
+            cards = strings[i % 1_000]
+            legacy_value(cards[0]) < legacy_value(cards[1])
+
+    def hl_new(n):
+        for i in range(n):
+            cards = ints[i % 1_000]
+            card_value(cards[0]) < card_value(cards[1])
+    results["hl_compare"] = (timed(hl_legacy, hands), timed(hl_new, hands))
+
+    def shoe_legacy(n):
+        for i in range(n):
+            cards = legacy_deck(seeds[i % 1_000])
+            legacy_points([cards.pop(), cards.pop()])
+
+    def shoe_new(n):
+        shoe = Shoe(0, decks=6, reshuffle_at=234)
+        for _ in range(n):
+            hand = Hand()
+            hand.add(shoe.draw())
+            hand.add(shoe.draw())
+            hand.total
+    results["six_deck_shoe"] = (timed(shoe_legacy, hands), timed(shoe_new, hands))
+
+    return {name: {"legacy_ns": legacy, "cards_ns": new, "speedup": legacy / new}
+            for name, (legacy, new) in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hands", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.hands, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'':<14} {'legacy ns':>10} {'cards ns':>10} {'speedup':>8}")
+    for name, result in results.items():
+        print(f"{name:<14} {result['legacy_ns']:>10.0f} {result['cards_ns']:>10.0f} {result['speedup']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Throughput of the !j spin engines: the old per-spin loop, the pure-Python fallback and NumPy.
+
+Usage: python benchmarks/bench_jackpot.py [--spins 100 10000 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import jackpot  # noqa: E402
+from jackpot import partial_payout_multipliers, payout_multipliers, symbol_pool  # noqa: E402
+
+
+def legacy_spins(spins, bet_amount):
+    """The loop !j used to run inline."""
+    total_payout = 0
+    for _ in range(spins):
+        reel_1 = random.choice(symbol_pool)
+        reel_2 = random.choice(symbol_pool)
+        reel_3 = random.choice(symbol_pool)
+
+        payout = 0
+        if reel_1 == reel_2 == reel_3:
+            payout = bet_amount * payout_multipliers[reel_1]
+        elif reel_1 == reel_2:
+            payout = bet_amount * partial_payout_multipliers.get(reel_1, 0)
+        elif reel_2 == reel_3:
+            payout = bet_amount * partial_payout_multipliers.get(reel_2, 0)
+        elif reel_1 == reel_3:
+            payout = bet_amount * partial_payout_multipliers.get(reel_1, 0)
+        total_payout += payout
+    return total_payout
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spins", type=int, nargs="+", default=[100, 10_000, 1_000_000])
+    args = parser.parse_args()
+
+    engines = [("legacy", legacy_spins), ("python", lambda n, bet: jackpot._spin_python(n, bet, random))]
+    if jackpot.np is not None:
+        rng = jackpot.np.random.default_rng()
+        engines.append(("numpy", lambda n, bet: jackpot._spin_numpy(n, bet, rng)))
+
+    print(f"{'spins':>10} " + " ".join(f"{name + ' (spins/s)':>20}" for name, _ in engines))
+    for spins in args.spins:
+        rates = [spins / timed(engine, spins, 100) for _, engine in engines]
+        print(f"{spins:>10,} " + " ".join(f"{rate:>20,.0f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
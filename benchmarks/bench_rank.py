@@ -0,0 +1,77 @@
+"""Compare the old !l directory scan with the RankIndex lookups.
+
+Usage: python benchmarks/bench_rank.py [--sizes 1000 100000 1000000] [--no-scan]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ranking import RankIndex  # noqa: E402
+from storage import JsonStorage  # noqa: E402
+
+
+def make_accounts(count):
+    return {str(100_000_000_000_000_000 + i): random.randint(0, 10 ** 12) for i in range(count)}
+
+
+def bench_scan(storage, user_id):
+    """What !l used to do: read every account, sort them all, find one rank."""
+    start = time.perf_counter()
+    leaderboard_data = [(uid, data["bux"]) for uid, data in storage.iter_accounts()]
+    sorted_bux = sorted(leaderboard_data, key=lambda x: x[1], reverse=True)
+    next((index + 1 for index, (uid, _) in enumerate(sorted_bux) if uid == user_id), None)
+    sorted_bux[:7]
+    return time.perf_counter() - start
+
+
+def bench_index(index, user_ids, rounds=10_000):
+    """Per-call cost of top 7 + one rank + one balance update on the index."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        user_id = random.choice(user_ids)
+        index.top(7)
+        index.rank(user_id)
+        index.update(user_id, random.randint(0, 10 ** 12))
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--no-scan", action="store_true", help="skip the (slow) on-disk scan")
+    args = parser.parse_args()
+
+    print(f"{'accounts':>10} {'scan (s)':>12} {'rebuild (s)':>12} {'index op (us)':>14}")
+    for size in args.sizes:
+        accounts = make_accounts(size)
+        user_ids = list(accounts)
+
+        scan_time = float("nan")
+        if not args.no_scan:
+            directory = tempfile.mkdtemp()
+            try:
+                storage = JsonStorage(os.path.join(directory, "bux"), os.path.join(directory, "parley"),
+                                      os.path.join(directory, "gamers.json"))
+                storage.save_accounts({uid: {"username": uid, "bux": bux, "last_claimed": "2000-01-01"}
+                                       for uid, bux in accounts.items()})
+                scan_time = bench_scan(storage, user_ids[-1])
+            finally:
+                shutil.rmtree(directory)
+
+        start = time.perf_counter()
+        index = RankIndex()
+        index.rebuild(accounts.items())
+        rebuild_time = time.perf_counter() - start
+
+        op_time = bench_index(index, user_ids)
+        print(f"{size:>10,} {scan_time:>12.3f} {rebuild_time:>12.3f} {op_time * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
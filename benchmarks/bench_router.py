@@ -0,0 +1,77 @@
+"""Per-event dispatch cost with N games waiting for input: bot.wait_for versus the keyed router.
+
+Each game parks one reaction wait like !bj does, then unrelated reactions are dispatched,
+the common case on a busy server. wait_for runs every game's check for each of them;
+the router only looks up the event's key.
+
+Usage: python benchmarks/bench_router.py [--games 10 100 1000 10000] [--events 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import discord  # type: ignore  # noqa: E402
+
+from router import InteractionRouter  # noqa: E402
+
+EMOJIS = ["✅", "❌", "💰"]
+
+
+async def bench_wait_for(games, events):
+    async with discord.Client(intents=discord.Intents.none()) as client:  # Never connects, only dispatches
+        waits = []
+        for player_id in range(games):
+            def check(reaction, user, player_id=player_id):
+                return user.id == player_id and str(reaction.emoji) in EMOJIS
+            waits.append(asyncio.ensure_future(client.wait_for("reaction_add", check=check)))
+        await asyncio.sleep(0)  # Let every wait_for register its listener
+
+        reaction, user = SimpleNamespace(emoji="👍", message=SimpleNamespace(id=-1)), SimpleNamespace(id=-1)
+        start = time.perf_counter()
+        for _ in range(events):
+            client.dispatch("reaction_add", reaction, user)
+        elapsed = time.perf_counter() - start
+
+        for wait in waits:
+            wait.cancel()
+        await asyncio.gather(*waits, return_exceptions=True)
+    return elapsed / events
+
+
+async def bench_router(games, events):
+    router = InteractionRouter()
+    waits = [asyncio.ensure_future(router.wait(("reaction", player_id, player_id), lambda emoji: emoji in EMOJIS))
+             for player_id in range(games)]
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    for _ in range(events):
+        router.dispatch(("reaction", -1, -1), "👍")
+    elapsed = time.perf_counter() - start
+
+    for wait in waits:
+        wait.cancel()
+    await asyncio.gather(*waits, return_exceptions=True)
+    return elapsed / events
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, nargs="+", default=[10, 100, 1_000, 10_000])
+    parser.add_argument("--events", type=int, default=2_000)
+    args = parser.parse_args()
+
+    print(f"{'games':>8} {'wait_for (us/event)':>20} {'router (us/event)':>18}")
+    for games in args.games:
+        wait_for_cost = await bench_wait_for(games, args.events)
+        router_cost = await bench_router(games, args.events)
+        print(f"{games:>8,} {wait_for_cost * 1e6:>20.2f} {router_cost * 1e6:>18.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
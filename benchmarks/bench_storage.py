@@ -0,0 +1,253 @@
+"""The bot's storage hot paths over synthetic data, from a thousand to a million accounts.
+
+For each backend and size it builds a bux_data/parley_data tree (or a SQLite database) of
+that many accounts, with a share of them holding a parley bet. It then points bot.py at it,
+imported without connecting like benchmarks/loadtest.py does, and times the bot's own code:
+
+  load_bux_cold   aload_bux on a bux cache miss, read from storage on the storage executor
+  load_bux_warm   aload_bux on a cache hit
+  save_bux        save_bux with its ledger record, plus the commit_ledger (journal fsync) and
+                  flush_bux loop bodies whenever their intervals come round
+  build_indexes   the startup scan of every account into the rank index
+  leaderboard     a whole !l me command through fakediscord, served from a LeaderboardSnapshot
+  assign_role     assign_role_based_on_bux for a member, creating and adding their rank role
+  daily_event     daily_event: settle the round, credit the winners, flush and archive it
+
+Each path reports throughput, p50/p99 latency, read/write syscalls and bytes written (from
+/proc/self/io, so null where that isn't available; it counts the storage executor's threads
+too). The results are printed as JSON, with the git commit they were measured on, so runs
+can be compared between commits.
+
+Usage: python benchmarks/bench_storage.py [--sizes 1000 100000 1000000] [--backends json sqlite]
+                                          [--ops 2000] [--bettors 0.1] [--data-dir DIR] [--output FILE]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # Before the chdir in main
+
+from cache import AccountCache  # noqa: E402
+from fakediscord import FakeDiscord, FakeREST  # noqa: E402
+from ledger import Ledger  # noqa: E402
+from leaderboard import LeaderboardSnapshot  # noqa: E402
+from parley import ParleyBook  # noqa: E402
+from storage import JsonStorage, SqliteStorage  # noqa: E402
+
+BATCH = 10_000  # Accounts written per save_accounts call while generating
+
+
+def io_counters():
+    """This process's I/O counters, or None off Linux."""
+    try:
+        with open("/proc/self/io") as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f.read().splitlines())}
+    except OSError:
+        return None
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def measure(op, ops, setup=None):
+    """Await op(i) ops times. setup(i), if given, is awaited untimed before each op and is left out of the I/O counts."""
+    latencies = []
+    syscalls = written = 0
+    before = io_counters()
+    for i in range(ops):
+        if setup is not None:
+            await setup(i)
+            before = io_counters()
+        start = time.perf_counter()
+        await op(i)
+        latencies.append(time.perf_counter() - start)
+        if setup is not None and before is not None:
+            after = io_counters()
+            syscalls += after["syscr"] + after["syscw"] - before["syscr"] - before["syscw"]
+            written += after["wchar"] - before["wchar"]
+    if setup is None and before is not None:
+        after = io_counters()
+        syscalls = after["syscr"] + after["syscw"] - before["syscr"] - before["syscw"]
+        written = after["wchar"] - before["wchar"]
+
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        "ops": ops,
+        "seconds": total,
+        "ops_per_sec": ops / total if total else None,
+        "p50_us": percentile(latencies, 0.50) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+        "syscalls": syscalls if before is not None else None,
+        "bytes_written": written if before is not None else None,
+    }
+
+
+def open_storage(backend, directory):
+    if backend == "sqlite":
+        return SqliteStorage(os.path.join(directory, "bux.db"))
+    return JsonStorage(os.path.join(directory, "bux_data"), os.path.join(directory, "parley_data"),
+                       os.path.join(directory, "gamers.json"), os.path.join(directory, "session_data"))
+
+
+def generate(app, storage, accounts, bettors, rng):
+    """Fill storage with ``accounts`` accounts and a parley book with bets from ``bettors`` of them."""
+    user_ids = [str(100_000_000_000_000_000 + i) for i in range(accounts)]
+    for start in range(0, accounts, BATCH):
+        storage.save_accounts({user_id: {"username": f"user{user_id[-7:]}", "bux": rng.randint(0, 10 ** 12),
+                                         "last_claimed": "2000-01-01"}
+                               for user_id in user_ids[start:start + BATCH]})
+
+    book = ParleyBook()
+    for user_id in rng.sample(user_ids, int(accounts * bettors)):
+        book.place(user_id, {"name": f"user{user_id[-7:]}", "bet": rng.randint(1, 10 ** 6),
+                             "gamers": rng.sample(range(1, len(app.GAMER_NAMES) + 1), app.PARLEY_PICKS)})
+    storage.save_parley_book(book.to_dict())
+    return user_ids
+
+
+def use_storage(app, storage, directory):
+    """Point the imported bot at storage, set up the way bot.py sets up a single process."""
+    app.storage = storage
+    app.bux_cache = AccountCache(storage.load_account, storage.save_accounts)
+    app.ledger = Ledger(os.path.join(directory, "ledger.jsonl"), os.path.join(directory, "ledger_snapshot.json"))
+    app.recover_from_ledger()
+    app.parley_book = ParleyBook.from_dict(storage.load_parley_book())
+
+
+async def bench_size(app, world, storage, user_ids, ops, rng):
+    results = {}
+    ops = min(ops, len(user_ids))
+    sample = rng.sample(user_ids, ops)
+
+    # load_bux: the first get of a user reads storage, the next one is served from the cache
+    results["load_bux_cold"] = await measure(lambda i: app.aload_bux(sample[i]), ops)
+    results["load_bux_warm"] = await measure(lambda i: app.aload_bux(sample[i]), ops)
+
+    async def build_indexes(i):
+        await app.run_io(app.build_indexes)
+    results["build_indexes"] = await measure(build_indexes, 1)
+
+    last_commit = time.monotonic()
+
+    async def save_bux(i):
+        nonlocal last_commit
+        async with app.account_locks.hold(sample[i]):
+            app.save_bux(sample[i], dict(await app.aload_bux(sample[i]), bux=rng.randint(0, 10 ** 12)), "admin_adjust")
+        if time.monotonic() - last_commit >= app.commit_ledger.seconds:  # The background loops, at their own pace
+            await app.commit_ledger()
+            last_commit = time.monotonic()
+        await app.flush_bux()
+    results["save_bux"] = await measure(save_bux, ops)
+    await app.run_io(app.ledger.commit)
+    await app.run_io(app.bux_cache.flush)
+
+    guild = world.add_guild(f"guild{len(user_ids)}_{type(storage).__name__}", ["games"])
+    channel = guild.text_channels[0]
+    members = [world.add_member(guild, f"user{user_id[-7:]}", member_id=int(user_id)) for user_id in sample]
+    app.leaderboard = LeaderboardSnapshot(app.rank_index.snapshot(), app.rank_index.changes, app.LEADERBOARD_PAGE_SIZE)
+
+    async def leaderboard(i):
+        await world.invoke(members[i], channel, "!l me")
+    results["leaderboard"] = await measure(leaderboard, ops)
+    channel.history.clear()
+
+    for member in members:  # Start over without the roles !l just handed out
+        member._role_list.clear()
+    app.member_ranks = type(app.member_ranks)(app.member_ranks.max_entries, app.member_ranks.ttl)
+    results["assign_role"] = await measure(lambda i: app.assign_role_based_on_bux(channel, members[i]), ops)
+    channel.history.clear()
+
+    stored_book = storage.load_parley_book()
+
+    async def reopen(i):
+        # Every run settles the same bets; the book goes back in as the round the last run just opened
+        book = dict(stored_book, round=stored_book["round"] + i)
+        await app.run_io(storage.save_parley_book, book)
+        app.parley_book = ParleyBook.from_dict(book)
+    rounds = 3
+    results["daily_event"] = await measure(lambda i: app.daily_event(), rounds, setup=reopen)
+    results["daily_event"]["bets"] = len(stored_book["bets"])
+    await reopen(rounds)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, app, root):
+    runs = []
+    async with app.bot:  # Sets the client up for dispatching commands without logging in
+        world = FakeDiscord(app.bot, FakeREST(latency=0, jitter=0, rate=10 ** 9))  # Time the bot, not Discord
+        for backend in args.backends:
+            for size in args.sizes:
+                rng = random.Random(f"{args.seed}:{size}")
+                directory = os.path.join(root, f"{backend}_{size}")
+                reuse = os.path.exists(os.path.join(directory, "ready"))
+                os.makedirs(directory, exist_ok=True)
+                storage = open_storage(backend, directory)
+                try:
+                    start = time.perf_counter()
+                    if reuse:
+                        user_ids = [user_id for user_id, _ in storage.iter_accounts()]
+                    else:
+                        user_ids = generate(app, storage, size, args.bettors, rng)
+                        open(os.path.join(directory, "ready"), "w").close()
+                    use_storage(app, storage, directory)
+                    generated = time.perf_counter() - start
+                    print(f"{backend} {size:,} accounts ready in {generated:.1f}s", file=sys.stderr)
+                    runs.append({"backend": backend, "accounts": size, "generate_seconds": generated,
+                                 "reused": reuse, "paths": await bench_size(app, world, storage, user_ids, args.ops, rng)})
+                finally:
+                    storage.close()
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", choices=["json", "sqlite"], default=["json", "sqlite"])
+    parser.add_argument("--ops", type=int, default=2_000, help="Operations timed per hot path")
+    parser.add_argument("--bettors", type=float, default=0.1, help="Share of accounts with a parley bet")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="Keep the generated data here and reuse it on later runs")
+    parser.add_argument("--output", help="Write the JSON here instead of printing it")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.data_dir) if args.data_dir else tempfile.mkdtemp()
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)  # bot.py keeps its own data files in the working directory
+    try:
+        import bot as app
+        runs = asyncio.run(run(args, app, root))
+        app.storage_executor.shutdown()
+    finally:
+        shutil.rmtree(workdir)
+        if not args.data_dir:
+            shutil.rmtree(root)
+
+    report = json.dumps({"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                         "ops": args.ops, "bettors": args.bettors, "runs": runs}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
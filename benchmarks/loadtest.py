@@ -0,0 +1,284 @@
+"""End-to-end load test of the bot's commands against an offline stand-in for Discord.
+
+Imports bot.py without connecting (its data files go to a temp directory), puts fake guilds,
+channels and members in front of it (fakediscord.py) and lets --users simulated users run
+d, g, b, bj, hl, u, j, p and l concurrently through bot.invoke. Games are played to the end
+with scripted strategies: button presses for bj and hl, DM replies for u and p. REST calls
+take --rest-latency seconds and are rate limited per channel or guild bucket (--rate calls
+per --per seconds), with a --error-429 chance of an unexpected 429 on top.
+
+Reports latency percentiles per command and per game turn, event loop lag, REST calls,
+rate limit waits and 429s, button presses answered after Discord's 3 second deadline and command errors.
+Exits with an error if any command failed or a user's script broke, after printing the first traceback.
+
+Usage: python benchmarks/loadtest.py [--users 1000] [--duration 60] [--guilds 1] [--channels 10]
+                                     [--think 2.0] [--rest-latency 0.05] [--rate 5] [--per 5]
+                                     [--error-429 0.0] [--seed 0] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # Before the chdir in main
+
+from fakediscord import FakeDiscord, FakeREST  # noqa: E402
+from cards import card_value, parse_card  # noqa: E402
+
+COMMAND_WEIGHTS = {"bj": 20, "hl": 15, "u": 10, "j": 15, "b": 10, "l": 10, "g": 5, "p": 5, "d": 10}
+TURN_TIMEOUT = 30.0  # How long a user waits for a DM from the bot before giving up on the game
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}  # name -> [seconds]
+        self.errors = Counter()  # command -> command_error events
+        self.gave_up = Counter()  # name -> waits that hit TURN_TIMEOUT
+
+    def add(self, name, seconds):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    @staticmethod
+    def summarize(values):
+        values = sorted(values)
+        pick = lambda q: values[min(int(q * len(values)), len(values) - 1)] * 1000  # noqa: E731
+        return {"count": len(values), "mean_ms": sum(values) / len(values) * 1000, "p50_ms": pick(0.50),
+                "p90_ms": pick(0.90), "p99_ms": pick(0.99), "max_ms": values[-1] * 1000}
+
+
+class User:
+    """One simulated player and their script."""
+
+    def __init__(self, world, member, channel, others, recorder, rng, think):
+        self.world = world
+        self.member = member
+        self.channel = channel
+        self.others = others
+        self.recorder = recorder
+        self.rng = rng
+        self.think = think
+
+    async def pause(self):
+        await asyncio.sleep(self.rng.expovariate(1 / self.think) if self.think else 0)
+
+    async def timed(self, name, content):
+        start = time.monotonic()
+        await self.world.invoke(self.member, self.channel, content)
+        self.recorder.add(name, time.monotonic() - start)
+
+    async def run(self, deadline):
+        await self.timed("d", "!d")
+        commands, weights = zip(*COMMAND_WEIGHTS.items())
+        while time.monotonic() < deadline:
+            await self.pause()
+            command = self.rng.choices(commands, weights)[0]
+            await getattr(self, f"play_{command}", self.play_simple)(command)
+
+    async def play_simple(self, command):
+        await self.timed(command, f"!{command}")
+
+    async def play_j(self, command):
+        await self.timed("j", f"!j 100 {self.rng.choice([1, 10, 1000])}")
+
+    async def play_g(self, command):
+        await self.timed("g", f"!g {self.rng.choice(self.others).mention} 100")
+
+    async def play_bj(self, command):
+        self.world.boards.pop(self.member.id, None)
+        await self.timed("bj", "!bj 100")
+        await self.play_board("bj", self.bj_action)
+
+    async def play_hl(self, command):
+        self.world.boards.pop(self.member.id, None)
+        await self.timed("hl", "!hl 100")
+        await self.play_board("hl", self.hl_action)
+
+    @staticmethod
+    def bj_action(board, actions):
+        totals = re.findall(r"Total: (\d+)", board.content)
+        return "hit" if totals and int(totals[-1]) < 17 else "stand"
+
+    def hl_action(self, board, actions):
+        if "cashout" in actions:
+            return self.rng.choice(["cashout", "continue"])
+        card = re.findall(r"card: \*\*(\w+)\*\*", board.content)
+        return "higher" if not card or card_value(parse_card(card[-1])) <= 8 else "lower"
+
+    async def play_board(self, game, choose):
+        board = self.world.boards.get(self.member.id)
+        while board is not None and board.view is not None:
+            await self.pause()
+            actions = [item.custom_id.rsplit(":", 1)[1] for item in board.view.children]
+            start = time.monotonic()
+            interaction = await self.world.press(self.member, board, choose(board, actions))
+            self.recorder.add(f"{game}:press", time.monotonic() - start)
+            if interaction.response.kind == "send_message":
+                break  # Not our game any more, or already over
+
+    async def next_dm(self, dm, timeout=TURN_TIMEOUT):
+        return await asyncio.wait_for(dm.inbox.get(), timeout)
+
+    async def play_u(self, command):
+        dm = await self.member.create_dm()
+        while not dm.inbox.empty():
+            dm.inbox.get_nowait()
+        await self.timed("u", "!u 100")
+        try:
+            content = (await self.next_dm(dm)).content
+            while "Enter a 4-digit code" in content:
+                await self.pause()
+                start = time.monotonic()
+                self.world.message(self.member, dm, f"{self.rng.randrange(10_000):04d}")
+                content = (await self.next_dm(dm)).content
+                self.recorder.add("u:guess", time.monotonic() - start)
+        except asyncio.TimeoutError:
+            self.recorder.gave_up["u"] += 1
+
+    async def play_p(self, command):
+        dm = await self.member.create_dm()
+        while not dm.inbox.empty():
+            dm.inbox.get_nowait()
+        start = time.monotonic()
+        invoke = asyncio.ensure_future(self.world.invoke(self.member, self.channel, "!p 100"))
+        prompt = asyncio.ensure_future(self.next_dm(dm))
+        await asyncio.wait([invoke, prompt], return_when=asyncio.FIRST_COMPLETED)
+        if not prompt.done() or prompt.exception() is not None:  # Turned down, or no prompt within TURN_TIMEOUT
+            if prompt.done():
+                self.recorder.gave_up["p"] += 1
+            prompt.cancel()
+            await invoke
+            self.recorder.add("p", time.monotonic() - start)
+            return
+        self.recorder.add("p", time.monotonic() - start)
+        await self.pause()
+        start = time.monotonic()
+        picks = self.rng.sample(range(1, 12), 3)
+        self.world.message(self.member, dm, " ".join(map(str, picks)))
+        await invoke  # Not wait_for: cancelling would cut the command off halfway, discord.py swallows it
+        self.recorder.add("p:pick", time.monotonic() - start)
+
+
+async def watch_loop_lag(recorder, interval=0.05):
+    """How late the event loop wakes a sleeper: the wait every other coroutine sees on top of its own work."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        recorder.add("loop_lag", loop.time() - start - interval)
+
+
+async def run(args, app):
+    rng = random.Random(args.seed)
+    rest = FakeREST(args.rest_latency, args.rest_jitter, args.rate, args.per, args.error_429, seed=args.seed)
+    recorder = Recorder()
+
+    async with app.bot:  # Sets the client up for dispatching without logging in
+        world = FakeDiscord(app.bot, rest)
+        guilds = [world.add_guild(f"guild{i}", [f"games{c}" for c in range(args.channels)] + [app.PARLEY_CHANNEL_NAME])
+                  for i in range(args.guilds)]
+        users = []
+        for i in range(args.users):
+            guild = guilds[i % len(guilds)]
+            member = world.add_member(guild, f"user{i}")
+            users.append((member, rng.choice(guild.text_channels[:args.channels])))
+
+        @app.bot.listen("on_command_error")
+        async def count_error(ctx, error):
+            if not recorder.errors:  # Show the first one, the counts alone don't say what broke
+                traceback.print_exception(type(error), error, error.__traceback__)
+            recorder.errors[ctx.command.name if ctx.command else "?"] += 1
+
+        world.ready()  # Starts the flush, ledger and session sweep loops like a real login would
+        lag = asyncio.ensure_future(watch_loop_lag(recorder))
+        deadline = time.monotonic() + args.duration
+        players = [User(world, member, channel, [m for m, _ in users if m.guild is member.guild and m is not member][:50],
+                        recorder, random.Random(rng.getrandbits(64)), args.think)
+                   for member, channel in users]
+        started = time.monotonic()
+        results = await asyncio.gather(*(player.run(deadline) for player in players), return_exceptions=True)
+        elapsed = time.monotonic() - started
+        lag.cancel()
+
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:  # Scripts shouldn't fail; show the first one
+            traceback.print_exception(type(failures[0]), failures[0], failures[0].__traceback__)
+        app.bux_cache.flush()
+
+    latencies = {name: Recorder.summarize(values) for name, values in sorted(recorder.latencies.items())}
+    return {
+        "users": args.users,
+        "duration": elapsed,
+        "commands_per_sec": sum(v["count"] for k, v in latencies.items() if k in COMMAND_WEIGHTS) / elapsed,
+        "latency": {k: v for k, v in latencies.items() if k != "loop_lag"},
+        "loop_lag": latencies.get("loop_lag"),
+        "rest": rest.stats(),
+        "expired_interactions": world.expired_interactions,
+        "outbox": app.outbox.stats(),
+        "command_errors": dict(recorder.errors),
+        "gave_up": dict(recorder.gave_up),
+        "user_failures": dict(Counter(type(failure).__name__ for failure in failures)),
+    }
+
+
+def print_report(report):
+    print(f"{report['users']:,} users for {report['duration']:.0f}s, {report['commands_per_sec']:.1f} commands/s")
+    print(f"\n{'':<10} {'count':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = list(report["latency"].items()) + [("loop lag", report["loop_lag"])]
+    for name, stats in rows:
+        if stats:
+            print(f"{name:<10} {stats['count']:>8,} {stats['p50_ms']:>9.1f} {stats['p90_ms']:>9.1f} "
+                  f"{stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+    rest = report["rest"]
+    print(f"\nREST: {rest['requests']:,} calls, {rest['throttled']:,} waited for a rate limit bucket, "
+          f"{rest['rate_limited']:,} 429s, {rest['wait']:.1f}s spent waiting; "
+          f"{report['expired_interactions']:,} button presses answered too late")
+    print(f"Outbox: {report['outbox']}")
+    for label in ("command_errors", "gave_up", "user_failures"):
+        if report[label]:
+            print(f"{label.replace('_', ' ').capitalize()}: {report[label]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to keep starting new commands")
+    parser.add_argument("--guilds", type=int, default=1)
+    parser.add_argument("--channels", type=int, default=10, help="Game channels per guild")
+    parser.add_argument("--think", type=float, default=2.0, help="Mean seconds a user waits between actions")
+    parser.add_argument("--rest-latency", type=float, default=0.05)
+    parser.add_argument("--rest-jitter", type=float, default=0.02)
+    parser.add_argument("--rate", type=int, default=5, help="REST calls allowed per bucket per --per seconds")
+    parser.add_argument("--per", type=float, default=5.0)
+    parser.add_argument("--error-429", type=float, default=0.0, help="Chance of an unexpected 429 on any REST call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)  # bot.py keeps its data files in the working directory
+    try:
+        import bot as app
+        report = asyncio.run(run(args, app))
+        app.storage.close()
+        app.storage_executor.shutdown()
+    finally:
+        shutil.rmtree(directory)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if report["command_errors"] or report["user_failures"]:
+        sys.exit(f"FAILED: command errors {report['command_errors']}, user failures {report['user_failures']}")
+
+
+if __name__ == "__main__":
+    main()
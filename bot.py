@@ -7,46 +7,278 @@ from datetime import datetime, timedelta
 import random
 import time
 import itertools
-import threading
+from io import BytesIO
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from cache import AccountCache, TTLCache
+from storage import JsonStorage, SharedAccounts, SqliteStorage, migrate_json_to_sqlite
+from ranking import RANK_NAMES, RANKS, RankIndex, get_rank_index, get_role_name
+from leaderboard import LeaderboardSnapshot
+from locks import AccountLocks, Leases
+from ledger import Ledger
+from jackpot import MAX_SPINS, spin_batch
+from parley import ParleyBook
+from scheduler import Scheduler
+from shards import ShardStats, shard_for
+from router import InteractionRouter
+from games import GAMES, Blackjack, HighLow, Unlocker
+from sessions import SessionStore
+from outbound import Outbox
+from metrics import Metrics
+from profiler import MAX_SECONDS as MAX_PROFILE_SECONDS, LiveProfiler
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.reactions = True
-bot = commands.Bot(command_prefix="!", intents=intents, case_insensitive=True)
+
+# One process runs every shard Discord recommends by default. launcher.py splits the bot across
+# processes by starting each one with the total SHARD_COUNT and the SHARD_IDS it owns.
+SHARD_COUNT = int(os.environ["SHARD_COUNT"]) if os.environ.get("SHARD_COUNT") else None
+SHARD_IDS = [int(shard_id) for shard_id in os.environ["SHARD_IDS"].split(",")] if os.environ.get("SHARD_IDS") else None
+MULTI_PROCESS = SHARD_IDS is not None and len(SHARD_IDS) < SHARD_COUNT  # Other processes own the remaining shards
+PRIMARY_PROCESS = SHARD_IDS is None or 0 in SHARD_IDS  # Runs what must only happen once, like settling parleys
+
+METRICS_HOST = "127.0.0.1"  # Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics, local scrapers only
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9108")) + (SHARD_IDS[0] if SHARD_IDS else 0)  # A port per shard process
+metrics = Metrics()
+
+bot = commands.AutoShardedBot(command_prefix="!", intents=intents, case_insensitive=True,
+                              shard_count=SHARD_COUNT, shard_ids=SHARD_IDS,
+                              http_trace=metrics.http_trace())  # Counts every REST call by route and status
+shard_stats = ShardStats()
 
 BUX_DIRECTORY = "bux_data/"
 GAMERS_FILE = 'gamers.json'
 PARLEY_DIRECTORY = "parley_data/"
-bux_lock = threading.Lock()
-gamers_lock = threading.Lock()
-parley_lock = threading.Lock()
-
-
-if not os.path.exists(BUX_DIRECTORY):
-    os.makedirs(BUX_DIRECTORY)
+DATABASE_FILE = "bux.db"
+LEDGER_FILE = "ledger.jsonl"
+LEDGER_SNAPSHOT_FILE = "ledger_snapshot.json"
+SCHEDULE_FILE = "schedule.json"
+SESSION_DIRECTORY = "session_data/"
+STORAGE_BACKEND = "json"  # "json" for the per-user files or "sqlite" for DATABASE_FILE (run !migrate first)
+LEADERBOARD_PAGE_SIZE = 7
+LEADERBOARD_REFRESH = 30  # Seconds a leaderboard snapshot is served before it's rebuilt with whatever changed
+LEADERBOARD_CHANGES = 500  # Balance changes that rebuild the snapshot right away instead of waiting
+PARLEY_CHANNEL_NAME = "challenger-parley🥊"
+PARLEY_CHANNEL_ID = int(os.environ["PARLEY_CHANNEL_ID"]) if os.environ.get("PARLEY_CHANNEL_ID") else None  # For when its guild is on another process's shard
+
+if MULTI_PROCESS and STORAGE_BACKEND != "sqlite":
+    raise RuntimeError('Shard processes share one database: run !migrate and set STORAGE_BACKEND = "sqlite" first')
+
+json_storage = JsonStorage(BUX_DIRECTORY, PARLEY_DIRECTORY, GAMERS_FILE, SESSION_DIRECTORY)
+storage = SqliteStorage(DATABASE_FILE) if STORAGE_BACKEND == "sqlite" else json_storage
+
+if MULTI_PROCESS:
+    # Other processes write the same accounts: flush on every tick, re-read anything we haven't changed
+    # and write balances as changes on top of what's stored, so concurrent updates from two processes both count
+    shared_accounts = SharedAccounts(storage)
+    bux_cache = AccountCache(shared_accounts.load, shared_accounts.save, flush_every=0, max_age=0)
+    ledger = None  # It would only see this process's changes, so its balances can't be used for recovery
+else:
+    bux_cache = AccountCache(storage.load_account, storage.save_accounts)
+    ledger = Ledger(LEDGER_FILE, LEDGER_SNAPSHOT_FILE)  # Every balance change, so nothing is lost if we crash before a flush
+
+rank_index = RankIndex()  # Kept current by save_bux
+username_cache = TTLCache(max_entries=50_000, ttl=6 * 60 * 60)  # user_id -> name, for leaderboard rendering
+
+def recover_from_ledger():
+    """Replay the ledger and repair any balance the write-behind cache didn't get onto disk before a crash."""
+    if ledger is None:
+        return
+    if not ledger.load():
+        ledger.reset((user_id, user_data["bux"]) for user_id, user_data in storage.iter_accounts())  # First run
+        return
 
-if not os.path.exists(PARLEY_DIRECTORY):
-    os.makedirs(PARLEY_DIRECTORY)
+    stored = dict(storage.iter_accounts())
+    repaired = {}
+    for user_id, bux in ledger.balances.items():
+        user_data = stored.get(user_id, {"username": "Unknown", "bux": 0, "last_claimed": "2000-01-01"})
+        if user_data["bux"] != bux:
+            user_data["bux"] = bux
+            repaired[user_id] = user_data
+    if repaired:
+        storage.save_accounts(repaired)
+        print(f"Recovered {len(repaired)} balances from the ledger")
+
+def build_indexes():
+    """Rebuild the rank index and seed the username cache from storage."""
+    balances = []
+    for user_id, user_data in storage.iter_accounts():
+        balances.append((user_id, user_data["bux"]))
+        if user_data.get("username", "Unknown") != "Unknown":
+            username_cache.set(user_id, user_data["username"])
+    rank_index.rebuild(balances)
+
+recover_from_ledger()
+build_indexes()
+leaderboard = LeaderboardSnapshot(rank_index.snapshot(), rank_index.changes, LEADERBOARD_PAGE_SIZE)  # Swapped out by refresh_leaderboard
 
 def load_bux(user_id: str) -> dict: 
     """Load a specific user's bux data. If the file doesn't exist, return a default structure."""
-    user_file = os.path.join(BUX_DIRECTORY, f"{user_id}.json")
+    user_data = bux_cache.get(user_id)
 
-    if not os.path.exists(user_file):
+    if user_data is None:
         return {"username": "Unknown", "bux": 0, "last_claimed": "2000-01-01"}  # Default for new users
 
-    with open(user_file, "r") as file:
-        return json.load(file)
+    return user_data
 
-def save_bux(user_id, data):
-    """Save the Bux data for a specific user, ensuring all Bux values are rounded."""
-    user_file = os.path.join(BUX_DIRECTORY, f"{user_id}.json")
-    
-    with bux_lock:  # Lock for thread-safe operations
-        data["bux"] = round(data["bux"])  # Ensure Bux is a whole number
-        
-        with open(user_file, 'w') as f:
-            json.dump(data, f, indent=4)
+def record_bux_change(user_id, data, event):
+    """Journal the difference between the new balance and the last one the ledger saw."""
+    if ledger is None:
+        return
+    amount = data["bux"] - ledger.balances.get(user_id, 0)
+    if amount:
+        ledger.record(event, user_id, amount)
+
+def save_bux(user_id, data, event):
+    """Save the Bux data for a specific user, ensuring all Bux values are rounded. event is the ledger event type."""
+    data["bux"] = round(data["bux"])  # Ensure Bux is a whole number
+    record_bux_change(user_id, data, event)
+    bux_cache.put(user_id, data)  # Written to disk by flush_bux
+    rank_index.update(user_id, data["bux"])
+    metrics.inc("bux_saves_total")
+
+def save_bux_many(records, event):
+    """Save several users' Bux data together so they're always flushed in the same transaction."""
+    for user_id, data in records.items():
+        data["bux"] = round(data["bux"])
+        record_bux_change(user_id, data, event)
+    bux_cache.put_many(records)
+    for user_id, data in records.items():
+        rank_index.update(user_id, data["bux"])
+    metrics.inc("bux_saves_total", len(records))
+
+storage_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="storage")  # Bounded, so a burst can't spawn unlimited I/O
+account_locks = AccountLocks()  # Per-user locks; unrelated users never wait on each other
+
+async def run_io(func, *args):
+    """Run a blocking storage call on the storage executor so the event loop never waits on disk."""
+    return await asyncio.get_running_loop().run_in_executor(storage_executor, func, *args)
+
+@metrics.timed("hot_path_duration_seconds", path="load_bux")
+async def aload_bux(user_id: str) -> dict:
+    """Async load_bux: served straight from the cache when possible, otherwise read on the storage executor."""
+    user_data = bux_cache.get_cached(user_id)
+    if user_data is None:
+        user_data = await run_io(load_bux, user_id)
+    return user_data
+
+async def credit_bux(user_id: str, amount, event="payout") -> dict:
+    """Add bux to a user's balance under their account lock. Returns the updated data."""
+    async with account_locks.hold(user_id):
+        user_data = await aload_bux(user_id)
+        user_data["bux"] += amount
+        save_bux(user_id, user_data, event)
+        return user_data
+
+async def credit_bux_many(amounts, event="payout"):
+    """Credit several users at once: one lock pass in a fixed order and one batched write."""
+    async with account_locks.hold(*amounts):
+        records = {}
+        for user_id, amount in amounts.items():
+            records[user_id] = await aload_bux(user_id)
+            records[user_id]["bux"] += amount
+        save_bux_many(records, event)
+        return records
+
+async def debit_bux(user_id: str, amount, event="bet_placed"):
+    """Take bux from a user's balance if they have enough. Returns the updated data, or None if they don't."""
+    async with account_locks.hold(user_id):
+        user_data = await aload_bux(user_id)
+        if user_data["bux"] < amount:
+            return None
+        user_data["bux"] -= amount
+        save_bux(user_id, user_data, event)
+        return user_data
+
+BULK_BATCH = 1_000  # Accounts the all-users ab/rb reads, locks and writes together
+bulk_lock = asyncio.Lock()  # One all-users pass at a time, each is a single storage transaction
+
+async def bulk_adjust_bux(adjust, event="admin_adjust", progress=None):
+    """Apply adjust(bux) to every account in one streaming pass. Returns (accounts seen, accounts changed, ids whose rank changed).
+
+    adjust returns the new balance, or None to leave the account alone. The bux cache is
+    flushed first, so accounts that so far only exist in memory (like a first !d) are in
+    storage to be read. On SQLite the whole pass is one transaction; accounts are read from a
+    cursor BULK_BATCH at a time on the storage executor and adjusted under their locks, from
+    the cached record when there is one since it can be newer than storage. Each batch is
+    journaled, put in the rank index at once and written without pushing the active players
+    out of the bux cache. progress(accounts seen), if given, is called after every batch.
+    """
+    async with bulk_lock:
+        if ledger is not None:
+            await run_io(ledger.commit)  # The journal always reaches disk before the balances it explains
+        await run_io(bux_cache.flush)
+        await run_io(storage.begin_bulk)
+        try:
+            accounts = storage.iter_accounts()
+            seen = changed = 0
+            rank_changed = set()
+            while True:
+                batch = await run_io(lambda: list(itertools.islice(accounts, BULK_BATCH)))
+                if not batch:
+                    break
+                async with account_locks.hold(*(user_id for user_id, _ in batch)):
+                    records = {}
+                    read_from_storage = {}
+                    for user_id, stored_data in batch:
+                        user_data = bux_cache.get_cached(user_id)
+                        if user_data is None:
+                            user_data = stored_data
+                            read_from_storage[user_id] = stored_data["bux"]
+                        bux = adjust(user_data["bux"])
+                        if bux is None:
+                            continue
+                        bux = round(bux)
+                        if get_rank_index(bux) != get_rank_index(user_data["bux"]):
+                            rank_changed.add(user_id)
+                        user_data["bux"] = bux
+                        record_bux_change(user_id, user_data, event)
+                        records[user_id] = user_data
+                    rank_index.update_many((user_id, user_data["bux"]) for user_id, user_data in records.items())
+                    if ledger is not None:
+                        await run_io(ledger.commit)
+                    if MULTI_PROCESS:  # Count the change from the balance just read, not one the cache read earlier
+                        shared_accounts.rebase(read_from_storage)
+                    await run_io(bux_cache.write_many, records)
+                    metrics.inc("bux_saves_total", len(records))
+                seen += len(batch)
+                changed += len(records)
+                if progress is not None:
+                    progress(seen)
+        finally:
+            # Committed even if the pass stopped early: the journal, rank index and cache already have those batches
+            await run_io(storage.finish_bulk)
+    return seen, changed, rank_changed
+
+def bulk_progress(message, text):
+    """A bulk_adjust_bux progress callback that edits message through the outbox, where pending edits collapse."""
+    total = max(len(rank_index), 1)  # Every account is in the index
+    return lambda seen: outbox.edit(message, f"{text} {seen:,}/{total:,} accounts ({min(seen / total, 1):.0%})")
+
+@tasks.loop(seconds=0.2)
+async def commit_ledger():
+    """Group commit: one journal write and fsync for everything recorded since the last run."""
+    try:
+        if ledger.pending:
+            await run_io(ledger.commit)
+        if ledger.should_snapshot():
+            await run_io(ledger.snapshot)
+    except Exception as exc:  # An exception would stop the loop for good; what failed is retried next run
+        metrics.inc("background_errors_total", task="commit_ledger")
+        print(f"Ledger commit failed, retrying: {exc!r}")
+
+@tasks.loop(seconds=0.2 if MULTI_PROCESS else 1)
+async def flush_bux():
+    """Write dirty bux records to disk once the cache's time or count threshold is hit."""
+    if bux_cache.should_flush():
+        try:
+            if ledger is not None:
+                await run_io(ledger.commit)  # The journal always reaches disk before the balances it explains
+            await run_io(bux_cache.flush)
+        except Exception as exc:  # The cache keeps the records dirty, so the next run retries them
+            metrics.inc("background_errors_total", task="flush_bux")
+            print(f"Bux flush failed, retrying: {exc!r}")
 
 # Daily Command
 @bot.command()
@@ -55,24 +287,25 @@ async def d(ctx):
     user_id = str(ctx.author.id)
     now = datetime.utcnow().strftime('%Y-%m-%d')
 
-    user_data = load_bux(user_id)
-    if user_data["username"] == "Unknown":
-        user_data = {
-            "username": ctx.author.name,  # Set the username when a new user claims
-            "bux": 25000,  # Give them the daily reward immediately
-            "last_claimed": now
-        }
-        save_bux(user_id, user_data)
-        await ctx.send(f"{ctx.author.mention}, welcome! You claimed your first daily 25000 bux! 🎉")
-        return
+    async with account_locks.hold(user_id):
+        user_data = await aload_bux(user_id)
+        if user_data["username"] == "Unknown":
+            user_data = {
+                "username": ctx.author.name,  # Set the username when a new user claims
+                "bux": 25000,  # Give them the daily reward immediately
+                "last_claimed": now
+            }
+            save_bux(user_id, user_data, "daily")
+            await ctx.send(f"{ctx.author.mention}, welcome! You claimed your first daily 25000 bux! 🎉")
+            return
 
-    if user_data.get("last_claimed") == now:
-        await ctx.send(f"{ctx.author.mention}, you already claimed your daily bux today! Come back tomorrow.")
-        return
-    
-    user_data["bux"] += 25000
-    user_data["last_claimed"] = now
-    save_bux(user_id, user_data)
+        if user_data.get("last_claimed") == now:
+            await ctx.send(f"{ctx.author.mention}, you already claimed your daily bux today! Come back tomorrow.")
+            return
+
+        user_data["bux"] += 25000
+        user_data["last_claimed"] = now
+        save_bux(user_id, user_data, "daily")
 
     await ctx.send(f"{ctx.author.mention}, you claimed your daily 25000 bux! 🎉")
 
@@ -84,54 +317,55 @@ async def g(ctx, member: discord.Member, amount: str):
     receiver_id = str(member.id)
     player_id = ctx.author.id
     player2_id = member.id
-    giver_data = load_bux(giver_id)
-    receiver_data = load_bux(receiver_id)
 
-    # Check if the amount is "all"
-    if amount.lower() == "all":
-        amount = giver_data["bux"]  # Set the amount to all remaining bux
-    else:
-        # Check if the amount can be converted to a float
-        try:
-            amount = float(amount.replace(",", ""))
-        except ValueError:
-            await ctx.send(f"{ctx.author.mention}, please provide a valid number for the amount.")
-            return
+    async with account_locks.hold(giver_id, receiver_id):  # Always locked in the same order, so two gives can't deadlock
+        giver_data = await aload_bux(giver_id)
+        receiver_data = await aload_bux(receiver_id)
 
+        # Check if the amount is "all"
+        if amount.lower() == "all":
+            amount = giver_data["bux"]  # Set the amount to all remaining bux
+        else:
+            # Check if the amount can be converted to a float
+            try:
+                amount = float(amount.replace(",", ""))
+            except ValueError:
+                await ctx.send(f"{ctx.author.mention}, please provide a valid number for the amount.")
+                return
 
-    if is_in_bet(player_id):
-        await ctx.send(f"{ctx.author.mention}, you already have an open bet. Please wait until it's settled.")
-        return  
-    if is_in_bet(player2_id):
-        await ctx.send(f"{member.mention}, you already have an open bet. Please wait until it's settled.")
-        return  
 
-    if giver_data["bux"] < amount:
-        await ctx.send(f"{ctx.author.mention}, you don't have enough bux to give this amount.")
-        return
+        if is_in_bet(player_id):
+            await ctx.send(f"{ctx.author.mention}, you already have an open bet. Please wait until it's settled.")
+            return  
+        if is_in_bet(player2_id):
+            await ctx.send(f"{member.mention}, you already have an open bet. Please wait until it's settled.")
+            return  
 
-    if amount <= 0:
-        await ctx.send("You must give a positive amount of bux!")
-        return
+        if giver_data["bux"] < amount:
+            await ctx.send(f"{ctx.author.mention}, you don't have enough bux to give this amount.")
+            return
 
-    if giver_id == receiver_id:
-        await ctx.send(f"{ctx.author.mention}, you can't do that! 😅")
-        return
+        if amount <= 0:
+            await ctx.send("You must give a positive amount of bux!")
+            return
+
+        if giver_id == receiver_id:
+            await ctx.send(f"{ctx.author.mention}, you can't do that! 😅")
+            return
 
-    giver_data["bux"] -= amount
-    receiver_data["bux"] += amount
+        giver_data["bux"] -= amount
+        receiver_data["bux"] += amount
 
-    save_bux(giver_id, giver_data)
-    save_bux(receiver_id, receiver_data)
+        save_bux_many({giver_id: giver_data, receiver_id: receiver_data}, "transfer")
 
     await ctx.send(f"{ctx.author.mention} has successfully given {amount} bux to {member.mention}! 🎉")
     await assign_role_based_on_bux(ctx, ctx.author)
     await assign_role_based_on_bux(ctx, member)
     
 
-def has_enough_bux(user_id: str, amount: float) -> bool:
+async def has_enough_bux(user_id: str, amount: float) -> bool:
     """Checks if a user has enough bux to participate in a bet."""
-    return load_bux(user_id)["bux"] >= amount
+    return (await aload_bux(user_id))["bux"] >= amount
 
 
 #Help
@@ -165,76 +399,115 @@ async def h(ctx):
 - :slot_machine: **Jackpot** `!j` `<amount>` `<amount_of_spins>` ( Jackpot slot machine, Spin and try your luck!  )
 - :arrow_up_down: **High/Low** `!hl` `<amount>` ( Play a high/low card game with increasing multipliers. )
 - :money_with_wings: **Bank**: `!b` (Check the amount of bux you have. If your broke you'll get welfare! )
-- 🏆 **Leaderboards**: `!l` ( Check your rank on the leaderboards! )
+- 🏆 **Leaderboards**: `!l <page>` ( Check your rank on the leaderboards! `!l me` jumps to your page )
 - :grey_question: **Help**: `!h` ( Shows this )
     """
     await ctx.send(help_message)
 
 #AssignRoles    
+guild_rank_roles = {}  # guild_id -> {role_name: role}, so we don't scan guild.roles every command
+member_ranks = TTLCache(max_entries=100_000, ttl=24 * 60 * 60)  # (guild_id, member_id) -> rank role last announced
+
+async def get_rank_role(guild, role_name):
+    """Returns the guild's role for a rank, creating it the first time it's needed."""
+    roles = guild_rank_roles.get(guild.id)
+    if roles is None:
+        roles = {role.name: role for role in guild.roles if role.name in RANK_NAMES}
+        guild_rank_roles[guild.id] = roles
+
+    role = roles.get(role_name)
+    if not role:
+        role = await guild.create_role(name=role_name, mentionable=True)
+        roles[role_name] = role
+    return role
+
+@metrics.timed("hot_path_duration_seconds", path="assign_role")
 async def assign_role_based_on_bux(ctx, member):
+    """Give the member the rank role for their balance. ctx is anything with send(), the guild comes from member."""
     user_id = str(member.id)
-    user_data = load_bux(user_id)
+    user_data = await aload_bux(user_id)
     if not user_data:
         await ctx.send(f"{member.mention} doesn't have any bux data.")
         return
 
     bux = user_data.get("bux", 0)
     role_name = get_role_name(bux)
-    role = discord.utils.get(ctx.guild.roles, name=role_name)
-    if not role:
-        role = await ctx.guild.create_role(name=role_name, mentionable=True)
+    memo_key = (member.guild.id, member.id)
+
+    # member.roles is what Discord sent with the message, so a role removed or deleted by hand is
+    # put back; without the members intent no event would tell us it changed
+    roles_to_remove = [r for r in member.roles if r.name in RANK_NAMES and r.name != role_name]
+    has_role = any(r.name == role_name for r in member.roles)
+    if has_role and not roles_to_remove:
+        member_ranks.set(memo_key, role_name)  # Already right, without any REST calls
+        return
 
-    rank_roles = [
-        "Challenger🥊", "High Roller💳", "Grandmaster🏆", "Master⭐", "Champion👑", 
-        "Lucky🍀", "Obsidian🐱‍👤", "Diamond💎", "Emerald❇️", "Ruby🩸", "Platinum🎖️", 
-        "Gold🏅", "Silver🥈", "Bronze🥉", "Brokie🐀"
-    ]
-    roles_to_remove = [r for r in member.roles if r.name in rank_roles and r.name != role_name]
+    role = await get_rank_role(member.guild, role_name)
     if roles_to_remove:
         await member.remove_roles(*roles_to_remove)  # Remove all previous rank roles
 
-    if role not in member.roles:
+    if not has_role:
         await member.add_roles(role)
-        await ctx.send(f"{member.mention} is now {role_name}!")
-
-#GetRoles
-def get_role_name(bux):
-    """Returns the role name based on the amount of bux."""
-    if bux >= 100_000_000_000_000_000_000_000_000_000_000_000_000_000_000_000:
-        return "Challenger🥊"
-    elif bux >= 100_000_000_000_000_000_000_000_000_000_000_000_000_000_000:
-        return "High Roller💳"
-    elif bux >= 100_000_000_000_000_000_000_000_000_000_000_000_000_000:
-        return "Grandmaster🏆"
-    elif bux >= 100_000_000_000_000_000_000_000_000_000_000_000_000:
-        return "Master⭐"
-    elif bux >= 100_000_000_000_000_000_000_000_000_000_000_000:
-        return "Champion👑"
-    elif bux >= 100_000_000_000_000_000_000_000_000_000_000:
-        return "Lucky🍀"
-    elif bux >= 100_000_000_000_000_000_000_000_000_000:
-        return "Obsidian🐱‍👤"
-    elif bux >= 100_000_000_000_000_000_000_000_000:
-        return "Diamond💎"
-    elif bux >= 100_000_000_000_000_000_000:
-        return "Emerald❇️"
-    elif bux >= 100_000_000_000_000_000:
-        return "Ruby🩸"
-    elif bux >= 100_000_000_000_000:
-        return "Platinum🎖️"
-    elif bux >= 100_000_000_000:
-        return "Gold🏅"
-    elif bux >= 100_000_000:
-        return "Silver🥈"
-    elif bux >= 100_000:
-        return "Bronze🥉"
-    else:
-        return "Brokie🐀"
+        if member_ranks.get(memo_key) != role_name:  # Restoring a role they already had isn't news
+            await ctx.send(f"{member.mention} is now {role_name}!")
+    member_ranks.set(memo_key, role_name)
+
+async def resolve_member(guild, user_id):
+    """The guild's member for user_id, or None if they left. Without the members intent the cache rarely has them, so fetch."""
+    member = guild.get_member(int(user_id))
+    if member is None:
+        try:
+            member = await guild.fetch_member(int(user_id))
+        except discord.NotFound:
+            return None
+    return member
+
+MEMBER_QUERY_SIZE = 100  # User ids per gateway member request, Discord's limit
+
+async def recompute_roles(guild, channel, user_ids):
+    """One background pass fixing the rank roles of guild's members among user_ids, announcing promotions through the outbox.
+
+    Without the members intent the member cache is nearly empty, so members are asked for over
+    the gateway MEMBER_QUERY_SIZE at a time; only those in this guild come back. Members of
+    other guilds get theirs the next time they run a command.
+    """
+    async def announce(content):
+        outbox.send(channel, content)
 
-last_cooldown_message = {}
+    announcer = SimpleNamespace(send=announce)
+    user_ids = [int(user_id) for user_id in user_ids]
+    for start in range(0, len(user_ids), MEMBER_QUERY_SIZE):
+        try:
+            members = await guild.query_members(user_ids=user_ids[start:start + MEMBER_QUERY_SIZE],
+                                                limit=MEMBER_QUERY_SIZE, cache=False)
+        except asyncio.TimeoutError:
+            print(f"Timed out asking for {guild}'s members, skipping {MEMBER_QUERY_SIZE} rank roles")
+            continue
+        for member in members:
+            try:
+                await assign_role_based_on_bux(announcer, member)
+            except discord.HTTPException as exc:
+                print(f"Couldn't update the rank role of {member}: {exc}")
+
+@bot.event
+async def on_guild_role_create(role):
+    guild_rank_roles.pop(role.guild.id, None)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    guild_rank_roles.pop(after.guild.id, None)
+
+@bot.event
+async def on_guild_role_delete(role):
+    guild_rank_roles.pop(role.guild.id, None)
+
+COOLDOWN_NOTICE_INTERVAL = 5  # Seconds between "you are on cooldown" replies to one user
+last_cooldown_message = TTLCache(max_entries=10_000, ttl=COOLDOWN_NOTICE_INTERVAL)  # Keyed by user, not shard: the same user can run commands in guilds on any shard
 
 @bot.event
 async def on_command_error(ctx, error):
+    metrics.inc("command_errors_total", command=ctx.command.name if ctx.command else "unknown",
+                error=type(getattr(error, "original", error)).__name__)  # What a CommandInvokeError wraps
 
     if isinstance(error, commands.MissingRequiredArgument):
         await ctx.send(f"You're missing `{error.param}` :D")
@@ -254,9 +527,9 @@ async def on_command_error(ctx, error):
 
         last_message_time = last_cooldown_message.get(user_id, 0)
 
-        if current_time - last_message_time >= 5:
+        if current_time - last_message_time >= COOLDOWN_NOTICE_INTERVAL:
             await ctx.send(f"{ctx.author.mention}, you are on cooldown! Try again in {round(error.retry_after, 2)} seconds.")
-            last_cooldown_message[user_id] = current_time  # Update the timestamp
+            last_cooldown_message.set(user_id, current_time)  # Update the timestamp, forgotten once it no longer matters
 
     else:
         await ctx.send("An unexpected error occurred.")
@@ -284,19 +557,17 @@ async def ab(ctx, bux: str, member: discord.Member = None):
 
     if member:
         user_id = str(member.id)
-        user_data = load_bux(user_id)
-        user_data["bux"] += bux
+        await credit_bux(user_id, bux, "admin_adjust")
         formatted_bux = f"{bux:,.2f}"  # Add a decimal format
         await ctx.send(f"Added {formatted_bux} bux to {member.name}.")
-        save_bux(user_id, user_data)
     else:
-        bux_data = load_bux()  # Load all bux data
-        for user_id, user_data in bux_data.items():
-            user_data["bux"] += bux
-            save_bux(user_id, user_data)  # Save each user's updated data
-
         formatted_bux = f"{bux:,.2f}" 
-        await ctx.send(f"Added {formatted_bux} bux to all users.")
+        status = await ctx.send(f"Adding {formatted_bux} bux to all users...")
+        seen, changed, rank_changed = await bulk_adjust_bux(
+            lambda balance: balance + bux, progress=bulk_progress(status, f"Adding {formatted_bux} bux:"))
+        outbox.edit(status, f"Added {formatted_bux} bux to all users.")
+        await ctx.send(f"Added {formatted_bux} bux to {changed:,} users, {len(rank_changed):,} of them changed rank.")
+        asyncio.create_task(recompute_roles(ctx.guild, ctx.channel, rank_changed))
 
 
 # RemoveBux Command
@@ -319,70 +590,277 @@ async def rb(ctx, bux: str, member: discord.Member = None):
 
     if member:
         user_id = str(member.id)
-        user_data = load_bux(user_id)
-        
-        if user_data["bux"] < bux:
+
+        if await debit_bux(user_id, bux, "admin_adjust") is None:
             await ctx.send(f"{member.name} doesn't have enough bux to remove.")
             return
     
-        user_data["bux"] -= bux
         formatted_bux = f"{bux:,.2f}" 
         await ctx.send(f"Removed {formatted_bux} bux from {member.name}.")
-        save_bux(user_id, user_data)
     else:
-        bux_data = load_bux()  # Load all bux data
-        for user_id, user_data in bux_data.items():
-            if user_data["bux"] >= bux:
-                user_data["bux"] -= bux
-                save_bux(user_id, user_data)  # Save each user's updated data
-        
         formatted_bux = f"{bux:,.2f}" 
-        await ctx.send(f"Removed {formatted_bux} bux from all users.")
+        status = await ctx.send(f"Removing {formatted_bux} bux from all users...")
+        seen, changed, rank_changed = await bulk_adjust_bux(
+            lambda balance: balance - bux if balance >= bux else None,  # Only from those who can afford it
+            progress=bulk_progress(status, f"Removing {formatted_bux} bux:"))
+        outbox.edit(status, f"Removed {formatted_bux} bux from all users.")
+        await ctx.send(f"Removed {formatted_bux} bux from {changed:,} of {seen:,} users, {len(rank_changed):,} of them changed rank.")
+        asyncio.create_task(recompute_roles(ctx.guild, ctx.channel, rank_changed))
 
 # Leaderboard Command
 @bot.command()
-async def l(ctx):
-    """!l (Check your rank on the leaderboards.)"""
+async def l(ctx, page: str = "1"):
+    """!l <page> (Check your rank on the leaderboards.) !l me shows the page you're on."""
     user_id = str(ctx.author.id)
 
-    if not check_bux_entry(user_id):
+    if not await check_bux_entry(user_id):
         await ctx.send(f"{ctx.author.mention}, you need to claim your daily first with `!d`")
         return
 
-    leaderboard_data = []
-    for filename in os.listdir(BUX_DIRECTORY):
-        if filename.endswith(".json"):
-            user_id_from_file = filename.replace(".json", "")
-            user_data = load_bux(user_id_from_file)
-            leaderboard_data.append((user_id_from_file, user_data["bux"]))
-    
-    sorted_bux = sorted(leaderboard_data, key=lambda x: x[1], reverse=True)
-    user_rank = next((index + 1 for index, (uid, _) in enumerate(sorted_bux) if uid == user_id), None)
-    top_7 = sorted_bux[:7]
-    leaderboard_message = "🏆 **Top 7** 🏆\n\n"
-    rank = 1
+    snapshot = leaderboard  # Pages come from the last snapshot, so they stay consistent while someone pages through
+    if page.lower() == "me":
+        page_number = snapshot.page_of(user_id) or snapshot.pages  # Not in the snapshot yet: they're new, so near the end
+    elif page.isdigit() and int(page) >= 1:
+        page_number = int(page)
+    else:
+        await ctx.send("Please use `!l <page>` with a page number, or `!l me` for the page you're on.")
+        return
+    if page_number > snapshot.pages:
+        await ctx.send(f"There {'is' if snapshot.pages == 1 else 'are'} only {snapshot.pages:,} leaderboard page{'' if snapshot.pages == 1 else 's'}.")
+        return
 
     await assign_role_based_on_bux(ctx, ctx.author)
 
-    for uid, bux in top_7:
-        user = await bot.fetch_user(uid)
-        formatted_bux = f"{bux:,.2f}"
-        leaderboard_message += f"**{rank}. {user.name}** - {formatted_bux} bux\n"
-        rank += 1
+    leaderboard_message = f"🏆 **Leaderboard** (page {page_number:,}/{snapshot.pages:,}) 🏆\n\n"
+    leaderboard_message += await snapshot.page_text(page_number, resolve_usernames) + "\n"
 
+    user_rank = rank_index.rank(user_id)  # Live, so it reflects what they just won or lost
     if user_rank:
         leaderboard_message += f"\n🔹 {ctx.author.mention}, you are ranked **#{user_rank}** on the leaderboard."
 
     await ctx.send(leaderboard_message)
 
-open_bets = {}  # Format: {player_id: True/False}
+@tasks.loop(seconds=5)
+async def refresh_leaderboard():
+    """Rebuild the leaderboard snapshot once it's LEADERBOARD_REFRESH seconds old or LEADERBOARD_CHANGES balances behind."""
+    global leaderboard
+    behind = rank_index.changes - leaderboard.changes
+    if not behind:
+        return
+    if behind < LEADERBOARD_CHANGES and time.monotonic() - leaderboard.taken_at < LEADERBOARD_REFRESH:
+        return
+    changes = rank_index.changes
+    entries = rank_index.snapshot()  # The copy is taken on the loop thread, where the index changes
+    leaderboard = await run_io(LeaderboardSnapshot, entries, changes, LEADERBOARD_PAGE_SIZE)
+    await leaderboard.page_text(1, resolve_usernames)  # The page almost everyone asks for, rendered before they do
+
+async def resolve_usernames(user_ids):
+    """Returns {user_id: name}, checking the username cache and gateway cache first and fetching the rest concurrently."""
+    usernames = {}
+    missing = []
+    for uid in user_ids:
+        name = username_cache.get(uid)
+        if name is None:
+            user = bot.get_user(int(uid))  # Gateway member cache, no REST call
+            if user:
+                name = user.name
+                username_cache.set(uid, name)
+        if name is None:
+            missing.append(uid)
+        else:
+            usernames[uid] = name
+
+    fetched = await asyncio.gather(*(bot.fetch_user(int(uid)) for uid in missing), return_exceptions=True)
+    for uid, user in zip(missing, fetched):
+        if isinstance(user, Exception):
+            usernames[uid] = "Unknown"
+        else:
+            usernames[uid] = user.name
+            username_cache.set(uid, user.name)
+
+    return usernames
+
+#Interactions
+router = InteractionRouter()  # Pending one-off inputs like a parley pick, found by key instead of running every wait_for check
+
+def wait_for_message(channel, user_id, check, timeout):
+    """Wait for a message from user_id in channel that passes check. Returns the message."""
+    return router.wait(("message", channel.id, user_id), check, timeout)
+
+@bot.listen("on_message")
+async def route_message(message):
+    key = ("message", message.channel.id, message.author.id)
+    if not router.dispatch(key, message):
+        session_id = sessions.find(key)
+        if session_id:
+            await advance_session(session_id, key, message)
+
+#Game sessions
+outbox = Outbox()  # Coalesced, per-channel queued sends and board edits
+sessions = SessionStore()  # bj, hl and u games, saved after every turn and resumed after a restart
+sessions.load_index(storage.iter_sessions())
+session_locks = AccountLocks()  # One turn at a time per session
+
+def game_channel(channel_id):
+    """Somewhere to send to, even a DM or a channel that isn't cached yet after a restart."""
+    return bot.get_channel(channel_id) or bot.get_partial_messageable(channel_id)
+
+async def start_session(ctx, game, output_channel):
+    """Start a game whose bet has already been taken. It talks in output_channel (a DM for !u)."""
+    session = {
+        "id": sessions.new_id(),
+        "game": game.name,
+        "user_id": str(ctx.author.id),
+        "guild_id": ctx.guild.id if ctx.guild else None,
+        "channel_id": ctx.channel.id,
+        "output_id": output_channel.id,
+        "key": None,  # The interaction it's waiting on, set by each prompt
+        "expires_at": time.time() + 600,
+        "state": None,
+    }
+    sessions.put(session)  # Counts as an open bet from here on
+    async with session_locks.hold(session["id"]):
+        try:
+            await run_step(session, game, game.start(), player=ctx.author)
+        except discord.HTTPException:
+            if session["state"] is None and session["id"] in sessions.index:  # Never got as far as its first prompt
+                sessions.remove(session["id"])
+                await credit_bux(session["user_id"], game.bet)
+            raise
+
+async def advance_session(session_id, key, value, interaction=None):
+    """Feed a button action, a message, or None for a timeout to the session's game."""
+    async with session_locks.hold(session_id):
+        if session_id not in sessions.index or sessions.index[session_id][0] != key:
+            return  # Finished or moved on to another prompt while we waited
+        session = sessions.get(session_id)
+        if session is None:  # Swapped out while idle
+            session = await run_io(storage.load_session, session_id)
+            if session is None:
+                sessions.remove(session_id)
+                return
+            sessions.swap_in(session)
+
+        game = GAMES[session["game"]].from_dict(session["state"])
+        action = "timeout" if value is None else game.parse(value)
+        if action is None:
+            return
+        if action == "double" and await debit_bux(session["user_id"], game.bet) is None:
+            action = "double_unpaid"
+        await run_step(session, game, game.act(action), interaction, player=interaction and interaction.user)
+
+class GameButton(discord.ui.DynamicItem[discord.ui.Button], template=r"game:(?P<session_id>[0-9a-f]+):(?P<turn>[0-9]+):(?P<action>[a-z_]+)"):
+    """A board button. Its custom_id names the session, turn and action, so it still works after a restart."""
+
+    def __init__(self, session_id, turn, action, emoji=None, label=None):
+        super().__init__(discord.ui.Button(emoji=emoji, label=label, style=discord.ButtonStyle.secondary,
+                                           custom_id=f"game:{session_id}:{turn}:{action}"))
+        self.session_id = session_id
+        self.turn = int(turn)
+        self.action = action
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["session_id"], match["turn"], match["action"])
+
+    async def callback(self, interaction):
+        entry = sessions.index.get(self.session_id)
+        if entry is None:
+            await interaction.response.send_message("This game is already over.", ephemeral=True)
+            return
+        if interaction.user.id != int(entry[1]):
+            await interaction.response.send_message("This isn't your game!", ephemeral=True)
+            return
+        # A press from an earlier turn (a double click, or a stale board) no longer matches the session's key
+        await advance_session(self.session_id, ("button", self.session_id, self.turn), self.action, interaction)
+        if not interaction.response.is_done():
+            await interaction.response.defer()
+
+bot.add_dynamic_items(GameButton)  # Any board's buttons are handled, including boards from before a restart
+
+def game_view(session, buttons):
+    """The buttons for the board's current prompt, or None to take them off."""
+    if not buttons:
+        return None
+    view = discord.ui.View(timeout=None)  # Made only of dynamic items, so discord.py doesn't keep it around
+    for emoji, label, action in buttons:
+        view.add_item(GameButton(session["id"], session["turn"], action, emoji, label))
+    return view
+
+async def show_board(session, channel, text, view, interaction=None):
+    """Post the game's board message the first time, then edit it in place."""
+    if interaction is not None and not interaction.response.is_done():
+        await interaction.response.edit_message(content=text, view=view)  # Answering the press is the edit
+    elif session.get("board_id") is None:
+        board = await outbox.send(channel, text, coalesce=False, view=view)
+        session["board_id"] = board.id
+    else:
+        outbox.edit(channel.get_partial_message(session["board_id"]), text, view=view)
+
+async def run_step(session, game, step, interaction=None, player=None):
+    """Show a step's messages and pay out, then post the next prompt or end the session.
+
+    player is whoever made the move, when the caller has them: a guild Member is used for the
+    rank role at the end instead of fetching it, which only timeouts and DM replies still need.
+    """
+    channel = game_channel(session["output_id"])
+    text = "\n".join(step.messages + ([step.prompt.text] if step.prompt else []))
+    if game.board:
+        session["turn"] = session.get("turn", 0) + 1
+        await show_board(session, channel, text, game_view(session, step.prompt and step.prompt.buttons), interaction)
+    elif session["state"] is None:
+        # The first prompt is awaited so a closed DM raises Forbidden here and start_session refunds the bet
+        await outbox.send(channel, text, coalesce=False)
+    elif text:
+        outbox.send(channel, text)  # Joined with anything else on its way to this channel
+    if step.credit:
+        await credit_bux(session["user_id"], step.credit)
+
+    if step.done:
+        sessions.remove(session["id"])
+        await run_io(storage.delete_session, session["id"])
+        guild = bot.get_guild(session["guild_id"]) if session["guild_id"] else None
+        if isinstance(player, discord.Member) and player.guild.id == session["guild_id"]:
+            member = player
+        else:
+            member = await resolve_member(guild, session["user_id"]) if guild else None
+        if member:
+            await assign_role_based_on_bux(game_channel(session["channel_id"]), member)
+        return
+
+    if game.board:
+        session["key"] = ["button", session["id"], session["turn"]]
+    else:
+        session["key"] = ["message", channel.id, int(session["user_id"])]
+    session["expires_at"] = time.time() + step.prompt.timeout
+    session["state"] = game.to_dict()
+    sessions.put(session)
+    await run_io(storage.save_session, session["id"], session)
+
+@tasks.loop(seconds=5)
+async def sweep_sessions():
+    """Time out unanswered prompts, swap idle sessions out of memory and drop expired bet leases and cooldown notices."""
+    for session_id in sessions.expired():
+        asyncio.create_task(advance_session(session_id, sessions.index[session_id][0], None))
+    sessions.swap_out_idle()
+    open_bets.expire()
+    last_cooldown_message.expire()
+
+open_bets = Leases()  # Players with a jackpot spin or parley pick in progress, keyed by user across every shard this process runs
 
 def is_in_bet(player_id):
-    return open_bets.get(player_id, False)  # Returns True if in an open bet, else False
+    return open_bets.held(player_id) or sessions.active(player_id)  # Returns True if in an open bet, else False
 
-def check_bux_entry(user_id: str):
+async def check_dm_games(ctx):
+    """Returns True if this process can take DM replies. Discord delivers every DM to shard 0, so only the process running it sees them."""
+    if PRIMARY_PROCESS:
+        return True
+    await ctx.send(f"{ctx.author.mention}, games played in DMs aren't available in this server yet, try `!bj` or `!hl` instead.")
+    return False
+
+async def check_bux_entry(user_id: str):
     """Returns True if the user has an entry in bux data, False otherwise."""
-    user_data = load_bux(user_id)
+    user_data = await aload_bux(user_id)
     return user_data.get("username") != "Unknown"  # If the username is 'Unknown', they haven't been registered yet.
 
 
@@ -393,7 +871,7 @@ async def b(ctx):
 
     player_id = ctx.author.id  
     user_id = str(ctx.author.id)
-    user_data = load_bux(user_id)
+    user_data = await aload_bux(user_id)
 
     if user_data["username"] == "Unknown":
         await ctx.send(f"{ctx.author.mention}, you need to claim your daily first with `!d`.")  # Ensure they have data
@@ -413,19 +891,19 @@ async def b(ctx):
     if bux <= 2500:
         welfare_bux = 5000
         await ctx.send(f"{ctx.author.name}, was approved for welfare and received {welfare_bux} bux.")
-        user_data["bux"] += welfare_bux  # Add welfare bux
+        total_welfare = welfare_bux  # Add welfare bux
 
         if random.random() < 0.07:  # 7% chance to get 5000 bux
             bonus_bux = 10000
-            user_data["bux"] += bonus_bux
+            total_welfare += bonus_bux
             await ctx.send(f"{ctx.author.name}, did some dirty deeds and earned {bonus_bux} bux.")
 
         if random.random() < 0.03:  # 3% chance to get 50000 bux
             bonus_bux = 30000
-            user_data["bux"] += bonus_bux
+            total_welfare += bonus_bux
             await ctx.send(f"{ctx.author.name}, robbed the welfare office and gained {bonus_bux} bux!")
 
-        save_bux(user_id, user_data)  # Save the updated user data
+        await credit_bux(user_id, total_welfare, "welfare")  # Save the updated user data
 
     await assign_role_based_on_bux(ctx, ctx.author)
     next_rank_name, next_rank_bux = get_next_rank(bux)
@@ -436,35 +914,12 @@ async def b(ctx):
 
 def get_next_rank(bux):
     """Returns the next rank name and the required bux for it."""
-    rank_thresholds = [
-        (100_000_000_000_000_000_000_000_000_000_000_000_000_000_000_000, "Challenger🥊"),
-        (100_000_000_000_000_000_000_000_000_000_000_000_000_000_000, "High Roller💳"),
-        (100_000_000_000_000_000_000_000_000_000_000_000_000_000, "Grandmaster🏆"),
-        (100_000_000_000_000_000_000_000_000_000_000_000_000, "Master⭐"),
-        (100_000_000_000_000_000_000_000_000_000_000_000, "Champion👑"),
-        (100_000_000_000_000_000_000_000_000_000_000, "Lucky🍀"),
-        (100_000_000_000_000_000_000_000_000_000, "Obsidian🐱‍👤"),
-        (100_000_000_000_000_000_000_000_000, "Diamond💎"),
-        (100_000_000_000_000_000_000, "Emerald❇️"),
-        (100_000_000_000_000_000, "Ruby🩸"),
-        (100_000_000_000_000, "Platinum🎖️"),
-        (100_000_000_000, "Gold🏅"),
-        (100_000_000, "Silver🥈"),
-        (100_000, "Bronze🥉"),
-        (0, "Brokie🐀")
-    ]
-
-    # Find the current rank and the next rank
-    for i, (threshold, rank) in enumerate(rank_thresholds):
-        if bux >= threshold:
-            if i == 0:
-                return None, None  # Already at the highest rank
-            
-            next_rank_name, next_rank_bux = rank_thresholds[i - 1][1], int(rank_thresholds[i - 1][0])
-
-            return next_rank_name, next_rank_bux
+    i = get_rank_index(bux)
+    if i < 0 or i == len(RANKS) - 1:
+        return None, None  # Already at the highest rank
 
-    return None, None  # Should never hit this case
+    next_rank_bux, next_rank_name = RANKS[i + 1]
+    return next_rank_name, next_rank_bux
 
 
 #BlackJack
@@ -473,7 +928,7 @@ async def bj(ctx, bet: str):
     """!bj <amount> ( Bet on a game of blackjack )"""
     player_id = ctx.author.id  
     user_id = str(ctx.author.id)
-    bux_data = load_bux(user_id)
+    bux_data = await aload_bux(user_id)
 
     if bet.lower() == "all":
         bet = bux_data["bux"]  # Set the amount to all remaining bux
@@ -485,7 +940,7 @@ async def bj(ctx, bet: str):
             await ctx.send(f"{ctx.author.mention}, please provide a valid number for the amount.")
             return
 
-    if not check_bux_entry(user_id):
+    if not await check_bux_entry(user_id):
         await ctx.send(f"{ctx.author.mention}, you need to claim your daily first with !d before you can play.")
         return
 
@@ -499,138 +954,11 @@ async def bj(ctx, bet: str):
     
 
 
-    if bux_data["bux"] < bet:
+    if await debit_bux(user_id, bet) is None:
         await ctx.send(f"{ctx.author.mention} You don't have enough bux for this bet.")
         return
-    
-    bux_data["bux"] -= bet
-    save_bux(user_id, bux_data)  # Save the updated bux data
-
-    deck = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"] * 4
-    random.shuffle(deck)
-
-    def calculate_points(hand):
-        """Calculate the total points for a hand of cards."""
-        points = 0
-        ace_count = 0
-        for card in hand:
-            if card in ["J", "Q", "K"]:
-                points += 10
-            elif card == "A":
-                points += 11
-                ace_count += 1
-            else:
-                points += int(card)
-        
-        while points > 21 and ace_count:
-            points -= 10
-            ace_count -= 1
-        return points
-
-    player_hand = [deck.pop(), deck.pop()]
-    dealer_hand = [deck.pop(), deck.pop()]
-
-    if calculate_points(player_hand) == 21:
-        player_hand_str = " ".join(player_hand)
-        dealer_hand_str = dealer_hand[0] + " ?"
-        await ctx.send(f"**Blackjack!**\nYour cards: {player_hand_str}\nDealer's cards: {dealer_hand_str}")
-        await ctx.send(f"{ctx.author.mention} wins 2.5x the bet! You win {bet * 2.5} bux!")
-        bux_data["bux"] += bet * 2.5
-        save_bux(user_id, bux_data)
-        return
-
-    player_hand_str = " ".join(player_hand)
-    dealer_hand_str = dealer_hand[0] + " ?"
-    
-    await ctx.send(f"**Blackjack!**\nYour cards: {player_hand_str}\nDealer's cards: {dealer_hand_str}")
-    open_bets[player_id] = True
-    doubled_down = False
 
-    while calculate_points(player_hand) < 21:
-        await ctx.send(f"{ctx.author.mention} Your current hand: {player_hand_str} (Total: {calculate_points(player_hand)})")
-        options_message = await ctx.send("React with ✅ to hit, ❌ to stay, or 💰 to double down.")
-        await options_message.add_reaction("✅")
-        await options_message.add_reaction("❌")
-        await options_message.add_reaction("💰")
-
-        def check(reaction, user):
-            return user.id == player_id and str(reaction.emoji) in ["✅", "❌", "💰"]
-
-        try:
-            reaction, _ = await bot.wait_for("reaction_add", check=check, timeout=300.0)
-        except asyncio.TimeoutError:
-            await ctx.send(f"{ctx.author.mention} You took too long! You stand.")
-            break
-        
-        if str(reaction.emoji) == "✅":  # Player chooses to hit
-            player_hand.append(deck.pop())
-            player_hand_str = " ".join(player_hand)
-            if calculate_points(player_hand) > 21:
-                await ctx.send(f"**Busted!** Your hand: {player_hand_str} (Total: {calculate_points(player_hand)})")
-                await ctx.send(f"{ctx.author.mention} lost the bet of {bet} bux.")
-                open_bets[player_id] = False
-                return
-        elif str(reaction.emoji) == "💰":  # Player chooses to double down
-            if bux_data["bux"] < bet:
-                await ctx.send(f"{ctx.author.mention},You don't have enough bux to double down. This will be counted as a hit.")
-                player_hand.append(deck.pop())  # Draw one more card (same as hitting)
-                player_hand_str = " ".join(player_hand)
-                await ctx.send(f"{ctx.author.mention} Your hand: {player_hand_str} (Total: {calculate_points(player_hand)})")
-                break  # Proceed to ask for hit or stay again
-            else:
-                bux_data["bux"] -= bet
-                save_bux(user_id, bux_data)
-                player_hand.append(deck.pop())  # Draw one more card
-                player_hand_str = " ".join(player_hand)
-                await ctx.send(f"{ctx.author.mention} You chose to double down! Your hand: {player_hand_str} (Total: {calculate_points(player_hand)})")
-                doubled_down = True
-                break  # End player's turn immediately after doubling down
-        else:  # Player chooses to stand
-            break
-
-    dealer_hand_str = " ".join(dealer_hand)
-    dealer_points = calculate_points(dealer_hand)
-    await ctx.send(f"{ctx.author.mention}, Dealer's cards: {dealer_hand_str} (Total: {dealer_points})")
-
-    while dealer_points < 17:
-        dealer_hand.append(deck.pop())
-        dealer_points = calculate_points(dealer_hand)
-        dealer_hand_str = " ".join(dealer_hand)
-        await ctx.send(f"{ctx.author.mention}, Dealer's hand: {dealer_hand_str} (Total: {dealer_points})")
-
-    player_points = calculate_points(player_hand)
-    if player_points > 21:         # Player busts
-        await ctx.send(f"{ctx.author.mention} lost the bet of {bet} bux. You busted!")
-    elif dealer_points > 21:        # Dealer busts
-        if doubled_down:
-            await ctx.send(f"Dealer busted! {ctx.author.mention} wins {bet * 4} bux!")
-            bux_data["bux"] += bet * 4  # Award 4x the bet if player doubled down
-        else:
-            await ctx.send(f"Dealer busted! {ctx.author.mention} wins {bet * 2} bux!") 
-            bux_data["bux"] += bet * 2 # Award 2x the bet if player did not double down
-        save_bux(user_id, bux_data)
-    elif player_points > dealer_points:         # Player wins
-        if doubled_down:
-            await ctx.send(f"{ctx.author.mention} wins {bet * 4} bux!")
-            bux_data["bux"] += bet * 4 # Player wins 4x the bet if doubled down
-        else:
-            await ctx.send(f"{ctx.author.mention} wins {bet * 2} bux!")
-            bux_data["bux"] += bet * 2
-        save_bux(user_id, bux_data)
-    elif player_points == dealer_points:         # Tie
-        refund_amount = bet * 2 if doubled_down else bet  # Refund full amount if doubled down
-        await ctx.send(f"{ctx.author.mention}, it's a tie! You get your {refund_amount} bux back.")
-        bux_data["bux"] += refund_amount
-        save_bux(user_id, bux_data)
-
-    else:
-        if doubled_down:         # Dealer wins
-            await ctx.send(f"Dealer wins! {ctx.author.mention} lost the bet of {bet * 2} bux.")
-        else:
-            await ctx.send(f"Dealer wins! {ctx.author.mention} lost the bet of {bet} bux.")
-    
-    open_bets[player_id] = False  # Remove player from open bets after the game is over
-    await assign_role_based_on_bux(ctx, ctx.author)
+    await start_session(ctx, Blackjack(user_id, bet), ctx.channel)
 
 
 # Unlocker
@@ -641,7 +969,10 @@ async def u(ctx, bet: str):
     player_id = ctx.author.id  
     user_id = str(ctx.author.id)
 
-    if not check_bux_entry(user_id):
+    if not await check_dm_games(ctx):  # Before the bet is taken, the guesses would never reach us
+        return
+
+    if not await check_bux_entry(user_id):
         await ctx.send(f"{ctx.author.mention}, you need to claim your daily first with !d before you can play.")
         return
     
@@ -649,7 +980,7 @@ async def u(ctx, bet: str):
         await ctx.send(f"{ctx.author.mention}, you already have an open bet. Please wait until it's settled.")
         return  
     
-    bux_data = load_bux(user_id)  # Load the user's bux data
+    bux_data = await aload_bux(user_id)  # Load the user's bux data
 
     if not bux_data:  # If user data does not exist
         await ctx.send(f"{ctx.author.mention}, you don't have any bux data. Please claim your daily reward first with !d.")
@@ -665,89 +996,24 @@ async def u(ctx, bet: str):
             await ctx.send(f"{ctx.author.mention}, please provide a valid number for the amount.")
             return
 
-    if bux_data["bux"] < bet:
-        await ctx.send(f"{ctx.author.mention}, you don't have enough bux for this bet. You currently have {bux_data['bux']} bux.")
-        return
-    
     if bet <= 0:
         await ctx.send("You must bet a positive amount of bux!")
         return
 
-    bux_data["bux"] -= bet
-    save_bux(user_id, bux_data)  # Save the updated bux data
-
-    code = [random.randint(0, 9) for _ in range(4)]  # Generate 4-digit code
-    attempts = 0
-    max_attempts = 5
-    reward_multipliers = [5, 4, 2.5, 1.75, 0.75]  # Adjusted reward multipliers
-
-    def give_feedback(guess):
-        feedback = []
-        for i in range(4):
-            if guess[i] == code[i]:
-                feedback.append("✅")  # Correct digit in right position
-            elif guess[i] in code:
-                feedback.append("🔄")  # Correct digit, wrong position
-            else:
-                feedback.append("❌")  # Incorrect digit
-        return "".join(feedback)
+    if await debit_bux(user_id, bet) is None:
+        await ctx.send(f"{ctx.author.mention}, you don't have enough bux for this bet. You currently have {bux_data['bux']} bux.")
+        return
 
     await ctx.send(f"{ctx.author.mention}, check your DMs! You are about to try to unlock a safe!")
 
     try:
         dm_channel = await ctx.author.create_dm()
-        await dm_channel.send(f"**Welcome to Unlocker!**\nYou have {max_attempts} attempts to guess the 4-digit code. Enter the code without spaces or dashes. Good luck!")
-        await dm_channel.send(" ✅ Correct digit in right position 🔄 Correct digit, wrong position ❌ Incorrect digit ")
-        await dm_channel.send("  Reward based on attempts: 1st = x5, 2nd = x4, 3rd = x2.5, 4th = x1.75, 5th = x0.75 ")
-
-    except Exception:
+        await start_session(ctx, Unlocker(user_id, bet), dm_channel)
+    except discord.Forbidden:
         await ctx.send(f"{ctx.author.mention}, I couldn't send you a DM. Please ensure you have DMs open for me.")
-        return
-
-    while attempts < max_attempts:
-        await dm_channel.send(f"Attempt {attempts + 1}/{max_attempts}: Enter a 4-digit code:")
-
-        def check(message):
-            return (message.author.id == player_id and 
-                    message.content.isdigit() and 
-                    len(message.content) == 4)
-        
-        try:
-            message = await bot.wait_for('message', check=check, timeout=600.0)
-        except asyncio.TimeoutError:
-            await dm_channel.send("You took too long! The game ends.")
-            bux_data["bux"] += bet  # Refund the bet amount if the player timed out
-            save_bux(user_id, bux_data)  # Save the updated bux data
-            break
-
-        guess = [int(digit) for digit in message.content]
-        attempts += 1
-
-        feedback = give_feedback(guess)
-        
-        if guess == code:
-            reward = bet * reward_multipliers[attempts - 1]  # Adjusted reward calculation
-            await dm_channel.send(f"**Unlocked!** You win {reward} bux!")
-            bux_data["bux"] += reward  # Add the reward to the player's bux
-            save_bux(user_id, bux_data)  # Save the updated bux data
-            break
-        elif attempts == max_attempts:
-            await dm_channel.send(f"**Game Over!** You failed to crack the code. The correct code was: {''.join(map(str, code))}.")
-            break
-        else:
-            await dm_channel.send(f"Feedback: {feedback} - Keep guessing!")
-
-    open_bets[player_id] = False  # Remove player from open bets after the game is over
-    await assign_role_based_on_bux(ctx, ctx.author)
 
 #Jackpot
-symbol_pool = (
-    ["🍋"] * 35 +  # 35% chance
-    ["🍀"] * 25 +  # 25% chance
-    ["🍒"] * 20 +  # 20% chance
-    ["💎"] * 15 +  # 15% chance
-    ["7️⃣"] * 5    # 5% chance
-)
+JACKPOT_LEASE = 60  # Seconds a jackpot command may hold its open bet, far more than the spins take
 
 @bot.command()
 @commands.cooldown(3, 14, commands.BucketType.user)
@@ -756,7 +1022,7 @@ async def j(ctx, bet_amount: str, spins: int = 1):
     
     user_id = str(ctx.author.id)
     player_id = ctx.author.id
-    bux_data = load_bux(user_id)  # Load the user's bux data
+    bux_data = await aload_bux(user_id)  # Load the user's bux data
 
     if bet_amount.lower() == "all":
         bet_amount = bux_data["bux"]  # Set the amount to all remaining bux
@@ -768,7 +1034,7 @@ async def j(ctx, bet_amount: str, spins: int = 1):
             await ctx.send(f"{ctx.author.mention}, please provide a valid number for the amount.")
             return
 
-    if not check_bux_entry(user_id):
+    if not await check_bux_entry(user_id):
         await ctx.send(f"{ctx.author.mention}, you need to claim your daily first with !d before you can play.")
         return
     
@@ -776,51 +1042,25 @@ async def j(ctx, bet_amount: str, spins: int = 1):
         await ctx.send(f"{ctx.author.mention}, you already have an open bet. Please wait until it's settled.")
         return  
 
-    if spins < 1 or spins > 100:  # Allow up to 100 spins
-        await ctx.send(f"{ctx.author.mention}, you can spin between 1 and 100 times.")
+    if spins < 1 or spins > MAX_SPINS:
+        await ctx.send(f"{ctx.author.mention}, you can spin between 1 and {MAX_SPINS:,} times.")
         return
 
     total_cost = bet_amount * spins
     
-    if bux_data["bux"] < total_cost:
-        await ctx.send(f"{ctx.author.mention}, you don't have enough bux for {spins} spins. (Cost: {total_cost} bux)")
-        return
-    bux_data["bux"] -= total_cost
-    save_bux(user_id, bux_data)  # Save the updated bux data
-
-    payout_multipliers = {
-        "7️⃣": 42,
-        "💎": 17,
-        "🍒": 15,
-        "🍀": 11,
-        "🍋": 7
-    }
-    partial_payout_multipliers = {
-        "💎": 5,  
-        "7️⃣": 16  
-    }
+    open_bets.acquire(player_id, JACKPOT_LEASE)
+    try:
+        if await debit_bux(user_id, total_cost) is None:
+            await ctx.send(f"{ctx.author.mention}, you don't have enough bux for {spins} spins. (Cost: {total_cost} bux)")
+            return
+
+        # Perform the spins without displaying results, all reels are drawn in one batch off the event loop
+        result = await asyncio.to_thread(spin_batch, spins, bet_amount)
+        total_payout = result.total_payout
 
-    total_payout = 0
-    # Perform the spins without displaying results
-    for _ in range(spins):    
-        reel_1 = random.choice(symbol_pool)
-        reel_2 = random.choice(symbol_pool)
-        reel_3 = random.choice(symbol_pool)
-
-        payout = 0        # Determine winnings based on full match or partial match
-        if reel_1 == reel_2 == reel_3:
-            payout = bet_amount * payout_multipliers[reel_1]
-        elif reel_1 == reel_2:  # Two matching symbols
-            payout = bet_amount * partial_payout_multipliers.get(reel_1, 0)
-        elif reel_2 == reel_3:  # Two matching symbols
-            payout = bet_amount * partial_payout_multipliers.get(reel_2, 0)
-        elif reel_1 == reel_3:  # Two matching symbols
-            payout = bet_amount * partial_payout_multipliers.get(reel_1, 0)
-
-        total_payout += payout
-
-    bux_data["bux"] += total_payout
-    save_bux(user_id, bux_data)  # Save the updated bux data
+        await credit_bux(user_id, total_payout)  # Save the updated bux data
+    finally:
+        open_bets.release(player_id)
     await assign_role_based_on_bux(ctx, ctx.author)
 
     summary = (
@@ -828,6 +1068,9 @@ async def j(ctx, bet_amount: str, spins: int = 1):
         f"Bet per spin: **{bet_amount}** bux | Total Spins: **{spins}** | Total Cost: **{total_cost}** bux\n"
         f"**Total Payout:** {total_payout} bux"
     )
+    jackpots = " ".join(f"{symbol} x{count:,}" for symbol, count in result.full_hits.items() if count)
+    if jackpots:
+        summary += f"\nTriples: {jackpots}"
     await ctx.send(f"{ctx.author.mention}\n{summary}")
 
 
@@ -838,7 +1081,7 @@ async def hl(ctx, bet: str):
 
     player_id = ctx.author.id  
     user_id = str(ctx.author.id)
-    bux_data = load_bux(user_id)
+    bux_data = await aload_bux(user_id)
     
     if bet.lower() == "all":
         bet = bux_data["bux"]  # Set the amount to all remaining bux
@@ -850,7 +1093,7 @@ async def hl(ctx, bet: str):
             await ctx.send(f"{ctx.author.mention}, please provide a valid number for the amount.")
             return
 
-    if not check_bux_entry(user_id):
+    if not await check_bux_entry(user_id):
         await ctx.send(f"{ctx.author.mention}, you need to claim your daily first with !d before you can play.")
         return
 
@@ -866,98 +1109,11 @@ async def hl(ctx, bet: str):
         await ctx.send(f"{ctx.author.mention} You don't have enough bux for this bet.")
         return
 
-    open_bets[player_id] = True  # Mark player as having an open bet
-
-    try:
-        bux_data["bux"] -= bet  # Deduct initial bet
-        save_bux(user_id, bux_data)
-
-        deck = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"] * 4
-        random.shuffle(deck)
-
-        def card_value(card):
-            """Convert face cards into numerical values for comparison."""
-            values = {"J": 11, "Q": 12, "K": 13, "A": 14}  # Face card values
-            if card in values:
-                return values[card]  # Return mapped value if it's a face card
-            return int(card)  # Convert to int if it's a number
-
-
-        current_card = deck.pop()
-        multiplier = 2  # Starts at 2x after 3 correct rounds
-        correct_guesses = 0
-
-        await ctx.send(f"{ctx.author.mention}, starting card is **{current_card}**. React with ⬆️ for Higher or ⬇️ for Lower.")
-
-        while True:
-            if not deck:  # If the deck is empty, end the game
-                winnings = bet * multiplier
-                bux_data["bux"] += winnings
-                save_bux(user_id, bux_data)
-                await ctx.send(f"{ctx.author.mention}, you've made it through the entire deck! You win **{winnings} bux!** 🎉")
-                break  # Exit the loop safely
-
-            next_card = deck.pop()
-
-            options_message = await ctx.send(f"{ctx.author.mention} Current card: **{current_card}**\nReact with ⬆️ for Higher or ⬇️ for Lower.")
-            await options_message.add_reaction("⬆️")
-            await options_message.add_reaction("⬇️")
-
-            def check(reaction, user):
-                return user.id == player_id and str(reaction.emoji) in ["⬆️", "⬇️"]
-
-            try:
-                reaction, _ = await bot.wait_for("reaction_add", check=check, timeout=300.0)
-            except asyncio.TimeoutError:
-                await ctx.send(f"{ctx.author.mention}, you took too long! You lost your bet of {bet} bux.")
-                return
-
-            guess = "higher" if str(reaction.emoji) == "⬆️" else "lower"
-            current_value = card_value(current_card)
-            next_value = card_value(next_card)
-
-            if (guess == "higher" and next_value > current_value) or (guess == "lower" and next_value < current_value):
-                correct_guesses += 1
-                await ctx.send(f" {ctx.author.mention} ✅ Correct! Next card was **{next_card}**.")
-
-                if correct_guesses % 3 == 0:  # Every 3 correct guesses, allow cash-out
-                    await ctx.send(f"{ctx.author.mention} You've won **{multiplier}x** your bet so far! React with 💰 to cash out or 🔄 to continue.")
-                    cashout_message = await ctx.send("💰 = Cash Out | 🔄 = Keep Going")
-                    await cashout_message.add_reaction("💰")
-                    await cashout_message.add_reaction("🔄")
-
-                    def cashout_check(reaction, user):
-                        return user.id == player_id and str(reaction.emoji) in ["💰", "🔄"]
-
-                    try:
-                        reaction, _ = await bot.wait_for("reaction_add", check=cashout_check, timeout=300.0)
-                    except asyncio.TimeoutError:
-                        await ctx.send(f"{ctx.author.mention}, time ran out! You got refunded.")
-                        bux_data["bux"] += bet
-                        return
-
-                    if str(reaction.emoji) == "💰":
-                        winnings = bet * multiplier
-                        bux_data["bux"] += winnings
-                        save_bux(user_id, bux_data)
-                        await ctx.send(f"{ctx.author.mention}, you cashed out and won **{winnings} bux!**")
-                        return
-                    else:
-                        multiplier *= 2  # Increase the multiplier
-                        await ctx.send(f"{ctx.author.mention} 🔥 You continue! New multiplier is **{multiplier}x**.")
-
-                current_card = next_card  # Move to next round
-
-            elif current_value == next_value:
-                await ctx.send(f"{ctx.author.mention} 😬 Tie! The next card was also **{next_card}**. You get a free retry!")
-
-            else:
-                await ctx.send(f"{ctx.author.mention} ❌ Wrong! The next card was **{next_card}**. You lost your bet of {bet} bux.")
-                return
+    if await debit_bux(user_id, bet) is None:  # Deduct initial bet
+        await ctx.send(f"{ctx.author.mention} You don't have enough bux for this bet.")
+        return
 
-    finally:
-        open_bets[player_id] = False  # Ensure the bet is cleared even if there's an error
-        await assign_role_based_on_bux(ctx, ctx.author)
+    await start_session(ctx, HighLow(user_id, bet), ctx.channel)
 
 #Parleys
 GAMER_NAMES = [
@@ -965,43 +1121,24 @@ GAMER_NAMES = [
     "Gekiez", "Z4KKD", "Shutout", "Chris Pratt", "Shellcity",
     "Krypt1k"
 ]
+PARLEY_PICKS = 3  # How many gamers each parley picks
+PARLEY_PICK_TIMEOUT = 600  # Seconds a player has to DM their picks
 
 def generate_gamers():
     return [
-        {'id': i, 'name': GAMER_NAMES[i-1], 'points': 0} for i in range(1, 12)
+        {'id': i, 'name': GAMER_NAMES[i-1], 'points': 0} for i in range(1, len(GAMER_NAMES) + 1)
     ]
 
-def load_user_parley(user_id):
-    """Load a specific user's parley data."""
-    user_file = os.path.join(PARLEY_DIRECTORY, f"{user_id}.json")
-    
-    if os.path.exists(user_file):
-        with open(user_file, 'r') as f:
-            return json.load(f)
-    else:
-        return None  # No data for this user
-
-def save_user_parley(user_id, data):
-    """Save a specific user's parley data."""
-    user_file = os.path.join(PARLEY_DIRECTORY, f"{user_id}.json")
-    
-    with parley_lock:
-        with open(user_file, 'w') as f:
-            json.dump(data, f, indent=4)
+parley_book = ParleyBook.from_dict(storage.load_parley_book())  # Every bet in the current round
+parley_lock = asyncio.Lock()  # Held while a round is settled, so no bet lands in the round being closed
 
 def load_gamers():
     """Loads the gamers data."""
-    with gamers_lock:  # Lock for thread-safe operations
-        if os.path.exists(GAMERS_FILE):
-            with open(GAMERS_FILE, 'r') as f:
-                return json.load(f)
-        return []
+    return storage.load_gamers()
 
 def save_gamers(gamers):
     """Saves the gamers data safely."""
-    with gamers_lock:  # Lock for thread-safe operations
-        with open(GAMERS_FILE, 'w') as f:
-            json.dump(gamers, f, indent=4)
+    storage.save_gamers(gamers)
 
 @bot.command()
 async def p(ctx, amount: str):
@@ -1009,8 +1146,9 @@ async def p(ctx, amount: str):
     user_id = str(ctx.author.id)
     player_id = ctx.author.id
     user_name = ctx.author.name  
-    bux_data = load_bux(user_id)
-    user_parley = load_user_parley(user_id)
+    if not await check_dm_games(ctx):  # The pick is sent back by DM
+        return
+    bux_data = await aload_bux(user_id)
 
     if amount.lower() == "all":
         amount = bux_data["bux"]  # Set the amount to all remaining bux
@@ -1022,7 +1160,11 @@ async def p(ctx, amount: str):
             await ctx.send(f"{ctx.author.mention}, please provide a valid number for the amount.")
             return
         
-    if user_parley:
+    if MULTI_PROCESS:
+        async with parley_lock:
+            await refresh_parley_book()  # The round may have been settled, or bet on, from another process
+
+    if parley_book.has_bet(user_id):
         await ctx.send(f"{ctx.author.mention}, you've already placed a bet today.")
         return
 
@@ -1030,7 +1172,7 @@ async def p(ctx, amount: str):
         await ctx.send(f"{ctx.author.mention}, you don't have enough bux.")
         return
     
-    if not check_bux_entry(user_id):
+    if not await check_bux_entry(user_id):
         await ctx.send(f"{ctx.author.mention}, you need to claim your daily first with `!d`.")
         return
     
@@ -1038,106 +1180,357 @@ async def p(ctx, amount: str):
         await ctx.send(f"{ctx.author.mention}, you already have an open bet. Please wait until it's settled.")
         return  
     
-    bux_data["bux"] -= amount
-    save_bux(user_id, bux_data)  # Save the updated bux data
+    open_bets.acquire(player_id, PARLEY_PICK_TIMEOUT + 60)  # Until the pick is in, or on its own if the command dies first
+    try:
+        if await debit_bux(user_id, amount) is None:
+            await ctx.send(f"{ctx.author.mention}, you don't have enough bux.")
+            return
 
-    gamers = load_gamers()
-    if not gamers:
-        gamers = generate_gamers()
-        save_gamers(gamers)
+        gamers = await run_io(load_gamers)
+        if not gamers:
+            gamers = generate_gamers()
+            await run_io(save_gamers, gamers)
 
-    gamer_list = "\n".join([f"{i}. {g['name']}" for i, g in enumerate(gamers, start=1)])
-    await ctx.send(f"{ctx.author.mention}, check your DMs to place your parley! 📩")
-    await ctx.author.send(f"Gamers List:\n{gamer_list}\n\nPick 3 different gamers (use numbers):\nExample: 1 2 3")
+        gamer_list = "\n".join([f"{i}. {g['name']}" for i, g in enumerate(gamers, start=1)])
+        await ctx.send(f"{ctx.author.mention}, check your DMs to place your parley! 📩")
+        example = " ".join(str(i) for i in range(1, PARLEY_PICKS + 1))
+        prompt = await ctx.author.send(f"Gamers List:\n{gamer_list}\n\nPick {PARLEY_PICKS} different gamers (use numbers):\nExample: {example}")
 
-    def check(msg):
-        return msg.author == ctx.author and msg.content.replace(" ", "").isdigit()
+        def check(msg):
+            return msg.content.replace(" ", "").isdigit()
 
-    try:
-        msg = await bot.wait_for('message', check=check, timeout=600)
-        chosen = list(map(int, msg.content.split()))
+        try:
+            msg = await wait_for_message(prompt.channel, player_id, check, timeout=PARLEY_PICK_TIMEOUT)
+            chosen = list(map(int, msg.content.split()))
         
-        if len(chosen) != 3 or any(g not in range(1, len(gamers) + 1) for g in chosen):
-            await ctx.author.send("Invalid selection. Bet canceled.")
-            bux_data["bux"] += amount             # Refund the bet if the selection was invalid
-            save_bux(user_id, bux_data)  # Save the updated bux data
-            return
+            if len(chosen) != PARLEY_PICKS or any(g not in range(1, len(gamers) + 1) for g in chosen):
+                await ctx.author.send("Invalid selection. Bet canceled.")
+                await credit_bux(user_id, amount)             # Refund the bet if the selection was invalid
+                return
         
-        user_parley = {'name': user_name, 'bet': amount, 'gamers': chosen}    
-        save_user_parley(user_id, user_parley)  # Save the user's parley
-        await ctx.author.send(f"Bet placed on gamers {chosen}. Good luck!")
-        await assign_role_based_on_bux(ctx, ctx.author)
-
-    except asyncio.TimeoutError:
-        await ctx.author.send("Time expired. Bet canceled.")
-        bux_data["bux"] += amount        # Refund the bet if the time expired
-        save_bux(user_id, bux_data)  # Save the updated bux data
-        await assign_role_based_on_bux(ctx, ctx.author)
-
-def calculate_best_combinations(gamers):
-    combinations = list(itertools.combinations(gamers, 3))
-    combo_scores = [(combo, sum(g['points'] for g in combo)) for combo in combinations]
-    combo_scores.sort(key=lambda x: x[1], reverse=True)
-    return combo_scores
+            user_parley = {'name': user_name, 'bet': amount, 'gamers': chosen}    
+            # Added to the stored book in one step, so a bet placed meanwhile from here or another process is caught
+            async with parley_lock:
+                placed = not parley_book.has_bet(user_id) and await run_io(storage.add_parley_bet, user_id, user_parley)
+                if placed:
+                    parley_book.place(user_id, user_parley)
+            if not placed:
+                await ctx.author.send("You've already placed a bet today. Bet canceled.")
+                await credit_bux(user_id, amount)
+                return
+
+            await ctx.author.send(f"Bet placed on gamers {chosen}. Good luck!")
+            await assign_role_based_on_bux(ctx, ctx.author)
+
+        except asyncio.TimeoutError:
+            await ctx.author.send("Time expired. Bet canceled.")
+            await credit_bux(user_id, amount)        # Refund the bet if the time expired
+            await assign_role_based_on_bux(ctx, ctx.author)
+    finally:
+        open_bets.release(player_id)
+
+async def refresh_parley_book():
+    """Reload the open round from storage, where every shard process adds its bets."""
+    global parley_book
+    parley_book = ParleyBook.from_dict(await run_io(storage.load_parley_book))
+
+parley_channel_ids = {}  # guild_id -> id of its parley channel, or None if it doesn't have one
+
+def get_parley_channel():
+    """The parley channel, looked up once per guild instead of scanning every channel on every shard."""
+    if PARLEY_CHANNEL_ID:
+        return bot.get_channel(PARLEY_CHANNEL_ID) or bot.get_partial_messageable(PARLEY_CHANNEL_ID)
+    for guild in bot.guilds:
+        if guild.id not in parley_channel_ids:
+            channel = discord.utils.get(guild.text_channels, name=PARLEY_CHANNEL_NAME)
+            parley_channel_ids[guild.id] = channel.id if channel else None
+        if parley_channel_ids[guild.id]:
+            return bot.get_channel(parley_channel_ids[guild.id])
+    return None
+
+@bot.event
+async def on_guild_channel_create(channel):
+    parley_channel_ids.pop(channel.guild.id, None)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    parley_channel_ids.pop(after.guild.id, None)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    parley_channel_ids.pop(channel.guild.id, None)
 
+@bot.event
+async def on_guild_remove(guild):
+    parley_channel_ids.pop(guild.id, None)
+
+def chunk_message(lines, limit=2000):
+    """Join lines into messages that each fit in Discord's character limit."""
+    chunk = ""
+    for line in lines:
+        line = line[:limit]
+        if chunk and len(chunk) + 1 + len(line) > limit:
+            yield chunk
+            chunk = ""
+        chunk = f"{chunk}\n{line}" if chunk else line
+    if chunk:
+        yield chunk
+
+@metrics.timed("hot_path_duration_seconds", path="daily_event")
 async def daily_event():
-    while True:
-        gamers = generate_gamers()
-        for gamer in gamers:
-            gamer['points'] = random.randint(1, 37)
-        save_gamers(gamers)
-
-
-        leaderboard = "\n".join(         # Sort gamers by points in descending order before displaying the leaderboard
-            [f"{g['name']} (ID: {g['id']}): {g['points']} points" for g in sorted(gamers, key=lambda x: x['points'], reverse=True)]
-        )
-
-        channel = discord.utils.get(bot.get_all_channels(), name="challenger-parley🥊")
-        if channel:
-            await channel.send(f"Today's leaderboard:\n{leaderboard}")
-
-        best_combos = calculate_best_combinations(gamers)
-
-        results_message = "Daily Results:\n"
-
-        for filename in os.listdir(PARLEY_DIRECTORY):         # Iterate over all user files and calculate results
-            user_id = filename.replace(".json", "")
-            user_parley = load_user_parley(user_id)
-
-            if user_parley:
-                chosen_combo = [gamers[g-1] for g in user_parley['gamers']]
-                chosen_combo_score = sum(g['points'] for g in chosen_combo)
-                
-                ranking_position = next((i for i, (combo, score) in enumerate(best_combos) if score == chosen_combo_score), None)
-                if ranking_position is not None:
-                    if ranking_position < 20:
-                        multiplier = max(20 - ranking_position, 0) 
-                    else:
-                        multiplier = max(0.99 - 0.01 * (ranking_position - 20), 0)  
-                    winnings = round(user_parley['bet'] * multiplier, 2)
-                    bux_data = load_bux(user_id)
-                    bux_data['bux'] += winnings
-                    save_bux(user_id, bux_data)
-                    results_message += f"{user_parley['name']} placed a bet on gamers {user_parley['gamers']} and scored {chosen_combo_score} points! They finished {ranking_position + 1}!\n"
-                    results_message += f"Winner multiplier: {multiplier}x, Winnings: {winnings} bux!\n"
-                else:
-                    results_message += f"{user_parley['name']}, your bet didn't win. Better luck next time!\n"
-        if channel:
-            await channel.send(results_message)
-
-        for filename in os.listdir(PARLEY_DIRECTORY):        # Clean up the parley files
-            os.remove(os.path.join(PARLEY_DIRECTORY, filename))
-
-        await asyncio.sleep(6 * 60 * 60)
+    """Score the gamers, settle and archive this round's parleys and open the next one."""
+    global parley_book
+    gamers = generate_gamers()
+    for gamer in gamers:
+        gamer['points'] = random.randint(1, 37)
+    await run_io(save_gamers, gamers)
+
+
+    leaderboard = "\n".join(         # Sort gamers by points in descending order before displaying the leaderboard
+        [f"{g['name']} (ID: {g['id']}): {g['points']} points" for g in sorted(gamers, key=lambda x: x['points'], reverse=True)]
+    )
+
+    channel = get_parley_channel()
+    if channel:
+        outbox.send(channel, f"Today's leaderboard:\n{leaderboard}")
+
+    async with parley_lock:
+        if MULTI_PROCESS:
+            await refresh_parley_book()  # Pick up the bets placed through the other shard processes
+        book = parley_book
+        results = book.settle(gamers, PARLEY_PICKS)
+        closed_round = book.close_round()
+
+        results_lines = ["Daily Results:"]
+        winnings_by_user = {}
+        for user_id, user_parley, chosen_combo_score, ranking_position, multiplier, winnings in results:
+            if ranking_position is not None:
+                winnings_by_user[user_id] = winnings
+                results_lines.append(f"{user_parley['name']} placed a bet on gamers {user_parley['gamers']} and scored {chosen_combo_score} points! They finished {ranking_position + 1}!")
+                results_lines.append(f"Winner multiplier: {multiplier}x, Winnings: {winnings} bux!")
+            else:
+                results_lines.append(f"{user_parley['name']}, your bet didn't win. Better luck next time!")
+
+        # Pay out and get the payouts onto disk before the round is marked settled, and only open the
+        # next round after that: a crash anywhere in between leaves this round in storage, never lost
+        if winnings_by_user:
+            await credit_bux_many(winnings_by_user)  # Every winner in one batched write
+        if ledger is not None:
+            await run_io(ledger.commit)
+        await run_io(bux_cache.flush)
+        opened = await run_io(storage.close_parley_round, closed_round, book.to_dict())  # Keeps past rounds instead of deleting them
+        parley_book = ParleyBook.from_dict(opened)
+
+    if channel:
+        for chunk in chunk_message(results_lines):
+            outbox.send(channel, chunk)  # Short chunks get joined with the leaderboard where they fit
+
+async def refresh_rank_index():
+    """Pick up the balance changes made through the other shard processes."""
+    balances = await run_io(lambda: [(user_id, user_data["bux"]) for user_id, user_data in storage.iter_accounts()])
+    rank_index.rebuild(balances)
+
+scheduler = Scheduler(SCHEDULE_FILE if PRIMARY_PROCESS else f"schedule_shard{SHARD_IDS[0]}.json")
+if PRIMARY_PROCESS:
+    scheduler.add("parley", 6 * 60 * 60, daily_event)  # Next run time survives restarts and reconnects
+if MULTI_PROCESS:
+    scheduler.add("ranks", 60, refresh_rank_index)
 
 @bot.command()
 async def sp(ctx):
-    """Start the parley early (Parleys will start every hour after)"""
+    """Start the parley early (Parleys will start every 6 hours after)"""
+    if "parley" not in scheduler.jobs:
+        await ctx.send("Parleys are run from shard 0, try again from a server on that shard.")
+        return
+    if not scheduler.run_now("parley"):
+        await ctx.send("The event is already running!")
+        return
     await ctx.send("Starting the event now...")
-    await daily_event()
+
+@bot.command()
+async def migrate(ctx):
+    """Admin only command to import the JSON bux/parley/gamers data into the SQLite database"""
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("You do not have the required permissions to use this command.")
+        return
+
+    if isinstance(storage, SqliteStorage):
+        await ctx.send("The bot already runs on SQLite, the JSON data is out of date and would overwrite it.")
+        return
+
+    await ctx.send("Migrating data to SQLite...")
+    await run_io(bux_cache.flush)  # Get everything pending onto disk first
+
+    def run():
+        target = SqliteStorage(DATABASE_FILE)
+        try:
+            return migrate_json_to_sqlite(json_storage, target)
+        finally:
+            target.close()
+
+    try:
+        accounts, parleys, gamers = await run_io(run)
+    except RuntimeError as exc:
+        await ctx.send(f"Migration stopped: {exc}. Move `{DATABASE_FILE}` aside to import again.")
+        return
+    await ctx.send(f"Migrated {accounts:,} accounts, {parleys:,} parleys and {gamers} gamers to `{DATABASE_FILE}`.")
+
+@bot.command()
+async def shards(ctx):
+    """Admin only command to show the latency and event rate of each shard this process runs"""
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("You do not have the required permissions to use this command.")
+        return
+
+    guild_counts = {}
+    for guild in bot.guilds:
+        guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+
+    lines = [f"Shards {bot.shard_count} total, this process runs {len(bot.latencies)}:"]
+    for shard_id, stats in sorted(shard_stats.snapshot(bot.latencies).items()):
+        lines.append(f"Shard {shard_id}: {stats['latency_ms']} ms, {stats['events_per_sec']} events/s "
+                     f"({stats['events']:,} total), {guild_counts.get(shard_id, 0):,} guilds, "
+                     f"{stats['disconnects']} disconnects")
+    for chunk in chunk_message(lines):
+        await ctx.send(chunk)
+
+@bot.command()
+async def io(ctx):
+    """Admin only command to show how many Discord REST calls the outbound queue has saved"""
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("You do not have the required permissions to use this command.")
+        return
+
+    stats = outbox.stats()
+    made = stats["sent"] + stats["edited"]
+    await ctx.send(f"Outbound: {stats['requested']:,} sends/edits requested, {made:,} made "
+                   f"({stats['sent']:,} sent, {stats['edited']:,} edited), {stats['coalesced']:,} coalesced, "
+                   f"{stats['failed']:,} failed, {stats['queued']:,} queued")
+
+live_profiler = LiveProfiler()
+
+@bot.command()
+async def prof(ctx, seconds: int = 30, top: int = 25):
+    """Admin only command to profile the running bot and get the hottest functions and allocation sites as a file !prof <seconds> <top>"""
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("You do not have the required permissions to use this command.")
+        return
+
+    if not 1 <= seconds <= MAX_PROFILE_SECONDS:
+        await ctx.send(f"Profile for between 1 and {MAX_PROFILE_SECONDS} seconds.")
+        return
+
+    try:
+        profiling = live_profiler.profile(seconds, max(1, top))  # Claimed before anything is awaited
+    except RuntimeError:
+        await ctx.send("A profile is already running!")
+        return
+
+    await ctx.send(f"Profiling for {seconds} seconds...")
+    report = await profiling
+    filename = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    await ctx.send("Profile done:", file=discord.File(BytesIO(report.encode()), filename=filename))
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+
+@bot.after_invoke
+async def record_command(ctx):
+    """Runs for every command that got past its checks and argument parsing, failed or not."""
+    metrics.observe("command_duration_seconds", time.perf_counter() - ctx.started_at, command=ctx.command.name)
+    metrics.inc("commands_total", command=ctx.command.name, outcome="error" if ctx.command_failed else "ok")
+
+metrics.describe("commands_total", "Commands run, by outcome")
+metrics.describe("command_duration_seconds", "Time from a command's before_invoke to its after_invoke")
+metrics.describe("command_errors_total", "Errors passed to on_command_error, including failed checks and bad arguments")
+metrics.describe("hot_path_duration_seconds", "Time spent in load_bux, assign_role_based_on_bux and daily_event")
+metrics.describe("bux_saves_total", "Balances saved into the write-behind cache")
+metrics.describe("background_errors_total", "Exceptions caught in background loops, which retry on their next run")
+metrics.describe("discord_requests_total", "Discord REST calls, by route and HTTP status")
+metrics.describe("discord_request_errors_total", "Discord REST calls that failed without a response")
+
+@metrics.collect
+def collect_state():
+    """Values the bot already keeps, read when /metrics is scraped."""
+    backend = (("backend", STORAGE_BACKEND),)
+    cache = bux_cache.stats()
+    session_stats = sessions.stats()
+    outbound = outbox.stats()
+    jobs = scheduler.stats()
+    bounded = {"open_bets": open_bets, "cooldown_notices": last_cooldown_message,
+               "member_ranks": member_ranks, "usernames": username_cache}
+    return [
+        ("storage_reads_total", "counter", "Files (json) or records (sqlite) read from storage", {backend: storage.reads}),
+        ("storage_writes_total", "counter", "Files (json) or records (sqlite) written to storage", {backend: storage.writes}),
+        ("storage_bytes_written_total", "counter", "Bytes of JSON written to storage", {backend: storage.bytes_written}),
+        ("bux_cache_entries", "gauge", "Accounts in the bux cache", {(): cache["entries"]}),
+        ("bux_cache_dirty", "gauge", "Accounts in the bux cache not flushed yet", {(): cache["dirty"]}),
+        ("bux_cache_lookups_total", "counter", "Bux cache lookups", {(("result", "hit"),): cache["hits"],
+                                                                      (("result", "miss"),): cache["misses"]}),
+        ("bux_cache_flushes_total", "counter", "Bux cache flushes to storage", {(): cache["flushes"]}),
+        ("interactions_pending", "gauge", "wait_for style inputs waiting in the router, like parley picks", {(): len(router)}),
+        ("game_sessions", "gauge", "Open bj, hl and u sessions", {(("state", "in_memory"),): session_stats["in_memory"],
+                                                                  (("state", "swapped_out"),): session_stats["sessions"] - session_stats["in_memory"]}),
+        ("outbound_queued", "gauge", "Sends and edits waiting in the outbound queue", {(): outbound["queued"]}),
+        ("outbound_total", "counter", "Outbound sends and edits", {(("result", key),): outbound[key]
+                                                                   for key in ("sent", "edited", "coalesced", "failed")}),
+        ("state_entries", "gauge", "Entries in the bounded in-memory maps", {(("map", name),): len(structure)
+                                                                             for name, structure in bounded.items()}),
+        ("state_bytes", "gauge", "Approximate memory held by the bounded in-memory maps", {(("map", name),): structure.approx_bytes()
+                                                                                          for name, structure in bounded.items()}),
+        ("open_bets_expired_total", "counter", "Open bet leases that ran out instead of being released", {(): open_bets.expired}),
+        ("scheduled_job_runs_total", "counter", "Runs of each scheduled job, kept across restarts", {(("job", name),): job["runs"]
+                                                                                                     for name, job in jobs.items()}),
+        ("scheduled_job_failures_total", "counter", "Scheduled job runs that raised", {(("job", name),): job["failures"]
+                                                                                       for name, job in jobs.items()}),
+        ("scheduled_job_last_duration_seconds", "gauge", "How long each scheduled job's last run took", {(("job", name),): job["last_duration"]
+                                                                                                        for name, job in jobs.items() if job["last_duration"] is not None}),
+        ("scheduled_job_avg_duration_seconds", "gauge", "Average duration of each scheduled job's recent runs", {(("job", name),): job["avg_duration"]
+                                                                                                                for name, job in jobs.items() if job["avg_duration"] is not None}),
+        ("scheduled_job_next_run_timestamp_seconds", "gauge", "Unix time each scheduled job is due next", {(("job", name),): job["next_run"]
+                                                                                                          for name, job in jobs.items()}),
+        ("leaderboard_age_seconds", "gauge", "Age of the leaderboard snapshot !l pages are served from", {(): time.monotonic() - leaderboard.taken_at}),
+        ("leaderboard_changes_behind", "gauge", "Balance changes since the leaderboard snapshot was taken", {(): rank_index.changes - leaderboard.changes}),
+    ]
+
+@bot.listen("on_message")
+async def count_message(message):
+    shard_stats.record(message.guild.shard_id if message.guild else 0)
+
+@bot.listen("on_raw_reaction_add")
+async def count_reaction(payload):
+    shard_stats.record(shard_for(payload.guild_id, bot.shard_count))
 
 @bot.event
-async def on_ready():
-    await daily_event()
+async def on_shard_ready(shard_id):
+    shard_stats.connects[shard_id] += 1
+
+@bot.event
+async def on_shard_resumed(shard_id):
+    shard_stats.connects[shard_id] += 1
 
-bot.run('Token Here')
+@bot.event
+async def on_shard_disconnect(shard_id):
+    shard_stats.disconnects[shard_id] += 1
+
+@bot.event
+async def on_ready():
+    if ledger is not None and not commit_ledger.is_running():
+        commit_ledger.start()
+    if not flush_bux.is_running():
+        flush_bux.start()
+    if not sweep_sessions.is_running():
+        sweep_sessions.start()
+    if not refresh_leaderboard.is_running():
+        refresh_leaderboard.start()
+    scheduler.start()  # on_ready fires again on every reconnect, the scheduler only ever starts once
+    await metrics.start_server(METRICS_HOST, METRICS_PORT)
+
+if __name__ == "__main__":  # Importing the module (e.g. benchmarks/loadtest.py) sets the bot up without connecting
+    bot.run('Token Here')
+    if ledger is not None:
+        ledger.commit()
+    bux_cache.flush()  # Write anything still pending once the bot shuts down
+    storage.close()
+    storage_executor.shutdown()
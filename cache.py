@@ -0,0 +1,252 @@
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class AccountCache:
+    """Write-behind LRU cache for account records.
+
+    Reads go through ``loader(user_id)`` on a miss, writes only mark the entry dirty.
+    Dirty entries are written in batches through ``writer({user_id: data, ...})``
+    once ``flush_every`` seconds have passed or ``flush_count`` entries are dirty.
+    With ``max_age`` set, clean entries older than that many seconds are read again, for
+    when another process may be writing the same records.
+    """
+
+    def __init__(self, loader, writer, max_entries=10_000, flush_every=5.0, flush_count=100, max_age=None):
+        self.loader = loader
+        self.writer = writer
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.flush_count = flush_count
+        self.max_age = max_age
+
+        self._entries = OrderedDict()  # user_id -> data, least recently used first
+        self._dirty = set()
+        self._flushing = set()  # Taken out of _dirty by a flush whose write hasn't returned yet; pinned like dirty ones
+        self._stored_at = {}  # user_id -> monotonic time the entry was loaded or written
+        self._lock = threading.Lock()  # The flusher may run outside the event loop thread
+        self._last_flush = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.flushed_entries = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """Return a copy of the cached record, loading it on a miss. Returns None if it doesn't exist."""
+        with self._lock:
+            data = self._fresh(user_id)
+            if data is not None:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return dict(data)
+            self.misses += 1
+
+        data = self.loader(user_id)
+        if data is None:
+            return None
+
+        with self._lock:
+            # Another writer may have beaten us to it while we were reading
+            if self._fresh(user_id) is None:
+                self._entries[user_id] = data
+                self._stored_at[user_id] = time.monotonic()
+                self._evict()
+            return dict(self._entries.get(user_id, data))
+
+    def get_cached(self, user_id):
+        """Return a copy of the record if it's already in memory, without ever touching storage."""
+        with self._lock:
+            data = self._fresh(user_id)
+            if data is None:
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return dict(data)
+
+    def put(self, user_id, data):
+        """Store a record in memory and mark it dirty for the next flush."""
+        with self._lock:
+            self._entries[user_id] = dict(data)
+            self._entries.move_to_end(user_id)
+            self._stored_at[user_id] = time.monotonic()
+            self._dirty.add(user_id)
+            self._evict()
+
+    def put_many(self, records):
+        """Store several records at once so a flush can never split them."""
+        with self._lock:
+            now = time.monotonic()
+            for user_id, data in records.items():
+                self._entries[user_id] = dict(data)
+                self._entries.move_to_end(user_id)
+                self._stored_at[user_id] = now
+                self._dirty.add(user_id)
+            self._evict()
+
+    def write_many(self, records):
+        """Save records that mostly aren't cached, like a pass over every account, without filling the cache.
+
+        Records with a change still waiting to be flushed (dirty or being written) are updated in
+        memory and flushed with it; the rest go straight to ``writer`` in one batch, and any clean
+        copy still cached is replaced by what was written once it's stored, since it may be stale.
+        Returns the number written straight through.
+        """
+        direct = {}
+        with self._lock:
+            now = time.monotonic()
+            for user_id, data in records.items():
+                if user_id in self._dirty or user_id in self._flushing:
+                    self._entries[user_id] = dict(data)
+                    self._stored_at[user_id] = now
+                    self._dirty.add(user_id)
+                else:
+                    direct[user_id] = data
+        if direct:
+            self.writer(direct)
+            with self._lock:
+                now = time.monotonic()
+                for user_id, data in direct.items():
+                    if user_id in self._entries and user_id not in self._dirty and user_id not in self._flushing:
+                        self._entries[user_id] = dict(data)
+                        self._stored_at[user_id] = now
+        return len(direct)
+
+    def should_flush(self):
+        """Returns True once the time or count threshold has been reached."""
+        if not self._dirty:
+            return False
+        return (len(self._dirty) >= self.flush_count
+                or time.monotonic() - self._last_flush >= self.flush_every)
+
+    def flush(self):
+        """Write every dirty record in one batch. Returns the number of records written."""
+        with self._lock:
+            batch = {user_id: dict(self._entries[user_id]) for user_id in self._dirty}
+            self._flushing.update(self._dirty)
+            self._dirty.clear()
+            self._last_flush = time.monotonic()
+
+        if not batch:
+            return 0
+
+        try:
+            self.writer(batch)
+        except Exception:
+            with self._lock:  # Put them back so the next flush retries; anything written since is newer, keep that
+                for user_id, data in batch.items():
+                    if user_id not in self._dirty:
+                        self._entries[user_id] = data
+                        self._dirty.add(user_id)
+                self._flushing.difference_update(batch)
+            raise
+
+        with self._lock:
+            self._flushing.difference_update(batch)
+            self._evict()
+            self.flushes += 1
+            self.flushed_entries += len(batch)
+        return len(batch)
+
+    def _evict(self):
+        """Drop least recently used clean entries until we're within bounds. Dirty and in-flight entries are never dropped."""
+        if len(self._entries) <= self.max_entries:
+            return
+        for user_id in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if user_id not in self._dirty and user_id not in self._flushing:
+                del self._entries[user_id]
+                self._stored_at.pop(user_id, None)
+                self.evictions += 1
+
+    def _fresh(self, user_id):
+        """The entry for user_id if it's dirty or young enough to trust, else None. Caller holds the lock."""
+        data = self._entries.get(user_id)
+        if data is None or self.max_age is None or user_id in self._dirty or user_id in self._flushing:
+            return data
+        if time.monotonic() - self._stored_at.get(user_id, 0) > self.max_age:
+            return None
+        return data
+
+    def stats(self):
+        """Hit/miss/flush counters for diagnostics."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "dirty": len(self._dirty),
+                "hits": self.hits,
+                "misses": self.misses,
+                "flushes": self.flushes,
+                "flushed_entries": self.flushed_entries,
+                "evictions": self.evictions,
+            }
+
+
+class TTLCache:
+    """Small LRU map whose entries also expire ``ttl`` seconds after they were set."""
+
+    def __init__(self, max_entries=10_000, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def expire(self):
+        """Drop expired entries from the least recently used end. Returns how many were dropped."""
+        now = time.monotonic()
+        dropped = 0
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+            dropped += 1
+        return dropped
+
+    def approx_bytes(self):
+        return approx_bytes(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def approx_bytes(mapping, sample=100):
+    """Rough memory held by a dict and its entries, extrapolated from the first ``sample`` of them."""
+    size = sys.getsizeof(mapping)
+    items = list(itertools.islice(mapping.items(), sample))
+    if items:
+        size += len(mapping) * sum(_sizeof(key) + _sizeof(value) for key, value in items) // len(items)
+    return size
+
+
+def _sizeof(value):
+    if isinstance(value, tuple):  # Entries here are flat tuples like (expires_at, value) or (guild_id, member_id)
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    return sys.getsizeof(value)
@@ -0,0 +1,119 @@
+import random
+
+RANKS = ("2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A")
+ACE = RANKS.index("A")
+DECK_SIZE = 52
+
+# A card is an int from 0 to 51 per deck in the shoe; its rank is card % 13, suits aren't shown.
+# Everything a game asks about a card is one lookup in these tables.
+NAMES = tuple(RANKS[card % 13] for card in range(DECK_SIZE))
+HARD_POINTS = tuple(min(card % 13 + 2, 10) if card % 13 != ACE else 1 for card in range(DECK_SIZE))  # Blackjack, aces as 1
+HIGH_LOW_VALUES = tuple(card % 13 + 2 for card in range(DECK_SIZE))  # 2 to 10, then J=11, Q=12, K=13, A=14
+IS_ACE = tuple(card % 13 == ACE for card in range(DECK_SIZE))
+_BY_NAME = {name: RANKS.index(name) for name in RANKS}  # A name to the first card of that rank
+
+
+def card_name(card):
+    return NAMES[card]
+
+
+def card_value(card):
+    """High/low value of a card: 2-10 as printed, then J, Q, K and A as 11-14."""
+    return HIGH_LOW_VALUES[card]
+
+
+def parse_card(card):
+    """A card from its name, e.g. "Q", as kept by sessions saved before cards were ints. Ints pass through."""
+    return _BY_NAME[card] if isinstance(card, str) else card
+
+
+class Shoe:
+    """One or more shuffled decks stored as just a seed, how many cards have been drawn and the deck count.
+
+    The shuffle is a Fisher-Yates run one step per card drawn, from the end like random.shuffle,
+    so it deals exactly the cards random.Random(seed).shuffle would have put there while only
+    paying for the cards a game actually uses. A game rebuilt from its saved state replays just
+    the cards already drawn. With ``reshuffle_at`` set, the shoe starts over under a new seed once
+    that many cards have been dealt, like a casino cut card; otherwise it runs out.
+    """
+
+    def __init__(self, seed=None, drawn=0, decks=1, reshuffle_at=None, rng=random):
+        self.seed = rng.getrandbits(32) if seed is None else seed
+        self.drawn = drawn
+        self.decks = decks
+        self.reshuffle_at = reshuffle_at
+        self._cards = None  # Set up on the first draw
+        self._rng = None
+
+    def draw(self):
+        if self.drawn == self.reshuffle_at:
+            self.reshuffle()
+        if self._cards is None:
+            self._start()
+        self.drawn += 1
+        return self._settle(len(self._cards) - self.drawn)
+
+    def reshuffle(self):
+        self.seed = (self.seed * 6364136223846793005 + 1442695040888963407) & 0xFFFFFFFF  # Next seed, still just a number to save
+        self.drawn = 0
+        self._cards = None
+
+    def to_state(self):
+        state = [self.seed, self.drawn, self.decks, self.reshuffle_at]
+        return state[:2] if self.decks == 1 and self.reshuffle_at is None else state
+
+    def _start(self):
+        self._cards = list(range(DECK_SIZE)) * self.decks
+        self._rng = random.Random(self.seed)
+        for drawn in range(1, self.drawn + 1):
+            self._settle(len(self._cards) - drawn)
+
+    def _settle(self, i):
+        """Swap a random card from 0..i into position i, one step of random.shuffle's loop, and return it."""
+        cards = self._cards
+        if i:
+            j = self._rng._randbelow(i + 1)  # The same call random.shuffle makes, so the order matches it exactly
+            cards[i], cards[j] = cards[j], cards[i]
+        return cards[i]
+
+    def __len__(self):
+        return DECK_SIZE * self.decks - self.drawn
+
+
+class Hand:
+    """Cards held by one player, with the blackjack total kept up to date as cards are added."""
+
+    __slots__ = ("cards", "hard", "aces")
+
+    def __init__(self, cards=()):
+        self.cards = []
+        self.hard = 0  # Every ace counted as 1
+        self.aces = 0
+        for card in cards:
+            self.add(parse_card(card))
+
+    def add(self, card):
+        self.cards.append(card)
+        self.hard += HARD_POINTS[card]
+        self.aces += IS_ACE[card]
+
+    @property
+    def total(self):
+        """Best blackjack total: one ace counts 11 when that doesn't bust."""
+        return self.hard + 10 if self.aces and self.hard <= 11 else self.hard
+
+    @property
+    def soft(self):
+        return bool(self.aces) and self.hard <= 11
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __getitem__(self, index):
+        return self.cards[index]
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __str__(self):
+        return " ".join(NAMES[card] for card in self.cards)
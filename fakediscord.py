@@ -0,0 +1,385 @@
+import asyncio
+import itertools
+import random
+import re
+import time
+from collections import Counter, deque
+from types import SimpleNamespace
+
+import discord  # type: ignore
+from discord.ext import commands  # type: ignore
+
+from shards import shard_for
+
+MENTION = re.compile(r"<@!?([0-9]+)>")
+INTERACTION_DEADLINE = 3.0  # Seconds Discord gives a bot to answer a button press
+
+
+class FakeREST:
+    """Stand-in for Discord's REST API.
+
+    Every call takes ``latency`` seconds (plus or minus ``jitter``) and counts against its
+    bucket, which allows ``rate`` calls per ``per`` seconds like Discord's per-channel message
+    limit. Calls over the limit queue until the bucket has room, as discord.py does once the
+    rate limit headers say it's spent. ``error_429`` is the chance of an unexpected 429 on any
+    call, e.g. from a limit shared with other bots; it's retried after its retry_after.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.02, rate=5, per=5.0, error_429=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate = rate
+        self.per = per
+        self.error_429 = error_429
+        self.rng = random.Random(seed)
+        self._buckets = {}  # bucket -> deque of the times calls were (or will be) let through
+
+        self.requests = Counter()  # route -> calls made
+        self.throttled = Counter()  # route -> calls that had to wait for their bucket
+        self.rate_limited = Counter()  # route -> 429s received
+        self.wait = 0.0  # Seconds spent waiting on buckets and retry_after
+
+    async def request(self, route, bucket=None):
+        delay = self._reserve(bucket)
+        if delay:
+            self.throttled[route] += 1
+            self.wait += delay
+            await asyncio.sleep(delay)
+        while True:
+            await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))  # The round trip
+            if self.rng.random() >= self.error_429:
+                self.requests[route] += 1
+                return
+            self.rate_limited[route] += 1
+            retry_after = self.per / self.rate
+            self.wait += retry_after
+            await asyncio.sleep(retry_after)
+
+    def _reserve(self, bucket):
+        """Book the bucket's next free slot, first come first served. Returns how long until it."""
+        if bucket is None:
+            return 0.0
+        now = time.monotonic()
+        slots = self._buckets.setdefault(bucket, deque())
+        while slots and slots[0] <= now - self.per:
+            slots.popleft()
+        at = now if len(slots) < self.rate else max(now, slots[-self.rate] + self.per)
+        slots.append(at)
+        return at - now
+
+    def stats(self):
+        return {
+            "requests": sum(self.requests.values()),
+            "throttled": sum(self.throttled.values()),
+            "rate_limited": sum(self.rate_limited.values()),
+            "wait": self.wait,
+            "by_route": dict(self.requests),
+            "throttled_by_route": dict(self.throttled),
+        }
+
+
+class FakeRole:
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+
+    def __repr__(self):
+        return f"<FakeRole {self.name!r}>"
+
+
+class FakeMessage:
+    def __init__(self, world, message_id, channel, content=None, author=None, view=None):
+        self._world = world
+        self._state = world.bot._connection  # Context reads it
+        self.id = message_id
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.author = author
+        self.view = view
+        # The members it mentions, which MemberConverter checks before asking the gateway for them
+        self.mentions = [self.guild._members[int(member_id)] for member_id in MENTION.findall(content or "")
+                         if self.guild and int(member_id) in self.guild._members]
+        self.attachments = []
+        self.created_at = discord.utils.utcnow()
+        self.edited_at = None
+
+    async def edit(self, content=None, view=discord.utils.MISSING, **kwargs):
+        await self._world.rest.request("edit_message", ("channel", self.channel.id))
+        if content is not None:
+            self.content = content
+        if view is not discord.utils.MISSING:
+            self.view = view
+        self._world.on_board(self)
+        return self
+
+
+class FakeChannel:
+    """A text channel, or a DM when guild is None. DMs queue what the bot sends in ``inbox`` for the user to read."""
+
+    def __init__(self, world, channel_id, name, guild=None):
+        self._world = world
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.inbox = asyncio.Queue() if guild is None else None
+        self.history = deque(maxlen=50)
+
+    async def send(self, content=None, **kwargs):
+        await self._world.rest.request("send_message", ("channel", self.id))
+        message = FakeMessage(self._world, self._world.new_id(), self, content, self._world.user, kwargs.get("view"))
+        self.history.append(message)
+        if self.inbox is not None:
+            self.inbox.put_nowait(message)
+        self._world.on_board(message)
+        return message
+
+    def get_partial_message(self, message_id):
+        return self._world.messages.get(message_id) or FakeMessage(self._world, message_id, self)
+
+
+class FakeMember(discord.Member):
+    """A guild member with only what the bot reads. Subclasses discord.Member so converters accept it."""
+
+    def __init__(self, world, guild, member_id, name, administrator=False):  # Deliberately skips Member.__init__
+        self._world = world
+        self._guild = guild
+        self._id = member_id
+        self._name = name
+        self._role_list = []
+        self._administrator = administrator
+        self._dm_channel = None
+
+    id = property(lambda self: self._id)
+    name = property(lambda self: self._name)
+    display_name = global_name = property(lambda self: self._name)
+    nick = property(lambda self: None)
+    discriminator = property(lambda self: "0")
+    bot = property(lambda self: False)
+    mention = property(lambda self: f"<@{self._id}>")
+    guild = property(lambda self: self._guild)
+    roles = property(lambda self: list(self._role_list))
+    dm_channel = property(lambda self: self._dm_channel)
+
+    @property
+    def guild_permissions(self):
+        return discord.Permissions.all() if self._administrator else discord.Permissions.none()
+
+    async def create_dm(self):
+        if self._dm_channel is None:
+            await self._world.rest.request("create_dm")
+            self._dm_channel = self._world.add_channel(None, f"dm-{self._name}")
+        return self._dm_channel
+
+    async def send(self, content=None, **kwargs):
+        return await (await self.create_dm()).send(content, **kwargs)
+
+    async def add_roles(self, *roles, **kwargs):
+        for role in roles:  # One request per role, like discord.py
+            await self._world.rest.request("add_role", ("guild", self._guild.id))
+            if role not in self._role_list:
+                self._role_list.append(role)
+
+    async def remove_roles(self, *roles, **kwargs):
+        for role in roles:
+            await self._world.rest.request("remove_role", ("guild", self._guild.id))
+            if role in self._role_list:
+                self._role_list.remove(role)
+
+    def __hash__(self):
+        return self._id >> 22
+
+    def __str__(self):
+        return self._name
+
+    def __repr__(self):
+        return f"<FakeMember id={self._id} name={self._name!r}>"
+
+
+class FakeGuild:
+    def __init__(self, world, guild_id, name, shard_id=0):
+        self._world = world
+        self.id = guild_id
+        self.name = name
+        self.shard_id = shard_id
+        self.roles = []
+        self.text_channels = []
+        self._members = {}
+
+    def get_member(self, member_id):
+        if not self._world.bot.intents.members:
+            return None  # Like discord.py, which only caches members with the members intent
+        return self._members.get(member_id)
+
+    async def query_members(self, query=None, *, limit=5, user_ids=None, presences=False, cache=True):
+        await asyncio.sleep(0)  # A gateway request, not REST, so it doesn't count against the buckets
+        return [self._members[member_id] for member_id in user_ids or () if member_id in self._members][:limit]
+
+    async def fetch_member(self, member_id):
+        await self._world.rest.request("fetch_member", ("guild", self.id))
+        member = self._members.get(member_id)
+        if member is None:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Member")
+        return member
+
+    def get_member_named(self, name):
+        return next((member for member in self._members.values() if member.name == name), None)
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    async def create_role(self, name, **kwargs):
+        await self._world.rest.request("create_role", ("guild", self.id))
+        role = FakeRole(self._world.new_id(), name)
+        self.roles.append(role)
+        return role
+
+    def _resolve_channel(self, channel_id):  # What ConnectionState.get_channel asks each guild
+        return next((channel for channel in self.text_channels if channel.id == channel_id), None)
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+        self.kind = None  # "edit_message", "defer" or "send_message" once answered
+        self.content = None
+
+    def is_done(self):
+        return self._done
+
+    async def edit_message(self, content=None, view=discord.utils.MISSING, **kwargs):
+        await self._respond("edit_message")
+        message = self._interaction.message
+        if content is not None:
+            message.content = content
+        if view is not discord.utils.MISSING:
+            message.view = view
+        self._interaction._world.on_board(message)
+
+    async def defer(self, **kwargs):
+        await self._respond("defer")
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond("send_message")
+        self.content = content
+
+    async def _respond(self, kind):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        world = self._interaction._world
+        await world.rest.request(f"interaction_{kind}")
+        self._done = True
+        self.kind = kind
+        if time.monotonic() - self._interaction.created > INTERACTION_DEADLINE:
+            world.expired_interactions += 1  # Discord would have shown "This interaction failed"
+
+
+class FakeInteraction:
+    def __init__(self, world, user, message):
+        self._world = world
+        self.user = user
+        self.message = message
+        self.guild = message.guild
+        self.channel = message.channel
+        self.created = time.monotonic()
+        self.response = FakeResponse(self)
+
+
+class FakeContext(commands.Context):
+    """Context whose replies go to the fake channel instead of through discord.py's HTTP client."""
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeDiscord:
+    """The world a bot sees without a gateway: guilds, channels, members and an event injector.
+
+    Guilds are put in the bot's own connection cache, so get_guild, get_channel and guilds
+    work as usual. Everything that would be a REST call goes through ``rest`` instead.
+    Commands run through ``bot.invoke``, messages through the bot's on_message listeners,
+    and button presses through the callbacks of the items on the message.
+    """
+
+    def __init__(self, bot, rest=None):
+        self.bot = bot
+        self.rest = rest or FakeREST()
+        self._ids = itertools.count(10 ** 17)
+        self.user = SimpleNamespace(id=self.new_id(), name="bot", bot=True, mention="<@bot>")
+        self.channels = {}  # id -> every FakeChannel, DMs included
+        self.messages = {}  # id -> message that still has a view, for edits of partial messages
+        self.boards = {}  # member id -> the latest message with buttons that mentions them
+        self.expired_interactions = 0
+
+        bot._connection.user = self.user
+        bot.get_partial_messageable = self.get_partial_messageable
+        bot.fetch_user = self.fetch_user
+
+    def new_id(self):
+        return next(self._ids)
+
+    def add_guild(self, name, channel_names=("general",)):
+        guild_id = self.new_id()
+        guild = FakeGuild(self, guild_id, name, shard_for(guild_id, self.bot.shard_count or 1))
+        for channel_name in channel_names:
+            guild.text_channels.append(self.add_channel(guild, channel_name))
+        self.bot._connection._guilds[guild.id] = guild
+        return guild
+
+    def add_channel(self, guild, name):
+        channel = FakeChannel(self, self.new_id(), name, guild)
+        self.channels[channel.id] = channel
+        return channel
+
+    def add_member(self, guild, name, administrator=False, member_id=None):
+        member = FakeMember(self, guild, member_id or self.new_id(), name, administrator)
+        guild._members[member.id] = member
+        self.bot._connection._users[member.id] = member  # For bot.get_user
+        return member
+
+    def get_partial_messageable(self, channel_id, **kwargs):
+        return self.channels[channel_id]
+
+    async def fetch_user(self, user_id):
+        await self.rest.request("fetch_user")
+        user = self.bot.get_user(user_id)
+        if user is None:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown User")
+        return user
+
+    def on_board(self, message):
+        """Keep track of messages with buttons, and whose they are."""
+        if message.view is None:
+            self.messages.pop(message.id, None)
+        else:
+            self.messages[message.id] = message
+            for member_id in MENTION.findall(message.content or ""):
+                self.boards[int(member_id)] = message
+
+    # Injecting events
+    def ready(self):
+        self.bot.dispatch("ready")
+
+    async def invoke(self, member, channel, content):
+        """Run a command like the member typed it in the channel. Returns once the command has finished."""
+        message = FakeMessage(self, self.new_id(), channel, content, member)
+        ctx = await self.bot.get_context(message, cls=FakeContext)
+        await self.bot.invoke(ctx)
+        return ctx
+
+    def message(self, member, channel, content):
+        """Deliver a message to the bot's on_message listeners, e.g. a reply to a prompt."""
+        message = FakeMessage(self, self.new_id(), channel, content, member)
+        self.bot.dispatch("message", message)
+        return message
+
+    async def press(self, member, message, action):
+        """Press the button on message whose custom_id ends in ``:action``. Returns the interaction."""
+        interaction = FakeInteraction(self, member, message)
+        for item in message.view.children if message.view else ():
+            if getattr(item, "custom_id", "").endswith(f":{action}"):
+                await item.callback(interaction)
+                return interaction
+        raise LookupError(f"no {action!r} button on message {message.id}")
@@ -0,0 +1,265 @@
+import random
+
+from cards import Hand, Shoe, card_name, card_value, parse_card
+
+
+class Prompt:
+    """What a game is waiting for: a press of one of ``buttons``, or a typed reply when it's None.
+
+    buttons is a list of (emoji, label, action).
+    """
+
+    def __init__(self, text, buttons=None, timeout=300.0):
+        self.text = text
+        self.buttons = buttons
+        self.timeout = timeout
+
+
+class Step:
+    """Result of advancing a game: messages to send, bux to pay out, then either a prompt or the end."""
+
+    def __init__(self, messages=None, credit=0, prompt=None):
+        self.messages = messages or []
+        self.credit = credit
+        self.prompt = prompt
+
+    @property
+    def done(self):
+        return self.prompt is None
+
+
+class Game:
+    """A game whose whole state is a small dict, so it can be saved between turns and resumed anywhere.
+
+    ``start`` and ``act`` return a Step. ``parse`` turns an incoming button action or message
+    into one of the game's actions, or None if it isn't one. A ``board`` game shows each step by
+    editing one message, with its buttons, instead of posting new ones.
+    """
+
+    name = None
+    board = False
+    hands = ()  # Attributes holding a Hand, saved as plain lists of cards
+
+    def __init__(self, user_id, bet):
+        self.mention = f"<@{user_id}>"
+        self.user_id = user_id
+        self.bet = bet
+
+    def to_dict(self):
+        state = {key: value for key, value in vars(self).items() if not key.startswith("_") and key != "mention"}
+        if isinstance(getattr(self, "deck", None), Shoe):
+            state["deck"] = self.deck.to_state()
+        for name in self.hands:
+            state[name] = list(state[name].cards)
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        game = cls.__new__(cls)
+        game.__dict__.update(state)
+        game.mention = f"<@{game.user_id}>"
+        if "deck" in state:
+            game.deck = Shoe(*state["deck"])
+        for name in cls.hands:
+            setattr(game, name, Hand(state[name]))  # Sessions saved before cards were ints hold names, Hand takes both
+        return game
+
+
+class Blackjack(Game):
+    name = "bj"
+    board = True
+    hands = ("player", "dealer")
+    BUTTONS = [("✅", "Hit", "hit"), ("❌", "Stay", "stand"), ("💰", "Double down", "double")]
+
+    def __init__(self, user_id, bet, rng=random):
+        super().__init__(user_id, bet)
+        self.deck = Shoe(rng=rng)
+        self.player = Hand()
+        self.dealer = Hand()
+        self.doubled = False
+
+    def parse(self, value):
+        return value if value in ("hit", "stand", "double") else None
+
+    def start(self):
+        self.player = Hand([self.deck.draw(), self.deck.draw()])
+        self.dealer = Hand([self.deck.draw(), self.deck.draw()])
+        opening = f"**Blackjack!**\nYour cards: {self.player}\nDealer's cards: {card_name(self.dealer[0])} ?"
+        if self.player.total == 21:
+            return Step([opening, f"{self.mention} wins 2.5x the bet! You win {self.bet * 2.5} bux!"], credit=self.bet * 2.5)
+        return self._turn([opening])
+
+    def act(self, action):
+        """action is "hit", "stand", "double" (already paid for), "double_unpaid" or "timeout"."""
+        messages = []
+        if action == "hit":
+            self.player.add(self.deck.draw())
+            if self.player.total > 21:
+                return Step([f"**Busted!** Your hand: {self._hand()}",
+                             f"{self.mention} lost the bet of {self.bet} bux."])
+            if self.player.total < 21:
+                return self._turn(messages)
+        elif action == "double_unpaid":
+            messages.append(f"{self.mention},You don't have enough bux to double down. This will be counted as a hit.")
+            self.player.add(self.deck.draw())  # Draw one more card (same as hitting)
+            messages.append(f"{self.mention} Your hand: {self._hand()}")
+        elif action == "double":
+            self.player.add(self.deck.draw())
+            messages.append(f"{self.mention} You chose to double down! Your hand: {self._hand()}")
+            self.doubled = True
+        elif action == "timeout":
+            messages.append(f"{self.mention} You took too long! You stand.")
+        return self._settle(messages)
+
+    def _hand(self):
+        return f"{self.player} (Total: {self.player.total})"
+
+    def _turn(self, messages):
+        messages.append(f"{self.mention} Your current hand: {self._hand()}")
+        return Step(messages, prompt=Prompt("Press ✅ to hit, ❌ to stay, or 💰 to double down.", self.BUTTONS))
+
+    def _settle(self, messages):
+        """Play out the dealer's hand and pay the player."""
+        bet, mention = self.bet, self.mention
+        dealer_points = self.dealer.total
+        messages.append(f"{mention}, Dealer's cards: {self.dealer} (Total: {dealer_points})")
+        while dealer_points < 17:
+            self.dealer.add(self.deck.draw())
+            dealer_points = self.dealer.total
+            messages.append(f"{mention}, Dealer's hand: {self.dealer} (Total: {dealer_points})")
+
+        player_points = self.player.total
+        winnings = bet * 4 if self.doubled else bet * 2  # 4x the bet if the player doubled down
+        if player_points > 21:         # Player busts
+            return Step(messages + [f"{mention} lost the bet of {bet} bux. You busted!"])
+        if dealer_points > 21:        # Dealer busts
+            return Step(messages + [f"Dealer busted! {mention} wins {winnings} bux!"], credit=winnings)
+        if player_points > dealer_points:         # Player wins
+            return Step(messages + [f"{mention} wins {winnings} bux!"], credit=winnings)
+        if player_points == dealer_points:         # Tie
+            refund_amount = bet * 2 if self.doubled else bet  # Refund full amount if doubled down
+            return Step(messages + [f"{mention}, it's a tie! You get your {refund_amount} bux back."], credit=refund_amount)
+        lost = bet * 2 if self.doubled else bet         # Dealer wins
+        return Step(messages + [f"Dealer wins! {mention} lost the bet of {lost} bux."])
+
+
+class HighLow(Game):
+    name = "hl"
+    board = True
+    GUESS_BUTTONS = [("⬆️", "Higher", "higher"), ("⬇️", "Lower", "lower")]
+    CASHOUT_BUTTONS = [("💰", "Cash out", "cashout"), ("🔄", "Keep going", "continue")]
+
+    def __init__(self, user_id, bet, rng=random):
+        super().__init__(user_id, bet)
+        self.deck = Shoe(rng=rng)
+        self.current = None
+        self.multiplier = 2  # Starts at 2x after 3 correct rounds
+        self.correct = 0
+        self.phase = "guess"  # or "cashout" every third correct guess
+
+    @classmethod
+    def from_dict(cls, state):
+        game = super().from_dict(state)
+        if game.current is not None:
+            game.current = parse_card(game.current)
+        return game
+
+    def parse(self, value):
+        buttons = self.GUESS_BUTTONS if self.phase == "guess" else self.CASHOUT_BUTTONS
+        return value if any(action == value for _, _, action in buttons) else None
+
+    def start(self):
+        self.current = self.deck.draw()
+        return self._round([f"{self.mention}, starting card is **{card_name(self.current)}**. Press ⬆️ for Higher or ⬇️ for Lower."])
+
+    def act(self, action):
+        """action is "higher", "lower", "cashout", "continue" or "timeout"."""
+        mention, bet = self.mention, self.bet
+        if self.phase == "cashout":
+            if action == "timeout":
+                return Step([f"{mention}, time ran out! You got refunded."], credit=bet)
+            if action == "cashout":
+                winnings = bet * self.multiplier
+                return Step([f"{mention}, you cashed out and won **{winnings} bux!**"], credit=winnings)
+            self.multiplier *= 2  # Increase the multiplier
+            self.phase = "guess"
+            return self._round([f"{mention} 🔥 You continue! New multiplier is **{self.multiplier}x**."])
+
+        if action == "timeout":
+            return Step([f"{mention}, you took too long! You lost your bet of {bet} bux."])
+
+        next_card = self.deck.draw()
+        current_value, next_value = card_value(self.current), card_value(next_card)
+        if (action == "higher" and next_value > current_value) or (action == "lower" and next_value < current_value):
+            self.correct += 1
+            self.current = next_card  # Move to next round
+            messages = [f" {mention} ✅ Correct! Next card was **{card_name(next_card)}**."]
+            if self.correct % 3 == 0:  # Every 3 correct guesses, allow cash-out
+                self.phase = "cashout"
+                messages.append(f"{mention} You've won **{self.multiplier}x** your bet so far! Press 💰 to cash out or 🔄 to continue.")
+                return Step(messages, prompt=Prompt("💰 = Cash Out | 🔄 = Keep Going", self.CASHOUT_BUTTONS))
+            return self._round(messages)
+        if current_value == next_value:
+            return self._round([f"{mention} 😬 Tie! The next card was also **{card_name(next_card)}**. You get a free retry!"])
+        return Step([f"{mention} ❌ Wrong! The next card was **{card_name(next_card)}**. You lost your bet of {bet} bux."])
+
+    def _round(self, messages):
+        if not len(self.deck):  # If the deck is empty, end the game
+            winnings = self.bet * self.multiplier
+            return Step(messages + [f"{self.mention}, you've made it through the entire deck! You win **{winnings} bux!** 🎉"],
+                        credit=winnings)
+        return Step(messages, prompt=Prompt(f"{self.mention} Current card: **{card_name(self.current)}**\nPress ⬆️ for Higher or ⬇️ for Lower.",
+                                            self.GUESS_BUTTONS))
+
+
+def unlock_feedback(code, guess):
+    feedback = []
+    for i in range(4):
+        if guess[i] == code[i]:
+            feedback.append("✅")  # Correct digit in right position
+        elif guess[i] in code:
+            feedback.append("🔄")  # Correct digit, wrong position
+        else:
+            feedback.append("❌")  # Incorrect digit
+    return "".join(feedback)
+
+
+class Unlocker(Game):
+    name = "u"
+    MAX_ATTEMPTS = 5
+    REWARD_MULTIPLIERS = [5, 4, 2.5, 1.75, 0.75]  # Adjusted reward multipliers
+
+    def __init__(self, user_id, bet, rng=random):
+        super().__init__(user_id, bet)
+        self.code = "".join(str(rng.randint(0, 9)) for _ in range(4))  # Generate 4-digit code
+        self.attempts = 0
+
+    def parse(self, value):
+        content = value.content
+        return content if content.isdigit() and len(content) == 4 else None
+
+    def start(self):
+        return self._attempt([
+            f"**Welcome to Unlocker!**\nYou have {self.MAX_ATTEMPTS} attempts to guess the 4-digit code. Enter the code without spaces or dashes. Good luck!",
+            " ✅ Correct digit in right position 🔄 Correct digit, wrong position ❌ Incorrect digit ",
+            "  Reward based on attempts: 1st = x5, 2nd = x4, 3rd = x2.5, 4th = x1.75, 5th = x0.75 ",
+        ])
+
+    def act(self, action):
+        """action is a 4-digit guess or "timeout"."""
+        if action == "timeout":
+            return Step(["You took too long! The game ends."], credit=self.bet)  # Refund the bet amount
+
+        self.attempts += 1
+        if action == self.code:
+            reward = self.bet * self.REWARD_MULTIPLIERS[self.attempts - 1]
+            return Step([f"**Unlocked!** You win {reward} bux!"], credit=reward)
+        if self.attempts == self.MAX_ATTEMPTS:
+            return Step([f"**Game Over!** You failed to crack the code. The correct code was: {self.code}."])
+        return self._attempt([f"Feedback: {unlock_feedback(self.code, action)} - Keep guessing!"])
+
+    def _attempt(self, messages):
+        return Step(messages, prompt=Prompt(f"Attempt {self.attempts + 1}/{self.MAX_ATTEMPTS}: Enter a 4-digit code:", timeout=600.0))
+
+
+GAMES = {game.name: game for game in (Blackjack, HighLow, Unlocker)}
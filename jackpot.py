@@ -0,0 +1,111 @@
+import random
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # The pure-Python engine below is used instead
+    np = None
+
+symbol_pool = (
+    ["🍋"] * 35 +  # 35% chance
+    ["🍀"] * 25 +  # 25% chance
+    ["🍒"] * 20 +  # 20% chance
+    ["💎"] * 15 +  # 15% chance
+    ["7️⃣"] * 5    # 5% chance
+)
+
+payout_multipliers = {
+    "7️⃣": 42,
+    "💎": 17,
+    "🍒": 15,
+    "🍀": 11,
+    "🍋": 7
+}
+partial_payout_multipliers = {
+    "💎": 5,
+    "7️⃣": 16
+}
+
+SYMBOLS = list(dict.fromkeys(symbol_pool))  # Unique symbols in pool order
+MAX_SPINS = 1_000_000 if np is not None else 10_000
+CHUNK_SIZE = 1_000_000  # Spins drawn per NumPy batch, keeps memory bounded for huge requests
+
+
+class SpinResult:
+    """Outcome of a batch of spins: total payout plus how often each symbol hit."""
+
+    def __init__(self, spins, total_payout, full_hits, partial_hits):
+        self.spins = spins
+        self.total_payout = total_payout
+        self.full_hits = full_hits  # symbol -> number of three-of-a-kind spins
+        self.partial_hits = partial_hits  # symbol -> number of paying two-of-a-kind spins
+
+
+def spin_batch(spins, bet_amount, rng=None):
+    """Spin the slot machine ``spins`` times. Uses NumPy when available, otherwise the Python loop."""
+    if np is not None:
+        return _spin_numpy(spins, bet_amount, rng or np.random.default_rng())
+    return _spin_python(spins, bet_amount, rng or random)
+
+
+def _spin_python(spins, bet_amount, rng):
+    full_hits = dict.fromkeys(SYMBOLS, 0)
+    partial_hits = dict.fromkeys(SYMBOLS, 0)
+    total_multiplier = 0
+    choice = rng.choice
+
+    for _ in range(spins):
+        reel_1, reel_2, reel_3 = choice(symbol_pool), choice(symbol_pool), choice(symbol_pool)
+
+        # Determine winnings based on full match or partial match
+        if reel_1 == reel_2 == reel_3:
+            total_multiplier += payout_multipliers[reel_1]
+            full_hits[reel_1] += 1
+            continue
+        if reel_1 == reel_2 or reel_1 == reel_3:  # Two matching symbols
+            pair = reel_1
+        elif reel_2 == reel_3:
+            pair = reel_2
+        else:
+            continue
+        multiplier = partial_payout_multipliers.get(pair, 0)
+        if multiplier:
+            total_multiplier += multiplier
+            partial_hits[pair] += 1
+
+    return SpinResult(spins, bet_amount * total_multiplier, full_hits, partial_hits)
+
+
+# Lookup tables for the NumPy engine: pool slot -> symbol index, symbol index -> multiplier
+if np is not None:
+    _POOL_INDEX = np.array([SYMBOLS.index(symbol) for symbol in symbol_pool], dtype=np.int8)
+    _FULL_MULTIPLIERS = np.array([payout_multipliers[symbol] for symbol in SYMBOLS], dtype=np.int64)
+    _PARTIAL_MULTIPLIERS = np.array([partial_payout_multipliers.get(symbol, 0) for symbol in SYMBOLS], dtype=np.int64)
+
+
+def _spin_numpy(spins, bet_amount, rng):
+    full_counts = np.zeros(len(SYMBOLS), dtype=np.int64)
+    partial_counts = np.zeros(len(SYMBOLS), dtype=np.int64)
+    total_multiplier = 0
+
+    remaining = spins
+    while remaining:
+        size = min(remaining, CHUNK_SIZE)
+        remaining -= size
+
+        reels = _POOL_INDEX[rng.integers(0, len(symbol_pool), size=(3, size))]
+        reel_1, reel_2, reel_3 = reels
+
+        full = (reel_1 == reel_2) & (reel_2 == reel_3)
+        # Without a full match at most one pair can exist, and reel_2 is part of every pair except 1-3
+        pair = ~full & ((reel_1 == reel_2) | (reel_2 == reel_3) | (reel_1 == reel_3))
+        pair_symbol = np.where(reel_1 == reel_3, reel_1, reel_2)[pair]
+
+        full_symbol = reel_1[full]
+        total_multiplier += int(_FULL_MULTIPLIERS[full_symbol].sum()) + int(_PARTIAL_MULTIPLIERS[pair_symbol].sum())
+        full_counts += np.bincount(full_symbol, minlength=len(SYMBOLS))
+        partial_counts += np.bincount(pair_symbol, weights=_PARTIAL_MULTIPLIERS[pair_symbol] > 0,
+                                      minlength=len(SYMBOLS)).astype(np.int64)
+
+    full_hits = {symbol: int(count) for symbol, count in zip(SYMBOLS, full_counts)}
+    partial_hits = {symbol: int(count) for symbol, count in zip(SYMBOLS, partial_counts)}
+    return SpinResult(spins, bet_amount * total_multiplier, full_hits, partial_hits)
@@ -0,0 +1,71 @@
+"""Run the bot as several processes that each own a contiguous range of shards.
+
+Usage: python launcher.py --shards 8 --processes 2
+
+Every process must share the SQLite backend (set STORAGE_BACKEND = "sqlite" in bot.py after
+running !migrate). The process that owns shard 0 settles the parleys. A process that exits
+on its own is restarted after a short delay; Ctrl+C stops all of them.
+
+Limits of running more than one process:
+- Discord delivers every DM to shard 0, so `!p` picks and `!u` guesses only work in guilds on
+  the process that owns it. The other processes turn those commands down before taking a bet.
+- Per-user locks only exist within a process. Balances are flushed as changes on top of the
+  stored value in one transaction, so two processes paying the same user both count. A balance
+  check like "enough to bet" can still pass in two processes at once, so a user betting from
+  two guilds on different processes in the same instant can briefly go below zero.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+RESTART_DELAY = 5
+
+
+def shard_ranges(shards, processes):
+    """Split range(shards) into ``processes`` contiguous, nearly equal ranges."""
+    size, extra = divmod(shards, processes)
+    ranges = []
+    start = 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def spawn(shards, shard_ids):
+    env = dict(os.environ, SHARD_COUNT=str(shards), SHARD_IDS=",".join(map(str, shard_ids)))
+    print(f"Starting shards {shard_ids[0]}-{shard_ids[-1]}")
+    return subprocess.Popen([sys.executable, BOT_FILE], env=env, cwd=os.path.dirname(BOT_FILE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, required=True, help="Total shard count across every process")
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+    if not 1 <= args.processes <= args.shards:
+        parser.error("--processes must be between 1 and --shards")
+
+    ranges = shard_ranges(args.shards, args.processes)
+    children = [spawn(args.shards, shard_ids) for shard_ids in ranges]
+    try:
+        while True:
+            time.sleep(1)
+            for i, child in enumerate(children):
+                if child.poll() is not None:
+                    print(f"Shards {ranges[i][0]}-{ranges[i][-1]} exited with {child.returncode}, restarting")
+                    time.sleep(RESTART_DELAY)
+                    children[i] = spawn(args.shards, ranges[i])
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.wait()
+
+
+if __name__ == "__main__":
+    main()
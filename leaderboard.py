@@ -0,0 +1,51 @@
+import time
+
+from cache import TTLCache
+
+
+class LeaderboardSnapshot:
+    """The standings frozen at one moment, served a page at a time.
+
+    Built from a copy of the rank index's order, so pages don't shift under someone paging
+    through them and nothing is sorted or scanned per request: a page is a slice, finding a
+    user's page is a dict lookup, and each page's text (names and formatted bux) is rendered
+    once and reused until the next snapshot. Building one is O(n) and safe to run off the
+    event loop; the bot swaps in a new one when balances have changed enough.
+    """
+
+    def __init__(self, entries=(), changes=0, page_size=7, max_pages=1_000):
+        self.entries = list(entries)  # (-bux, user_id) in rank order, as RankIndex.snapshot returns them
+        self.positions = {user_id: position for position, (_, user_id) in enumerate(self.entries)}
+        self.changes = changes  # RankIndex.changes when the snapshot was taken
+        self.page_size = page_size
+        self.taken_at = time.monotonic()
+        self._rendered = TTLCache(max_entries=max_pages, ttl=24 * 60 * 60)  # page -> text
+
+    @property
+    def pages(self):
+        return max(1, -(-len(self.entries) // self.page_size))
+
+    def rank(self, user_id):
+        """1-based rank of a user in this snapshot, or None if they weren't ranked yet."""
+        position = self.positions.get(user_id)
+        return None if position is None else position + 1
+
+    def page_of(self, user_id):
+        position = self.positions.get(user_id)
+        return None if position is None else position // self.page_size + 1
+
+    def page(self, page):
+        """[(rank, user_id, bux)] on a 1-based page."""
+        start = (page - 1) * self.page_size
+        return [(start + offset + 1, user_id, -neg_bux)
+                for offset, (neg_bux, user_id) in enumerate(self.entries[start:start + self.page_size])]
+
+    async def page_text(self, page, resolve_names):
+        """A page's lines, rendered the first time it's asked for. resolve_names is an async {user_id: name} lookup."""
+        text = self._rendered.get(page)
+        if text is None:
+            rows = self.page(page)
+            names = await resolve_names([user_id for _, user_id, _ in rows])
+            text = "\n".join(f"**{rank}. {names[user_id]}** - {bux:,.2f} bux" for rank, user_id, bux in rows)
+            self._rendered.set(page, text)
+        return text
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+
+EVENT_TYPES = ("bet_placed", "payout", "transfer", "daily", "welfare", "admin_adjust")
+
+
+class Ledger:
+    """Append-only journal of balance changes with group commit and compacted snapshots.
+
+    ``record`` only queues an event in memory; ``commit`` writes everything queued with a
+    single write + fsync. ``snapshot`` writes the current balances and starts a fresh journal,
+    and ``load`` rebuilds the balances from the last snapshot plus every journaled event after it.
+    """
+
+    def __init__(self, journal_path, snapshot_path, snapshot_every=50_000):
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.rotated_path = journal_path + ".old"  # Journal being compacted into the next snapshot
+        self.snapshot_every = snapshot_every
+
+        self.balances = {}  # user_id -> bux, as of the latest recorded event
+        self.seq = 0
+        self._pending = []
+        self._lock = threading.Lock()  # Guards the in-memory state; only ever held briefly
+        self._write_lock = threading.Lock()  # Serializes journal writes, which run on the storage executor
+        self._events_since_snapshot = 0
+
+        self.commits = 0
+        self.events_committed = 0
+        self.snapshots = 0
+
+    def record(self, kind, user_id, amount, **extra):
+        """Queue a balance change for the next group commit. Returns its sequence number."""
+        if kind not in EVENT_TYPES:
+            raise ValueError(f"Unknown ledger event type {kind!r}")
+        with self._lock:
+            self.seq += 1
+            self.balances[user_id] = self.balances.get(user_id, 0) + amount
+            event = {"seq": self.seq, "ts": round(time.time(), 3), "type": kind, "user_id": user_id, "amount": amount}
+            event.update(extra)
+            self._pending.append(json.dumps(event))
+            self._events_since_snapshot += 1
+            return self.seq
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def commit(self):
+        """Append every queued event to the journal with one fsync. Returns the number written."""
+        with self._write_lock:
+            with self._lock:
+                lines, self._pending = self._pending, []
+            try:
+                return self._append(lines)
+            except Exception:
+                with self._lock:  # Back in front of anything recorded since, so the next commit retries them in order
+                    self._pending[:0] = lines
+                raise
+
+    def should_snapshot(self):
+        return self._events_since_snapshot >= self.snapshot_every
+
+    def snapshot(self):
+        """Write the current balances as a snapshot and compact away the journal behind it."""
+        with self._write_lock:
+            with self._lock:
+                lines, self._pending = self._pending, []
+                data = {"seq": self.seq, "balances": dict(self.balances)}
+                self._events_since_snapshot = 0
+            self._append(lines)
+            # Set the journal aside so new events start a fresh one while the snapshot is written
+            if os.path.exists(self.journal_path):
+                if os.path.exists(self.rotated_path):  # An earlier snapshot never finished, keep its events too
+                    with open(self.journal_path, 'r') as src, open(self.rotated_path, 'a') as dst:
+                        dst.write(src.read())
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, self.rotated_path)
+
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+        self.snapshots += 1
+
+    def reset(self, balances):
+        """Start the ledger over from a known set of (user_id, bux) balances."""
+        with self._write_lock, self._lock:
+            self._pending.clear()
+            self.balances = dict(balances)
+            for path in (self.journal_path, self.rotated_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.snapshot()
+
+    def load(self):
+        """Replay the snapshot and journal into ``balances``. Returns False if there was nothing to load."""
+        found = False
+        snapshot_seq = 0
+        self.balances = {}
+        self.seq = 0
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                data = json.load(f)
+            self.balances = data["balances"]
+            self.seq = snapshot_seq = data["seq"]
+            found = True
+
+        for path in (self.rotated_path, self.journal_path):
+            if not os.path.exists(path):
+                continue
+            found = True
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break  # A torn final write from a crash; nothing after it was committed
+                    if event["seq"] <= snapshot_seq:
+                        continue
+                    self.balances[event["user_id"]] = self.balances.get(event["user_id"], 0) + event["amount"]
+                    self.seq = max(self.seq, event["seq"])
+                    self._events_since_snapshot += 1
+
+        return found
+
+    def close(self):
+        self.commit()
+
+    def _append(self, lines):
+        if not lines:
+            return 0
+        with open(self.journal_path, 'a') as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.commits += 1
+        self.events_committed += len(lines)
+        return len(lines)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from cache import approx_bytes
+
+
+class AccountLocks:
+    """Per-account asyncio locks, created on demand and dropped once nobody holds or waits on them.
+
+    Commands touching different users never wait on each other, and ``hold`` always
+    acquires several accounts in sorted order so two transfers can't deadlock.
+    """
+
+    def __init__(self):
+        self._locks = {}  # user_id -> [lock, number of holders + waiters]
+
+    @asynccontextmanager
+    async def hold(self, *user_ids):
+        ordered = sorted({str(user_id) for user_id in user_ids})
+        acquired = []
+        try:
+            for user_id in ordered:
+                entry = self._locks.setdefault(user_id, [asyncio.Lock(), 0])
+                entry[1] += 1
+                try:
+                    await entry[0].acquire()
+                except BaseException:
+                    self._release_ref(user_id)
+                    raise
+                acquired.append(user_id)
+            yield
+        finally:
+            for user_id in reversed(acquired):
+                self._locks[user_id][0].release()
+                self._release_ref(user_id)
+
+    def locked(self, user_id):
+        entry = self._locks.get(str(user_id))
+        return bool(entry and entry[0].locked())
+
+    def _release_ref(self, user_id):
+        entry = self._locks[user_id]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[user_id]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+class Leases:
+    """Who is holding something, like an open bet, where every hold runs out on its own.
+
+    A lease lasts ``ttl`` seconds unless it's released first, so a command that crashes or
+    is abandoned can't lock its player out for longer than that, and memory only ever holds
+    the players who are mid-bet right now.
+    """
+
+    def __init__(self, ttl=600.0):
+        self.ttl = ttl
+        self._expires = {}  # key -> monotonic time the lease runs out
+        self.expired = 0  # Leases that ran out instead of being released
+
+    def acquire(self, key, ttl=None):
+        """Take the lease on key. Returns False if someone already holds it."""
+        if self.held(key):
+            return False
+        self._expires[key] = time.monotonic() + (self.ttl if ttl is None else ttl)
+        return True
+
+    def release(self, key):
+        self._expires.pop(key, None)
+
+    def held(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._expires[key]
+            self.expired += 1
+            return False
+        return True
+
+    def expire(self):
+        """Drop every lease that has run out. Returns how many were dropped."""
+        now = time.monotonic()
+        stale = [key for key, expires_at in self._expires.items() if expires_at <= now]
+        for key in stale:
+            del self._expires[key]
+        self.expired += len(stale)
+        return len(stale)
+
+    def approx_bytes(self):
+        return approx_bytes(self._expires)
+
+    def __len__(self):
+        return len(self._expires)
@@ -0,0 +1,164 @@
+import asyncio
+import bisect
+import functools
+import re
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+_ID_SEGMENT = re.compile(r"/(?:[0-9]{15,}|[A-Za-z0-9_.-]{40,})")  # Snowflakes and interaction tokens
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Counters and latency histograms, served in the Prometheus text format.
+
+    Recording is a dict update; nothing is formatted until something scrapes ``/metrics``.
+    Values other code already keeps, like cache or queue sizes, are read at scrape time by
+    the functions registered with ``collect`` instead of being copied on every change.
+    """
+
+    def __init__(self, prefix="bot"):
+        self.prefix = prefix
+        self._counters = {}  # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: Histogram}
+        self._help = {}  # name -> help text
+        self._collectors = []  # functions returning [(name, type, help, {labels: value}), ...]
+        self._server = None
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        series = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def timed(self, name, **labels):
+        """Decorator that records how long each call of an async function takes."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def collect(self, func):
+        """Register a function that reports values at scrape time. Usable as a decorator."""
+        self._collectors.append(func)
+        return func
+
+    def http_trace(self):
+        """An aiohttp TraceConfig counting every REST call discord.py makes, for the client's http_trace option."""
+        import aiohttp  # type: ignore  # Comes with discord.py
+
+        async def on_request_end(session, context, params):
+            self.inc("discord_requests_total", method=params.method, route=route_of(params.url.path),
+                     status=str(params.response.status))
+
+        async def on_request_exception(session, context, params):
+            self.inc("discord_request_errors_total", method=params.method, route=route_of(params.url.path),
+                     error=type(params.exception).__name__)
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        return trace
+
+    def render(self):
+        lines = []
+        for name, series in self._counters.items():
+            self._header(lines, name, "counter")
+            for labels, value in series.items():
+                lines.append(f"{self.prefix}_{name}{_labels(labels)} {value}")
+
+        for name, series in self._histograms.items():
+            self._header(lines, name, "histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.prefix}_{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{self.prefix}_{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{self.prefix}_{name}_count{_labels(labels)} {histogram.count}")
+
+        for collector in self._collectors:
+            for name, kind, help_text, series in collector():
+                self._help.setdefault(name, help_text)
+                self._header(lines, name, kind)
+                for labels, value in series.items():
+                    lines.append(f"{self.prefix}_{name}{_labels(tuple(sorted(labels)))} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, name, kind):
+        if name in self._help:
+            lines.append(f"# HELP {self.prefix}_{name} {self._help[name]}")
+        lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+
+    async def start_server(self, host, port):
+        """Serve GET /metrics on host:port. Only ever starts once; a port in use is reported, not raised."""
+        if self._server is not None:
+            return
+        try:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        except OSError as exc:
+            print(f"Metrics endpoint not started on {host}:{port}: {exc}")
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass  # Headers, not needed
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+                status, body = "200 OK", self.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def route_of(path):
+    """A REST path with its ids taken out, e.g. /api/v10/channels/:id/messages, so it can be a label."""
+    return _ID_SEGMENT.sub("/:id", path)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
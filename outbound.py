@@ -0,0 +1,117 @@
+import asyncio
+import traceback
+from collections import deque
+
+MESSAGE_LIMIT = 2000
+
+
+class _Op:
+    __slots__ = ("kind", "target", "parts", "future", "coalesce", "kwargs", "started")
+
+    def __init__(self, kind, target, content, future, coalesce, kwargs):
+        self.kind = kind  # "send" or "edit"
+        self.target = target  # The channel to send to, or the message to edit
+        self.parts = [content]
+        self.future = future
+        self.coalesce = coalesce
+        self.kwargs = kwargs  # Passed through to send/edit, e.g. view=
+        self.started = False  # In flight: too late to add anything to it
+
+
+class Outbox:
+    """Outbound messages, queued per channel and coalesced before they reach Discord.
+
+    Message sends and edits share a rate limit bucket per channel, so each channel gets one
+    queue drained by its own worker, ``window`` seconds after the first message arrives.
+    While an op is waiting, consecutive sends to the channel are joined into one message
+    (up to Discord's 2000 characters) and repeated edits of one message collapse into the
+    last. Every call returns a future for the resulting message; nobody has to await it.
+    """
+
+    def __init__(self, window=0.25):
+        self.window = window
+        self._queues = {}  # channel_id -> deque of pending _Ops
+        self._workers = {}  # channel_id -> worker task
+
+        self.requested = 0  # send/edit calls made
+        self.sent = 0  # messages actually created
+        self.edited = 0  # edits actually made
+        self.coalesced = 0  # calls that rode along with another one instead of their own request
+        self.failed = 0
+
+    def send(self, channel, content, coalesce=True, **kwargs):
+        """Queue a message. With coalesce=False, or anything like a view, it always gets a message of its own."""
+        self.requested += 1
+        coalesce = coalesce and not kwargs
+        queue = self._queue(channel.id)
+        last = queue[-1] if queue else None
+        if (coalesce and last is not None and last.kind == "send" and last.coalesce and not last.started
+                and sum(len(part) + 1 for part in last.parts) + len(content) <= MESSAGE_LIMIT):
+            last.parts.append(content)
+            self.coalesced += 1
+            return last.future
+        return self._push(channel.id, _Op("send", channel, content, self._future(), coalesce, kwargs))
+
+    def edit(self, message, content, **kwargs):
+        """Queue an edit. An edit still waiting for the same message is replaced instead."""
+        self.requested += 1
+        queue = self._queue(message.channel.id)
+        for op in queue:
+            if op.kind == "edit" and op.target.id == message.id and not op.started:
+                op.parts = [content]
+                op.kwargs.update(kwargs)
+                self.coalesced += 1
+                return op.future
+        return self._push(message.channel.id, _Op("edit", message, content, self._future(), False, kwargs))
+
+    def stats(self):
+        return {
+            "requested": self.requested,
+            "sent": self.sent,
+            "edited": self.edited,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+        }
+
+    def _queue(self, channel_id):
+        return self._queues.setdefault(channel_id, deque())
+
+    @staticmethod
+    def _future():
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # Failures are logged, not re-raised unread
+        return future
+
+    def _push(self, channel_id, op):
+        self._queues[channel_id].append(op)
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.create_task(self._drain(channel_id))
+        return op.future
+
+    async def _drain(self, channel_id):
+        queue = self._queues[channel_id]
+        try:
+            await asyncio.sleep(self.window)  # Let the rest of this burst pile up behind the first op
+            while queue:
+                op = queue[0]
+                op.started = True
+                content = "\n".join(op.parts)[:MESSAGE_LIMIT]
+                try:
+                    if op.kind == "send":
+                        message = await op.target.send(content, **op.kwargs)
+                        self.sent += 1
+                    else:
+                        message = await op.target.edit(content=content, **op.kwargs)
+                        self.edited += 1
+                except Exception as exc:
+                    self.failed += 1
+                    traceback.print_exc()
+                    op.future.set_exception(exc)
+                else:
+                    op.future.set_result(message if message is not None else op.target)
+                queue.popleft()
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                del self._queues[channel_id]
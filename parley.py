@@ -0,0 +1,100 @@
+def combo_score_counts(points, k):
+    """Number of k-gamer combinations reaching each total score, as a list indexed by score.
+
+    Uses a subset-sum DP over non-negative integer points, O(n * k * max_score), instead of
+    enumerating all C(n, k) combinations.
+    """
+    max_score = sum(sorted(points, reverse=True)[:k])
+    counts = [[0] * (max_score + 1) for _ in range(k + 1)]  # counts[j][s]: j gamers summing to s
+    counts[0][0] = 1
+
+    for seen, p in enumerate(points, start=1):
+        for j in range(min(k, seen), 0, -1):  # Backwards so each gamer is used at most once
+            row, prev = counts[j], counts[j - 1]
+            for s in range(max_score, p - 1, -1):
+                if prev[s - p]:
+                    row[s] += prev[s - p]
+
+    return counts[k]
+
+
+class ComboRanking:
+    """Leaderboard position of any combination score, computed once per round.
+
+    ``position(score)`` is how many combinations scored strictly higher, which is the index
+    the score would first appear at in the full list of combinations sorted best first.
+    """
+
+    def __init__(self, points, k=3):
+        self.counts = combo_score_counts(points, k)
+        self.total = sum(self.counts)
+
+        self.higher = [0] * len(self.counts)  # higher[s]: combinations scoring more than s
+        running = 0
+        for score in range(len(self.counts) - 1, -1, -1):
+            self.higher[score] = running
+            running += self.counts[score]
+
+    def position(self, score):
+        """0-based ranking position of a score, or None if no combination can reach it."""
+        if not 0 <= score < len(self.counts) or not self.counts[score]:
+            return None
+        return self.higher[score]
+
+
+def parley_multiplier(ranking_position):
+    """Payout multiplier for a combination's 0-based ranking position."""
+    if ranking_position < 20:
+        return max(20 - ranking_position, 0)
+    return max(0.99 - 0.01 * (ranking_position - 20), 0)
+
+
+class ParleyBook:
+    """Every parley placed in one round, keyed by user id. Storage keeps the bets of the open round one by one."""
+
+    def __init__(self, round_id=1, bets=None):
+        self.round_id = round_id
+        self.bets = bets or {}  # user_id -> {'name': ..., 'bet': ..., 'gamers': [...]}
+
+    def has_bet(self, user_id):
+        return user_id in self.bets
+
+    def place(self, user_id, parley):
+        self.bets[user_id] = parley
+
+    def settle(self, gamers, picks):
+        """Score every bet against this round's gamers.
+
+        Returns a list of (user_id, parley, score, ranking_position, multiplier, winnings) where
+        ranking_position, multiplier and winnings are None for a pick no combination can match.
+        """
+        ranking = ComboRanking([g['points'] for g in gamers], picks)  # Computed once per round
+        results = []
+        for user_id, parley in self.bets.items():
+            score = sum(gamers[g - 1]['points'] for g in parley['gamers'])
+            position = ranking.position(score)
+            if position is None:
+                results.append((user_id, parley, score, None, None, None))
+                continue
+            multiplier = parley_multiplier(position)
+            results.append((user_id, parley, score, position, multiplier, round(parley['bet'] * multiplier, 2)))
+        return results
+
+    def close_round(self):
+        """Start the next round. Returns the closed round as a dict for archiving."""
+        closed = self.to_dict()
+        self.round_id += 1
+        self.bets = {}
+        return closed
+
+    def to_dict(self):
+        return {"round": self.round_id, "bets": dict(self.bets)}
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        return cls(data["round"], dict(data["bets"]))
+
+    def __len__(self):
+        return len(self.bets)
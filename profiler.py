@@ -0,0 +1,72 @@
+import asyncio
+import cProfile
+import pstats
+import time
+import tracemalloc
+from io import StringIO
+
+MAX_SECONDS = 300
+
+
+class LiveProfiler:
+    """Profiles the running bot for a while without restarting it.
+
+    cProfile watches the event loop's thread, which is where every command, button press and
+    scheduled job runs; storage work on the executor threads shows up as the time spent
+    waiting for it. tracemalloc records where memory was allocated over the same window.
+    Only one profile runs at a time, since Python allows a single active profiler.
+    """
+
+    def __init__(self):
+        self.running = False
+
+    def profile(self, seconds, top=25):
+        """Start profiling for ``seconds``. Returns a task whose result is a text report of the top functions and allocation sites.
+
+        The profiler is taken before this returns, so a second caller gets RuntimeError even if
+        the first hasn't awaited the task yet. Must be called from the event loop.
+        """
+        if self.running:
+            raise RuntimeError("A profile is already running")
+        self.running = True
+        return asyncio.ensure_future(self._profile(seconds, top))
+
+    async def _profile(self, seconds, top):
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        profiler = cProfile.Profile()
+        try:
+            before = tracemalloc.take_snapshot()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self.running = False
+        return self.report(profiler, before, after, elapsed, peak, top)
+
+    @staticmethod
+    def report(profiler, before, after, elapsed, peak, top):
+        out = StringIO()
+        out.write(f"Profiled for {elapsed:.1f}s\n")
+        stats = pstats.Stats(profiler, stream=out)
+        stats.strip_dirs()
+        for key, title in (("tottime", "own time"), ("cumulative", "cumulative time")):
+            out.write(f"\n=== Top {top} functions by {title} ===\n")
+            stats.sort_stats(key).print_stats(top)
+
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+        growth = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+        out.write(f"\n=== Top {top} allocation sites by memory added (traced peak {peak / 1024:,.0f} KiB) ===\n")
+        for stat in growth[:top]:
+            frame = stat.traceback[0]
+            out.write(f"{stat.size_diff / 1024:+12,.1f} KiB {stat.count_diff:+10,} blocks  {frame.filename}:{frame.lineno}\n")
+        return out.getvalue()
@@ -0,0 +1,129 @@
+import bisect
+
+try:
+    from sortedcontainers import SortedList  # type: ignore
+except ImportError:  # Fall back to a plain bisect-maintained list
+    SortedList = None
+
+
+RANKS = [  # (minimum bux, role name), lowest first
+    (0, "Brokie🐀"),
+    (100_000, "Bronze🥉"),
+    (100_000_000, "Silver🥈"),
+    (100_000_000_000, "Gold🏅"),
+    (100_000_000_000_000, "Platinum🎖️"),
+    (100_000_000_000_000_000, "Ruby🩸"),
+    (100_000_000_000_000_000_000, "Emerald❇️"),
+    (100_000_000_000_000_000_000_000_000, "Diamond💎"),
+    (100_000_000_000_000_000_000_000_000_000, "Obsidian🐱‍👤"),
+    (100_000_000_000_000_000_000_000_000_000_000, "Lucky🍀"),
+    (100_000_000_000_000_000_000_000_000_000_000_000, "Champion👑"),
+    (100_000_000_000_000_000_000_000_000_000_000_000_000, "Master⭐"),
+    (100_000_000_000_000_000_000_000_000_000_000_000_000_000, "Grandmaster🏆"),
+    (100_000_000_000_000_000_000_000_000_000_000_000_000_000_000, "High Roller💳"),
+    (100_000_000_000_000_000_000_000_000_000_000_000_000_000_000_000, "Challenger🥊"),
+]
+RANK_THRESHOLDS = [threshold for threshold, _ in RANKS]
+RANK_NAMES = frozenset(name for _, name in RANKS)
+
+
+def get_rank_index(bux):
+    """Position of the rank this balance falls in, or -1 if it's below every threshold."""
+    return bisect.bisect_right(RANK_THRESHOLDS, bux) - 1
+
+
+def get_role_name(bux):
+    """Returns the role name based on the amount of bux."""
+    return RANKS[max(get_rank_index(bux), 0)][1]
+
+
+class _BisectList:
+    """Minimal stand-in for SortedList when sortedcontainers isn't installed."""
+
+    def __init__(self, iterable=()):
+        self._items = sorted(iterable)
+
+    def add(self, item):
+        bisect.insort(self._items, item)
+
+    def remove(self, item):
+        index = bisect.bisect_left(self._items, item)
+        if index == len(self._items) or self._items[index] != item:
+            raise ValueError(f"{item!r} not in list")
+        del self._items[index]
+
+    def bisect_left(self, item):
+        return bisect.bisect_left(self._items, item)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RankIndex:
+    """Order-statistics index of every account's balance.
+
+    Entries are kept sorted by (-bux, user_id), so the richest user sits at position 0
+    and both the top N and any one user's rank are a bisect away.
+    """
+
+    def __init__(self):
+        self._balances = {}  # user_id -> bux
+        self._sorted = SortedList() if SortedList else _BisectList()
+        self.changes = 0  # Balance changes so far, so a snapshot can tell how stale it is
+
+    def rebuild(self, balances):
+        """Replace the index with an iterable of (user_id, bux) pairs."""
+        self._balances = {user_id: bux for user_id, bux in balances}
+        entries = [(-bux, user_id) for user_id, bux in self._balances.items()]
+        self._sorted = SortedList(entries) if SortedList else _BisectList(entries)
+        self.changes += len(self._balances)
+
+    def update(self, user_id, bux):
+        """Record a user's new balance."""
+        old = self._balances.get(user_id)
+        if old == bux:
+            return
+        if old is not None:
+            self._sorted.remove((-old, user_id))
+        self._balances[user_id] = bux
+        self._sorted.add((-bux, user_id))
+        self.changes += 1
+
+    def update_many(self, balances):
+        """Record many new balances at once, re-sorting everything in one go when that's cheaper than one update each."""
+        balances = dict(balances)
+        if len(balances) * 8 < len(self._balances):
+            for user_id, bux in balances.items():
+                self.update(user_id, bux)
+            return
+        self.rebuild({**self._balances, **balances}.items())
+
+    def remove(self, user_id):
+        old = self._balances.pop(user_id, None)
+        if old is not None:
+            self._sorted.remove((-old, user_id))
+            self.changes += 1
+
+    def rank(self, user_id):
+        """1-based leaderboard position of a user, or None if they aren't ranked."""
+        bux = self._balances.get(user_id)
+        if bux is None:
+            return None
+        return self._sorted.bisect_left((-bux, user_id)) + 1
+
+    def snapshot(self):
+        """Every entry as (-bux, user_id), richest first, copied so the index can keep changing."""
+        return list(self._sorted)
+
+    def top(self, n):
+        """The n richest users as (user_id, bux) pairs."""
+        return [(user_id, -neg_bux) for neg_bux, user_id in self._sorted[:n]]
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def __contains__(self, user_id):
+        return user_id in self._balances
@@ -0,0 +1,65 @@
+import asyncio
+
+
+class InteractionRouter:
+    """Hands reactions and messages to the game waiting for them with one dict lookup per event.
+
+    ``bot.wait_for`` runs every pending check against every event, so dispatch gets slower
+    with each game in progress. Here each wait is filed under a key such as
+    ("reaction", message_id, user_id) or ("message", channel_id, user_id), and an event
+    only ever looks at the waits filed under its own key.
+    """
+
+    def __init__(self):
+        self._waiters = {}  # key -> [(future, check), ...] in the order they started waiting
+        self.dispatched = 0
+        self.resolved = 0
+
+    async def wait(self, key, check=None, timeout=None):
+        """Wait for the next value dispatched under ``key`` that passes ``check``.
+
+        Raises asyncio.TimeoutError like ``bot.wait_for`` does.
+        """
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, check)
+        self._waiters.setdefault(key, []).append(entry)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._discard(key, entry)
+
+    def dispatch(self, key, value):
+        """Resolve the oldest wait under ``key`` whose check accepts ``value``. Returns True if one did."""
+        self.dispatched += 1
+        waiters = self._waiters.get(key)
+        if not waiters:
+            return False
+
+        for entry in list(waiters):
+            future, check = entry
+            if future.done():
+                continue
+            try:
+                accepted = check is None or check(value)
+            except Exception as exc:
+                future.set_exception(exc)
+                self._discard(key, entry)
+                continue
+            if accepted:
+                future.set_result(value)
+                self._discard(key, entry)
+                self.resolved += 1
+                return True
+        return False
+
+    def _discard(self, key, entry):
+        waiters = self._waiters.get(key)
+        if waiters is None:
+            return
+        if entry in waiters:
+            waiters.remove(entry)
+        if not waiters:
+            del self._waiters[key]
+
+    def __len__(self):
+        return sum(len(waiters) for waiters in self._waiters.values())
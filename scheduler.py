@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+import time
+import traceback
+from collections import deque
+
+from discord.ext import tasks  # type: ignore
+
+
+class Job:
+    """A named coroutine that runs every ``interval`` seconds, never more than one at a time."""
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = 0.0  # Unix time; 0 means due as soon as the scheduler starts
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.durations = deque(maxlen=50)  # Seconds taken by the most recent runs
+
+    def stats(self):
+        return {
+            "next_run": self.next_run,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_duration": self.durations[-1] if self.durations else None,
+            "avg_duration": sum(self.durations) / len(self.durations) if self.durations else None,
+        }
+
+
+class Scheduler:
+    """Runs jobs from a single ``tasks.loop`` and persists each job's next run time.
+
+    ``start`` is safe to call on every ``on_ready``: the loop only ever runs once, and a
+    restarted bot picks up where the saved schedule left off instead of running everything again.
+    """
+
+    def __init__(self, state_file, tick=1.0):
+        self.state_file = state_file
+        self.jobs = {}
+        self._loop = tasks.loop(seconds=tick)(self._tick)
+
+    def add(self, name, interval, func):
+        job = Job(name, interval, func)
+        state = self._load_state().get(name)
+        if state:
+            job.next_run = state["next_run"]
+            job.runs = state.get("runs", 0)
+            job.failures = state.get("failures", 0)
+            job.durations.extend(state.get("durations", ()))
+        self.jobs[name] = job
+        return job
+
+    def start(self):
+        if not self._loop.is_running():
+            self._loop.start()
+
+    def stop(self):
+        self._loop.cancel()
+
+    def run_now(self, name):
+        """Trigger a job immediately. Returns False if it's already running."""
+        job = self.jobs[name]
+        if job.running:
+            return False
+        job.running = True  # Claimed before the task starts so a second trigger can't sneak in
+        asyncio.create_task(self._run(job))
+        return True
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+    async def _tick(self):
+        now = time.time()
+        for job in self.jobs.values():
+            if not job.running and now >= job.next_run:
+                job.running = True
+                asyncio.create_task(self._run(job))
+
+    async def _run(self, job):
+        start = time.perf_counter()
+        try:
+            await job.func()
+        except Exception:
+            job.failures += 1
+            traceback.print_exc()
+        finally:
+            job.durations.append(time.perf_counter() - start)
+            job.runs += 1
+            job.next_run = time.time() + job.interval
+            job.running = False
+            await asyncio.to_thread(self._save_state)
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file, 'r') as f:
+            return json.load(f)
+
+    def _save_state(self):
+        state = {name: {"next_run": job.next_run, "runs": job.runs, "failures": job.failures,
+                        "durations": [round(duration, 6) for duration in job.durations]}
+                 for name, job in self.jobs.items()}
+        temp_path = self.state_file + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, indent=4)
+        os.replace(temp_path, self.state_file)
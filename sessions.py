@@ -0,0 +1,94 @@
+import time
+import uuid
+
+
+class SessionStore:
+    """In-memory side of the interactive game sessions, which are saved to storage after every turn.
+
+    Only a small index is kept for every session: the interaction key it's waiting on, its
+    owner and when it times out. Full session records stay in memory while they're in use
+    and are swapped out once idle for ``idle_after`` seconds, to be read back from storage on
+    the next interaction. Storage I/O is left to the caller so it can run off the event loop.
+    """
+
+    def __init__(self, idle_after=60.0):
+        self.idle_after = idle_after
+        self.keys = {}  # interaction key -> session_id
+        self.index = {}  # session_id -> (key, user_id, expires_at)
+        self.users = {}  # user_id -> session_id
+        self._loaded = {}  # session_id -> [session, last used]
+
+        self.swapped_out = 0
+        self.swapped_in = 0
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex[:16]
+
+    def load_index(self, sessions):
+        """Rebuild the index from every stored session, e.g. after a restart."""
+        for session in sessions:
+            self._index(session)
+
+    def get(self, session_id):
+        """The session record if it's in memory, else None (read it from storage and ``swap_in``)."""
+        entry = self._loaded.get(session_id)
+        if entry is None:
+            return None
+        entry[1] = time.monotonic()
+        return entry[0]
+
+    def swap_in(self, session):
+        self._loaded[session["id"]] = [session, time.monotonic()]
+        self.swapped_in += 1
+
+    def find(self, key):
+        return self.keys.get(key)
+
+    def active(self, user_id):
+        """True if the user is in the middle of a game."""
+        return str(user_id) in self.users
+
+    def put(self, session):
+        """Keep the session in memory, indexed under the key it's now waiting on."""
+        self._loaded[session["id"]] = [session, time.monotonic()]
+        self._index(session)
+
+    def remove(self, session_id):
+        """Forget a session once its game is over."""
+        key, user_id, _ = self.index.pop(session_id, (None, None, None))
+        self.keys.pop(key, None)
+        if self.users.get(user_id) == session_id:
+            del self.users[user_id]
+        self._loaded.pop(session_id, None)
+
+    def expired(self, now=None):
+        """Ids of sessions whose prompt has timed out."""
+        now = time.time() if now is None else now
+        return [session_id for session_id, (_, _, expires_at) in self.index.items() if expires_at <= now]
+
+    def swap_out_idle(self):
+        """Drop idle session records from memory; they're already in storage. Returns how many were dropped."""
+        cutoff = time.monotonic() - self.idle_after
+        idle = [session_id for session_id, (_, last_used) in self._loaded.items() if last_used < cutoff]
+        for session_id in idle:
+            del self._loaded[session_id]
+        self.swapped_out += len(idle)
+        return len(idle)
+
+    def stats(self):
+        return {"sessions": len(self.index), "in_memory": len(self._loaded),
+                "swapped_out": self.swapped_out, "swapped_in": self.swapped_in}
+
+    def _index(self, session):
+        old = self.index.get(session["id"])
+        if old is not None:
+            self.keys.pop(old[0], None)
+        key = tuple(session["key"]) if session["key"] else None  # None until its first prompt is sent
+        if key is not None:
+            self.keys[key] = session["id"]
+        self.index[session["id"]] = (key, session["user_id"], session["expires_at"])
+        self.users[session["user_id"]] = session["id"]
+
+    def __len__(self):
+        return len(self.index)
@@ -0,0 +1,51 @@
+import time
+from collections import defaultdict, deque
+
+
+def shard_for(guild_id, shard_count):
+    """The shard a guild's events arrive on, using Discord's sharding formula. DMs always go to shard 0."""
+    if guild_id is None:
+        return 0
+    return (int(guild_id) >> 22) % (shard_count or 1)
+
+
+class ShardStats:
+    """Per-shard event counters with a rolling rate over the last ``window`` seconds.
+
+    Counts are kept in one-second buckets, so recording an event is O(1) and memory per
+    shard is bounded by the window length.
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        self.totals = defaultdict(int)  # shard_id -> events since start
+        self.connects = defaultdict(int)  # shard_id -> times the shard became ready or resumed
+        self.disconnects = defaultdict(int)
+        self._buckets = defaultdict(lambda: deque(maxlen=window))  # shard_id -> [second, count] pairs
+
+    def record(self, shard_id):
+        self.totals[shard_id] += 1
+        second = int(time.monotonic())
+        buckets = self._buckets[shard_id]
+        if buckets and buckets[-1][0] == second:
+            buckets[-1][1] += 1
+        else:
+            buckets.append([second, 1])
+
+    def rate(self, shard_id):
+        """Events per second on a shard, averaged over the window."""
+        cutoff = int(time.monotonic()) - self.window
+        return sum(count for second, count in self._buckets[shard_id] if second > cutoff) / self.window
+
+    def snapshot(self, latencies):
+        """Stats for every shard given ``bot.latencies``, as {shard_id: {...}}."""
+        return {
+            shard_id: {
+                "latency_ms": round(latency * 1000, 1) if latency == latency else None,  # NaN until the first heartbeat
+                "events_per_sec": round(self.rate(shard_id), 2),
+                "events": self.totals[shard_id],
+                "connects": self.connects[shard_id],
+                "disconnects": self.disconnects[shard_id],
+            }
+            for shard_id, latency in latencies
+        }
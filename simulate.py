@@ -0,0 +1,223 @@
+"""Monte Carlo house edge of every game, played with the bot's own rules from games.py and jackpot.py.
+
+Rounds are split into chunks and spread over a process pool. Every chunk gets its own RNG
+stream, seeded from (--seed, game, strategy, chunk), so a run is reproducible whatever the
+number of workers. For each game and player strategy it reports the return to player (RTP)
+per unit of the initial bet, the standard deviation of one round's result and a 95%
+confidence interval for the RTP.
+
+Usage: python simulate.py [--games bj hl u j] [--strategies ...] [--rounds 1000000]
+                          [--chunk 10000] [--workers N] [--seed 0] [--json]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import jackpot
+from cards import HARD_POINTS, card_value
+from games import Blackjack, HighLow, Unlocker, unlock_feedback
+
+BET = 100
+Z_95 = 1.959964
+
+
+# Strategies: decide(game, rng, memory) -> the action a player would take at the game's prompt.
+# memory is a dict that lives for one round.
+
+def bj_stand(points):
+    def decide(game, rng, memory):
+        return "hit" if game.player.total < points else "stand"
+    return decide
+
+
+def bj_double(game, rng, memory):
+    """Double down on a two-card 10 or 11, otherwise hit below 17."""
+    points = game.player.total
+    if len(game.player) == 2 and points in (10, 11):
+        return "double"
+    return "hit" if points < 17 else "stand"
+
+
+def bj_dealer(game, rng, memory):
+    """Stand on 12-16 when the dealer shows 2-6, otherwise hit below 17."""
+    points = game.player.total
+    if 12 <= points < 17 and 2 <= HARD_POINTS[game.dealer[0]] <= 6:
+        return "stand"
+    return "hit" if points < 17 else "stand"
+
+
+def hl_cashout(multiplier):
+    """Guess toward the bigger side of the deck and cash out once the multiplier reaches ``multiplier``."""
+    def decide(game, rng, memory):
+        if game.phase == "cashout":
+            return "cashout" if game.multiplier >= multiplier else "continue"
+        return "higher" if card_value(game.current) <= 8 else "lower"
+    return decide
+
+
+def u_random(game, rng, memory):
+    return f"{rng.randrange(10_000):04d}"
+
+
+ALL_CODES = [f"{code:04d}" for code in range(10_000)]
+OPENING = "0123"
+
+
+@lru_cache(maxsize=None)
+def opening_partition():
+    """Every code grouped by the feedback the opening guess gets against it."""
+    partition = {}
+    for code in ALL_CODES:
+        partition.setdefault(unlock_feedback(code, OPENING), []).append(code)
+    return partition
+
+
+def u_solver(game, rng, memory):
+    """Only guess codes that agree with all the feedback shown so far."""
+    last = memory.get("last")
+    if last is None:
+        guess = OPENING
+    else:
+        feedback = unlock_feedback(game.code, last)  # What the player was just shown
+        if last == OPENING:
+            candidates = opening_partition()[feedback]
+        else:
+            candidates = [code for code in memory["candidates"] if unlock_feedback(code, last) == feedback]
+        memory["candidates"] = candidates
+        guess = rng.choice(candidates)
+    memory["last"] = guess
+    return guess
+
+
+STRATEGIES = {
+    "bj": {"stand17": bj_stand(17), "stand12": bj_stand(12), "always_stand": bj_stand(0),
+           "double11": bj_double, "dealer_up": bj_dealer},
+    "hl": {"cashout2x": hl_cashout(2), "cashout4x": hl_cashout(4), "cashout8x": hl_cashout(8),
+           "never": hl_cashout(math.inf)},
+    "u": {"random": u_random, "solver": u_solver},
+    "j": {"spin": None},
+}
+GAME_CLASSES = {"bj": Blackjack, "hl": HighLow, "u": Unlocker}
+
+
+def play_round(game_cls, decide, rng):
+    """Play one round to the end. Returns the player's net result in units of the initial bet."""
+    game = game_cls(0, BET, rng=rng)
+    memory = {}
+    staked = BET
+    step = game.start()
+    credited = step.credit
+    while not step.done:
+        action = decide(game, rng, memory)
+        if action == "double":
+            staked += BET  # The bot debits the bet again for a double down
+        step = game.act(action)
+        credited += step.credit
+    return (credited - staked) / BET, staked / BET
+
+
+def chunk_seed(seed, game, strategy, chunk):
+    return int.from_bytes(hashlib.sha256(f"{seed}:{game}:{strategy}:{chunk}".encode()).digest(), "big")
+
+
+def run_chunk(game, strategy, rounds, seed):
+    """Play ``rounds`` rounds in a worker process. Returns (rounds, sum, sum of squares, units staked)."""
+    if game == "j":
+        return spin_chunk(rounds, seed)
+
+    rng = random.Random(seed)
+    game_cls, decide = GAME_CLASSES[game], STRATEGIES[game][strategy]
+    total = total_squared = staked = 0.0
+    for _ in range(rounds):
+        result, stake = play_round(game_cls, decide, rng)
+        total += result
+        total_squared += result * result
+        staked += stake
+    return rounds, total, total_squared, staked
+
+
+def spin_chunk(spins, seed):
+    """Slot machine spins through jackpot.spin_batch; each spin's payout is known from the hit counts."""
+    rng = jackpot.np.random.default_rng(seed) if jackpot.np is not None else random.Random(seed)
+    result = jackpot.spin_batch(spins, 1, rng)
+    # A spin that pays m nets m - 1 bets; every other spin nets -1
+    paying, total, total_squared = 0, 0, 0
+    for hits, multipliers in ((result.full_hits, jackpot.payout_multipliers),
+                              (result.partial_hits, jackpot.partial_payout_multipliers)):
+        for symbol, count in hits.items():
+            if count:
+                paying += count
+                total += count * (multipliers[symbol] - 1)
+                total_squared += count * (multipliers[symbol] - 1) ** 2
+    losing = spins - paying
+    return spins, float(total - losing), float(total_squared + losing), float(spins)
+
+
+def summarize(game, strategy, rounds, total, total_squared, staked):
+    mean = total / rounds
+    variance = max(total_squared / rounds - mean * mean, 0.0) * rounds / max(rounds - 1, 1)
+    margin = Z_95 * math.sqrt(variance / rounds)
+    return {
+        "game": game,
+        "strategy": strategy,
+        "rounds": rounds,
+        "rtp": 1 + mean,  # Paid back per unit of the initial bet
+        "house_edge": -mean,
+        "rtp_staked": (staked + total) / staked,  # Paid back per unit actually staked, doubles included
+        "variance": variance,
+        "stdev": math.sqrt(variance),
+        "ci95": [1 + mean - margin, 1 + mean + margin],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--strategies", nargs="+", help="Only run these strategies (default: all of them)")
+    parser.add_argument("--rounds", type=int, default=1_000_000, help="Rounds per game and strategy")
+    parser.add_argument("--chunk", type=int, default=10_000, help="Rounds per task handed to a worker")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    runs = [(game, strategy) for game in args.games for strategy in STRATEGIES[game]
+            if not args.strategies or strategy in args.strategies]
+    if not runs:
+        parser.error("no strategy of the chosen games matches --strategies")
+
+    totals = {run: [0, 0.0, 0.0, 0.0] for run in runs}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {}
+        for game, strategy in runs:
+            for chunk, offset in enumerate(range(0, args.rounds, args.chunk)):
+                rounds = min(args.chunk, args.rounds - offset)
+                seed = chunk_seed(args.seed, game, strategy, chunk)
+                futures[pool.submit(run_chunk, game, strategy, rounds, seed)] = (game, strategy)
+        for future in as_completed(futures):
+            for i, value in enumerate(future.result()):
+                totals[futures[future]][i] += value
+    elapsed = time.perf_counter() - started
+
+    results = [summarize(game, strategy, *totals[game, strategy]) for game, strategy in runs]
+    if args.json:
+        print(json.dumps({"seed": args.seed, "workers": args.workers, "seconds": elapsed, "results": results}, indent=2))
+        return
+
+    print(f"{'game':<5} {'strategy':<13} {'rounds':>13} {'RTP':>9} {'stdev':>8} {'95% CI':>21}")
+    for result in results:
+        low, high = result["ci95"]
+        print(f"{result['game']:<5} {result['strategy']:<13} {result['rounds']:>13,} {result['rtp']:>9.4%} "
+              f"{result['stdev']:>8.3f}   [{low:.4%}, {high:.4%}]")
+    print(f"{sum(result['rounds'] for result in results):,} rounds in {elapsed:.1f}s on {args.workers} workers")
+
+
+if __name__ == "__main__":
+    main()
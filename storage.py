@@ -0,0 +1,477 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+
+from cache import TTLCache
+
+
+class JsonStorage:
+    """The original layout: one JSON file per user in each directory plus a single gamers file.
+
+    Files are replaced atomically, so writes for different users never need to share a lock.
+    """
+
+    def __init__(self, bux_directory, parley_directory, gamers_file, session_directory="session_data/"):
+        self.bux_directory = bux_directory
+        self.parley_directory = parley_directory
+        self.gamers_file = gamers_file
+        self.session_directory = session_directory
+        self.reads = 0  # Files read, files written and bytes written, for the metrics endpoint
+        self.writes = 0
+        self.bytes_written = 0
+
+        for directory in (bux_directory, parley_directory, session_directory):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+    # Accounts
+    def load_account(self, user_id):
+        """Read a user's bux file. Returns None if it doesn't exist."""
+        return self._read(os.path.join(self.bux_directory, f"{user_id}.json"))
+
+    def save_accounts(self, batch):
+        """Write a batch of {user_id: data} bux records."""
+        for user_id, data in batch.items():
+            self._write(os.path.join(self.bux_directory, f"{user_id}.json"), data)
+
+    def iter_accounts(self):
+        """Yield (user_id, data) for every stored account."""
+        yield from self._iter_directory(self.bux_directory)
+
+    # Files are replaced one at a time, there's no transaction to hold open around a bulk pass
+    def begin_bulk(self):
+        pass
+
+    def finish_bulk(self):
+        pass
+
+    # Parleys: book.json holds the round and the bets saved with it, each bet placed since is its own
+    # file in the round's directory, so placing one never rewrites the others
+    def load_parley_book(self):
+        """The current round's parley book, with its bet files and any old one-file-per-user parleys folded in."""
+        book = self._read(os.path.join(self.parley_directory, "book.json"))
+        legacy = {user_id: data for user_id, data in self._iter_directory(self.parley_directory) if user_id != "book"}
+        if legacy:
+            book = book or {"round": 1, "bets": {}}
+            book["bets"].update(legacy)
+        if book:
+            bets_directory = self._bets_directory(book["round"])
+            if os.path.exists(bets_directory):
+                book["bets"].update(self._iter_directory(bets_directory))
+        return book
+
+    def save_parley_book(self, book):
+        self._write(os.path.join(self.parley_directory, "book.json"), book)
+        for filename in os.listdir(self.parley_directory):  # Old per-user files now live in the book
+            if filename.endswith(".json") and filename != "book.json":
+                os.remove(os.path.join(self.parley_directory, filename))
+        shutil.rmtree(self._bets_directory(book["round"]), ignore_errors=True)  # So are the round's bet files
+
+    def add_parley_bet(self, user_id, parley):
+        """Add one bet to the stored round as its own file. Returns False if the user already has one this round.
+
+        Not atomic across processes; run several bot processes on SqliteStorage instead.
+        """
+        book = self._read(os.path.join(self.parley_directory, "book.json"))
+        if book is None:
+            book = {"round": 1, "bets": {}}
+            self._write(os.path.join(self.parley_directory, "book.json"), book)
+        path = os.path.join(self._bets_directory(book["round"]), f"{user_id}.json")
+        if (user_id in book["bets"] or os.path.exists(path)
+                or os.path.exists(os.path.join(self.parley_directory, f"{user_id}.json"))):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write(path, parley)
+        return True
+
+    def _bets_directory(self, round_id):
+        return os.path.join(self.parley_directory, f"round_{round_id}")
+
+    def archive_parley_book(self, book):
+        archive_directory = os.path.join(self.parley_directory, "archive")
+        if not os.path.exists(archive_directory):
+            os.makedirs(archive_directory)
+        self._write(os.path.join(archive_directory, f"round_{book['round']}.json"), book)
+
+    def close_parley_round(self, closed, opened):
+        """Archive a settled round, then make ``opened`` the current one. Returns the book now open.
+
+        In that order, so a crash in between leaves the settled round archived rather than lost.
+        """
+        self.archive_parley_book(closed)
+        self.save_parley_book(opened)
+        shutil.rmtree(self._bets_directory(closed["round"]), ignore_errors=True)
+        return opened
+
+    # Gamers
+    def load_gamers(self):
+        return self._read(self.gamers_file) or []
+
+    def save_gamers(self, gamers):
+        self._write(self.gamers_file, gamers)
+
+    # Game sessions
+    def load_session(self, session_id):
+        return self._read(os.path.join(self.session_directory, f"{session_id}.json"))
+
+    def save_session(self, session_id, session):
+        self._write(os.path.join(self.session_directory, f"{session_id}.json"), session)
+
+    def delete_session(self, session_id):
+        path = os.path.join(self.session_directory, f"{session_id}.json")
+        if os.path.exists(path):
+            os.remove(path)
+
+    def iter_sessions(self):
+        for _, session in self._iter_directory(self.session_directory):
+            yield session
+
+    def close(self):
+        pass
+
+    def _iter_directory(self, directory):
+        for filename in os.listdir(directory):
+            if filename.endswith(".json"):
+                data = self._read(os.path.join(directory, filename))
+                if data is not None:
+                    yield filename[:-len(".json")], data
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return None
+        self.reads += 1
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _write(self, path, data):
+        # Write to a temp file and swap it in, so readers never see a half-written file and no lock is needed
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+            self.bytes_written += f.tell()
+        os.replace(temp_path, path)
+        self.writes += 1
+
+
+class SqliteStorage:
+    """All accounts, parleys and gamers in one SQLite database running in WAL mode.
+
+    Records are kept as JSON text since balances can be far larger than SQLite's 64-bit integers.
+    Every batch write runs as a single transaction. The open parley round's bets are rows of
+    their own, so placing one is a single insert; a settled round is archived as one document.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS accounts (user_id TEXT PRIMARY KEY, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS parley_rounds (round_id INTEGER PRIMARY KEY, settled INTEGER NOT NULL, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS parley_bets (round_id INTEGER NOT NULL, user_id TEXT NOT NULL, data TEXT NOT NULL,
+                                                PRIMARY KEY (round_id, user_id));
+        CREATE TABLE IF NOT EXISTS gamers (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()  # One connection shared between the event loop and the flusher thread
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.reads = 0  # Records read, records written and bytes written, for the metrics endpoint
+        self.writes = 0
+        self.bytes_written = 0
+        self.bulk = False  # A begin_bulk transaction is open
+        self._split_open_rounds()
+
+    def transaction(self, immediate=False):
+        """Context manager that holds the connection lock and wraps the block in BEGIN/COMMIT.
+
+        ``immediate`` takes the database write lock up front, for read-modify-write blocks that
+        must not interleave with another process.
+        """
+        return _Transaction(self, immediate)
+
+    def begin_bulk(self):
+        """Open one transaction for a pass over every account, committed by finish_bulk.
+
+        Anything else this process writes in the meantime, like cache flushes or sessions, runs
+        as a savepoint inside it and reads see its changes, so the pass never waits on the bot
+        or the other way round. Other processes can read but not write until it's committed.
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.bulk = True
+
+    def finish_bulk(self):
+        with self.lock:
+            self.bulk = False
+            self.conn.execute("COMMIT")
+
+    # Accounts
+    def load_account(self, user_id):
+        return self._load("accounts", user_id)
+
+    def save_accounts(self, batch):
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO accounts (user_id, data) VALUES (?, ?)",
+                [(user_id, self._dumps(data)) for user_id, data in batch.items()],
+            )
+
+    def save_account_changes(self, batch, bases):
+        """Write a batch, applying each balance as a change on top of whatever is stored now. Returns {user_id: bux written}.
+
+        ``bases`` holds the balance each record was read with; a record without one is written
+        as is. Runs as one immediate transaction, so when two processes change the same account
+        both changes land instead of the later write replacing the earlier one.
+        """
+        written = {}
+        rows = []
+        with self.transaction(immediate=True) as conn:
+            for user_id, data in batch.items():
+                base = bases.get(user_id)
+                if base is not None:
+                    row = conn.execute("SELECT data FROM accounts WHERE user_id = ?", (user_id,)).fetchone()
+                    if row:
+                        data = dict(data, bux=self._loads(row[0])["bux"] + data["bux"] - base)
+                written[user_id] = data["bux"]
+                rows.append((user_id, self._dumps(data)))
+            conn.executemany("INSERT OR REPLACE INTO accounts (user_id, data) VALUES (?, ?)", rows)
+        return written
+
+    def iter_accounts(self):
+        yield from self._iter("accounts")
+
+    # Parleys
+    def load_parley_book(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT round_id FROM parley_rounds WHERE settled = 0 ORDER BY round_id DESC LIMIT 1").fetchone()
+            if row is None:
+                return None
+            rows = self.conn.execute("SELECT user_id, data FROM parley_bets WHERE round_id = ?", row).fetchall()
+        return {"round": row[0], "bets": {user_id: self._loads(data) for user_id, data in rows}}
+
+    def save_parley_book(self, book):
+        """Make ``book`` the open round, replacing whatever bets are stored for it."""
+        with self.transaction() as conn:
+            self._open_round(conn, book["round"])
+            conn.execute("DELETE FROM parley_bets WHERE round_id = ?", (book["round"],))
+            self._insert_bets(conn, book["round"], book["bets"])
+
+    def add_parley_bet(self, user_id, parley):
+        """Add one bet to the open round. Returns False if the user already has one.
+
+        The primary key turns a second bet from the same user away, whichever process places it.
+        """
+        with self.transaction(immediate=True) as conn:
+            row = conn.execute("SELECT round_id FROM parley_rounds WHERE settled = 0 ORDER BY round_id DESC LIMIT 1").fetchone()
+            round_id = row[0] if row else self._open_round(conn, 1)
+            return conn.execute("INSERT OR IGNORE INTO parley_bets (round_id, user_id, data) VALUES (?, ?, ?)",
+                                (round_id, user_id, self._dumps(parley))).rowcount == 1
+
+    def archive_parley_book(self, book):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO parley_rounds (round_id, settled, data) VALUES (?, 1, ?)",
+                         (book["round"], self._dumps(book)))
+            conn.execute("DELETE FROM parley_bets WHERE round_id = ?", (book["round"],))
+
+    def close_parley_round(self, closed, opened):
+        """Mark a settled round settled and open the next one in one transaction. Returns the book now open.
+
+        Bets another process added to the stored round after it was settled here weren't scored,
+        so they move into the new round instead of being archived unpaid.
+        """
+        with self.transaction(immediate=True) as conn:
+            rows = conn.execute("SELECT user_id, data FROM parley_bets WHERE round_id = ?", (closed["round"],)).fetchall()
+            late = {user_id: self._loads(data) for user_id, data in rows if user_id not in closed["bets"]}
+            opened = {"round": opened["round"], "bets": {**late, **opened["bets"]}}
+            conn.execute("INSERT OR REPLACE INTO parley_rounds (round_id, settled, data) VALUES (?, 1, ?)",
+                         (closed["round"], self._dumps(closed)))
+            conn.execute("DELETE FROM parley_bets WHERE round_id = ?", (closed["round"],))
+            self._open_round(conn, opened["round"])
+            self._insert_bets(conn, opened["round"], opened["bets"])
+        return opened
+
+    def _open_round(self, conn, round_id):
+        conn.execute("INSERT OR REPLACE INTO parley_rounds (round_id, settled, data) VALUES (?, 0, ?)",
+                     (round_id, json.dumps({"round": round_id, "bets": {}})))
+        return round_id
+
+    def _insert_bets(self, conn, round_id, bets):
+        conn.executemany("INSERT OR REPLACE INTO parley_bets (round_id, user_id, data) VALUES (?, ?, ?)",
+                         [(round_id, user_id, self._dumps(bet)) for user_id, bet in bets.items()])
+
+    def _split_open_rounds(self):
+        """Move bets still kept inside an open round's document, as older versions stored them, into parley_bets."""
+        with self.transaction(immediate=True) as conn:
+            for round_id, data in conn.execute("SELECT round_id, data FROM parley_rounds WHERE settled = 0").fetchall():
+                bets = json.loads(data)["bets"]
+                if bets:
+                    conn.executemany("INSERT OR IGNORE INTO parley_bets (round_id, user_id, data) VALUES (?, ?, ?)",
+                                     [(round_id, user_id, json.dumps(bet)) for user_id, bet in bets.items()])
+                    self._open_round(conn, round_id)
+
+    # Gamers
+    def load_gamers(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT data FROM gamers ORDER BY id").fetchall()
+        return [self._loads(data) for (data,) in rows]
+
+    def save_gamers(self, gamers):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM gamers")
+            conn.executemany("INSERT INTO gamers (id, data) VALUES (?, ?)",
+                             [(gamer['id'], self._dumps(gamer)) for gamer in gamers])
+
+    # Game sessions
+    def load_session(self, session_id):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def save_session(self, session_id, session):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (id, data) VALUES (?, ?)", (session_id, self._dumps(session)))
+
+    def delete_session(self, session_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def iter_sessions(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT data FROM sessions").fetchall()
+        for (data,) in rows:
+            yield self._loads(data)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _load(self, table, user_id):
+        with self.lock:
+            row = self.conn.execute(f"SELECT data FROM {table} WHERE user_id = ?", (str(user_id),)).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def _dumps(self, data):
+        text = json.dumps(data)
+        self.writes += 1
+        self.bytes_written += len(text)
+        return text
+
+    def _loads(self, text):
+        self.reads += 1
+        return json.loads(text)
+
+    def _iter(self, table, batch_size=1_000):
+        """Yield every (user_id, data) in user_id order, reading batch_size rows at a time.
+
+        Each batch continues after the last key of the one before, so memory stays at one batch,
+        the lock is never held while the caller works, and rows written meanwhile don't disturb it.
+        """
+        last = ""
+        while True:
+            with self.lock:
+                rows = self.conn.execute(f"SELECT user_id, data FROM {table} WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                                         (last, batch_size)).fetchall()
+            if not rows:
+                return
+            for user_id, data in rows:
+                yield user_id, self._loads(data)
+            last = rows[-1][0]
+
+
+class SharedAccounts:
+    """Loader and writer for an AccountCache whose accounts other processes write too.
+
+    Remembers the balance every account was read with, so a flush writes this process's change
+    to it (see SqliteStorage.save_account_changes) rather than a balance another process may
+    have moved since. Per-user locks only exist within one process, so this is what keeps two
+    processes paying the same user from losing one of the payments.
+    """
+
+    def __init__(self, storage, max_entries=100_000):
+        self.storage = storage
+        self._bases = TTLCache(max_entries=max_entries, ttl=60 * 60)  # user_id -> bux as last read or written
+        self._lock = threading.Lock()  # Held across each read or write, so a base always matches what the cache holds
+
+    def load(self, user_id):
+        with self._lock:
+            data = self.storage.load_account(user_id)
+            if data is not None:
+                self._bases.set(user_id, data["bux"])
+            return data
+
+    def rebase(self, balances):
+        """Record {user_id: bux} as what those accounts were read with, for records read from storage some other way."""
+        with self._lock:
+            for user_id, bux in balances.items():
+                self._bases.set(user_id, bux)
+
+    def save(self, batch):
+        with self._lock:
+            self.storage.save_account_changes(batch, {user_id: self._bases.get(user_id) for user_id in batch})
+            for user_id, data in batch.items():
+                # What the cache now holds for them: any further change is counted from here, the
+                # other processes' changes just merged in are already in storage
+                self._bases.set(user_id, data["bux"])
+
+
+class _Transaction:
+    def __init__(self, storage, immediate=False):
+        self.storage = storage
+        self.immediate = immediate
+
+    def __enter__(self):
+        self.storage.lock.acquire()
+        self.nested = self.storage.bulk  # Inside a bulk pass's transaction, which already holds the write lock
+        try:
+            self.storage.conn.execute("SAVEPOINT nested" if self.nested else "BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+        except Exception:  # e.g. another process held the write lock past the busy timeout
+            self.storage.lock.release()
+            raise
+        return self.storage.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.nested:
+                if exc_type:
+                    self.storage.conn.execute("ROLLBACK TO nested")
+                self.storage.conn.execute("RELEASE nested")
+            else:
+                self.storage.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.storage.lock.release()
+
+
+def migrate_json_to_sqlite(source, target):
+    """Bulk import everything from a JsonStorage into a SqliteStorage. Returns (accounts, parleys, gamers) counts.
+
+    Only ever fills an empty database: once the bot runs on SQLite the JSON files go stale, and
+    importing them again would overwrite live balances, the open parley round and sessions.
+    Raises RuntimeError if any table already holds rows.
+    """
+    accounts = dict(source.iter_accounts())
+    book = source.load_parley_book()
+    gamers = source.load_gamers()
+    sessions = list(source.iter_sessions())
+
+    with target.transaction(immediate=True) as conn:  # Nothing can write between the check and the import
+        for table in ("accounts", "parley_rounds", "parley_bets", "gamers", "sessions"):
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                raise RuntimeError(f"{target.path} already holds {table}, not importing over it")
+        conn.executemany("INSERT OR REPLACE INTO accounts (user_id, data) VALUES (?, ?)",
+                         [(user_id, json.dumps(data)) for user_id, data in accounts.items()])
+        if book:
+            target._open_round(conn, book["round"])
+            target._insert_bets(conn, book["round"], book["bets"])
+        if gamers:
+            conn.execute("DELETE FROM gamers")
+            conn.executemany("INSERT INTO gamers (id, data) VALUES (?, ?)",
+                             [(gamer['id'], json.dumps(gamer)) for gamer in gamers])
+        conn.executemany("INSERT OR REPLACE INTO sessions (id, data) VALUES (?, ?)",
+                         [(session["id"], json.dumps(session)) for session in sessions])
+
+    return len(accounts), len(book["bets"]) if book else 0, len(gamers)